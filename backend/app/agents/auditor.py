@@ -1,7 +1,17 @@
+import asyncio
 import json
+import logging
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from app.agents import context_cache
 from app.agents.gemini_client import invoke
-from app.services.regulation_service import get_rules
+from app.core.config import settings
+from app.services.file_chunker import chunk_file, estimate_tokens
+from app.services.regulation_service import get_rules, get_ruleset_version
+from app.services.resource_index import route_files
+
+logger = logging.getLogger(__name__)
 
 AUDITOR_SYSTEM_PROMPT = """You are a regulatory compliance auditor for cloud infrastructure.
 
@@ -29,15 +39,185 @@ For each violation found, produce a JSON object with these exact fields:
 
 Output ONLY a valid JSON array of violation objects. No explanations, no markdown, no extra text."""
 
+CONTEXT_FILES_NOTE = """
+Files marked "CONTEXT FILE" are provided only to resolve references to surrounding resources.
+Do NOT report violations located in context files; report only violations in files marked "FILE"."""
+
+REPORTED_NOTE = """
+ALREADY REPORTED (found by deterministic rule checks; do NOT report these again):
+{findings}
+"""
+
+EXCERPT_NOTE = """
+Files marked "EXCERPT" are consecutive parts of a file too large to audit at once; excerpts may overlap.
+For a violation in an excerpt, set "file" to the file path alone and count "line" from 1 at the first line of the excerpt."""
+
+RULE_SCOPE_NOTE = """
+Audit these files ONLY against the following rule_ids from the ruleset; ignore every other rule: {rule_ids}"""
+
 QA_RESCAN_NOTE = """
 IMPORTANT: This is a QA re-scan after fixes have been applied.
 Only report NEW or REMAINING violations. Do not re-report violations that have been properly fixed."""
 
 
+@lru_cache(maxsize=64)
+def _ruleset_prompt(ruleset_version: str, rule_ids: tuple[str, ...] | None) -> str:
+    rules = get_rules()
+    if rule_ids is not None:
+        wanted = set(rule_ids)
+        rules = [rule for rule in rules if rule["rule_id"] in wanted]
+    return AUDITOR_SYSTEM_PROMPT.format(ruleset=json.dumps(rules, indent=2))
+
+
+def build_system_prompt(rule_ids: tuple[str, ...] | None = None) -> str:
+    """Return the Auditor system prompt with the current ruleset embedded.
+
+    Args:
+        rule_ids: Optional subset of rules to embed (see
+            app.services.resource_index.route_files); defaults to all rules.
+
+    The ruleset JSON is serialized once per ruleset version and subset.
+    """
+    return _ruleset_prompt(get_ruleset_version(), rule_ids)
+
+
+def _build_request(
+    rule_ids: tuple[str, ...], offsets: dict[str, int], is_qa_rescan: bool = False, has_context_files: bool = False
+) -> tuple[str, str]:
+    """Return ``(system_prompt, notes)`` for a batch routed to *rule_ids*.
+
+    When the full-ruleset prompt can be sent as a Gemini cached context,
+    every batch uses it, so there is one cached handle per ruleset version,
+    and the batch's rules are named in the notes instead.  Otherwise only
+    the batch's rules are embedded, to keep inline prompts small.  The notes
+    (rule scope, context files, excerpts, QA re-scan) vary per batch and go
+    at the start of the user content.
+    """
+    full_prompt = build_system_prompt()
+    notes = ""
+    if context_cache.cacheable(full_prompt):
+        system_prompt = full_prompt
+        notes += RULE_SCOPE_NOTE.format(rule_ids=", ".join(rule_ids))
+    else:
+        system_prompt = build_system_prompt(rule_ids)
+    if has_context_files:
+        notes += CONTEXT_FILES_NOTE
+    if offsets:
+        notes += EXCERPT_NOTE
+    if is_qa_rescan:
+        notes += QA_RESCAN_NOTE
+    return system_prompt, (notes.lstrip("\n") + "\n\n") if notes else ""
+
+
+def plan_batches(
+    repo_files: dict[str, str],
+    rules_by_file: dict[str, set[str] | None] | None = None,
+    overhead_tokens: int = 0,
+) -> list[tuple[tuple[str, ...], dict[str, str], dict[str, int]]]:
+    """Split files into token-budgeted batches that can be audited in parallel.
+
+    Files are first routed to their applicable rules (see
+    app.services.resource_index.route_files), then each rule group is
+    bin-packed (first fit, largest first) so that the system prompt,
+    *overhead_tokens* and the batch's files fit settings.AUDITOR_BATCH_TOKENS.
+    A file larger than the budget is split at resource boundaries (see
+    app.services.file_chunker.chunk_file) into excerpts that go to
+    different batches.
+
+    Returns:
+        A list of ``(rule_ids, {path: content}, {path: start_line})``
+        batches; the last mapping gives the first line of each excerpt.
+    """
+    groups, _ = route_files(repo_files, rules_by_file)
+    budget = settings.AUDITOR_BATCH_TOKENS
+    batches = []
+    for rule_ids, files in groups:
+        system_prompt, notes = _build_request(rule_ids, {})
+        available = max(budget - estimate_tokens(system_prompt + notes) - overhead_tokens, budget // 4)
+        # (path, start_line, content), start_line None for a whole file
+        units: list[tuple[str, int | None, str]] = []
+        for path, content in files.items():
+            chunks = chunk_file(path, content, available - 30, settings.AUDITOR_CHUNK_OVERLAP_LINES)
+            if len(chunks) == 1:
+                units.append((path, None, content))
+            else:
+                units.extend((path, start, text) for start, text in chunks)
+
+        bins: list[tuple[int, list[tuple[str, int | None, str]]]] = []
+        for unit in sorted(units, key=lambda u: len(u[2]), reverse=True):
+            size = estimate_tokens(unit[2]) + 30  # FILE header
+            for i, (used, members) in enumerate(bins):
+                if used + size <= available and all(m[0] != unit[0] for m in members):
+                    bins[i] = (used + size, members + [unit])
+                    break
+            else:
+                bins.append((size, [unit]))
+        # Keep repository order within a batch so prompts stay readable
+        order = {path: i for i, path in enumerate(files)}
+        for _, members in sorted(bins, key=lambda b: min((order[m[0]], m[1] or 0) for m in b[1])):
+            members.sort(key=lambda m: order[m[0]])
+            batches.append((
+                rule_ids,
+                {path: text for path, _, text in members},
+                {path: start for path, start, _ in members if start is not None},
+            ))
+    return batches
+
+
+def _file_sections(files: dict[str, str], offsets: dict[str, int]) -> list[str]:
+    sections = []
+    for filename, content in files.items():
+        if filename in offsets:
+            # No absolute line range: the model numbers excerpt lines from 1
+            # (see EXCERPT_NOTE) and _locate() adds the offset
+            sections.append(f"--- FILE: {filename} (EXCERPT) ---\n{content}\n")
+        else:
+            sections.append(f"--- FILE: {filename} ---\n{content}\n")
+    return sections
+
+
+def _locate(v: dict, files: dict[str, str], offsets: dict[str, int]) -> dict:
+    """Map a violation reported against an excerpt back to its file and line."""
+    file = v.get("file")
+    if isinstance(file, str) and file not in files and file.split(" (", 1)[0] in files:
+        file = v["file"] = file.split(" (", 1)[0]
+    if file in offsets and isinstance(v.get("line"), int):
+        v["line"] += offsets[file] - 1
+    return v
+
+
+def _merge(batch_results: list[list[dict]]) -> list[dict]:
+    """Concatenate per-batch violations, dropping repeats of the same finding."""
+    seen: set[tuple] = set()
+    merged = []
+    for violations in batch_results:
+        for v in violations:
+            keys = _finding_keys(v)
+            if keys & seen:
+                continue
+            seen |= keys
+            merged.append(v)
+    return merged
+
+
+def _raise_if_all_failed(results: list, batches: list) -> list[list[dict]]:
+    errors = [r for r in results if isinstance(r, BaseException)]
+    for r in errors:
+        logger.warning(f"Auditor batch failed: {r}")
+    if errors and len(errors) == len(batches):
+        raise errors[0]
+    return [r for r in results if not isinstance(r, BaseException)]
+
+
 def run_auditor(repo_files: dict[str, str], is_qa_rescan: bool = False) -> list[dict]:
     """
     Scan repository files against compliance rules and return a list of violations.
 
+    Files are routed by the resources they define and packed into
+    token-budgeted batches (see plan_batches()), which are audited
+    concurrently, up to settings.AUDITOR_CONCURRENCY at a time. A failed
+    batch is logged and skipped unless every batch fails.
+
     Args:
         repo_files: Dict mapping filename to file content.
         is_qa_rescan: If True, append a note to only report new/remaining violations.
@@ -45,41 +225,116 @@ def run_auditor(repo_files: dict[str, str], is_qa_rescan: bool = False) -> list[
     Returns:
         List of violation dicts, each with a unique violation_id.
     """
-    rules = get_rules()
-    ruleset_json = json.dumps(rules, indent=2)
+    batches = plan_batches(repo_files)
+    if not batches:
+        return []
 
-    system_prompt = AUDITOR_SYSTEM_PROMPT.format(ruleset=ruleset_json)
-    if is_qa_rescan:
-        system_prompt += QA_RESCAN_NOTE
+    def audit(batch):
+        rule_ids, files, offsets = batch
+        system_prompt, notes = _build_request(rule_ids, offsets, is_qa_rescan)
+        user_content = notes + "\n".join(_file_sections(files, offsets))
+        violations = _with_ids(
+            invoke(system_prompt=system_prompt, user_content=user_content, expect_json=True, use_context_cache=True)
+        )
+        return [_locate(v, files, offsets) for v in violations]
 
-    # Build user content from repo files
-    file_sections = []
-    for filename, content in repo_files.items():
-        file_sections.append(f"--- FILE: {filename} ---\n{content}\n")
-    user_content = "\n".join(file_sections)
+    def guarded(batch):
+        try:
+            return audit(batch)
+        except Exception as e:
+            return e
 
-    violations = invoke(system_prompt=system_prompt, user_content=user_content, expect_json=True)
+    with ThreadPoolExecutor(max_workers=max(1, min(settings.AUDITOR_CONCURRENCY, len(batches)))) as pool:
+        results = list(pool.map(guarded, batches))
+    return _merge(_raise_if_all_failed(results, batches))
 
-    # Ensure each violation has a unique violation_id
-    if isinstance(violations, list):
-        for v in violations:
-            if not v.get("violation_id"):
-                v["violation_id"] = f"V-{uuid.uuid4().hex[:8]}"
-    else:
-        violations = []
 
+async def run_auditor_async(repo_files: dict[str, str], is_qa_rescan: bool = False) -> list[dict]:
+    """Async variant of run_auditor() for use inside async SSE generators."""
+    from app.agents.gemini_client import invoke_async
+
+    batches = plan_batches(repo_files)
+    semaphore = asyncio.Semaphore(max(1, settings.AUDITOR_CONCURRENCY))
+
+    async def audit(batch):
+        rule_ids, files, offsets = batch
+        system_prompt, notes = _build_request(rule_ids, offsets, is_qa_rescan)
+        user_content = notes + "\n".join(_file_sections(files, offsets))
+        async with semaphore:
+            violations = _with_ids(await invoke_async(
+                system_prompt=system_prompt, user_content=user_content, expect_json=True, use_context_cache=True
+            ))
+        return [_locate(v, files, offsets) for v in violations]
+
+    results = await asyncio.gather(*(audit(batch) for batch in batches), return_exceptions=True)
+    return _merge(_raise_if_all_failed(results, batches))
+
+
+def _with_ids(violations) -> list[dict]:
+    # Ensure each violation has a unique violation_id
+    if not isinstance(violations, list):
+        raise ValueError("Auditor response is not a JSON array of violations")
+    violations = [v for v in violations if isinstance(v, dict)]
+    for v in violations:
+        if not v.get("violation_id"):
+            v["violation_id"] = f"V-{uuid.uuid4().hex[:8]}"
     return violations
 
 
-def run_auditor_streaming(repo_files: dict[str, str]):
+def _finding_keys(v: dict) -> set[tuple]:
+    resource = str(v.get("resource") or "")
+    # The model may name "aws_db_instance.main" as just "main"
+    short = resource.replace("/", ".").rsplit(".", 1)[-1]
+    return {
+        ("line", v.get("file"), v.get("rule_id"), v.get("line")),
+        ("resource", v.get("file"), v.get("rule_id"), short, v.get("field")),
+    }
+
+
+def _parse_violations(text: str) -> list[dict]:
+    """Parse a streamed Auditor response.
+
+    Raises:
+        ValueError: If the response is not a JSON array, so the batch is
+            reported as failed rather than as having no violations.
     """
-    Generator that yields SSE-compatible event dicts as it scans files.
+    text = text.strip()
+    if text.startswith("```"):
+        lines = text.split("\n")
+        text = "\n".join(lines[1:-1]).strip()
+    try:
+        violations = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Auditor response is not valid JSON: {e}") from e
+    return _with_ids(violations)
+
+
+async def run_auditor_streaming(
+    repo_files: dict[str, str],
+    context_files: dict[str, str] | None = None,
+    reported: list[dict] | None = None,
+    rules_by_file: dict[str, set[str] | None] | None = None,
+):
     """
-    from app.agents.gemini_client import invoke_streaming
+    Async generator that yields SSE-compatible event dicts as it scans files.
 
-    rules = get_rules()
-    ruleset_json = json.dumps(rules, indent=2)
-    system_prompt = AUDITOR_SYSTEM_PROMPT.format(ruleset=ruleset_json)
+    Files are routed and batched as in run_auditor(); batches stream
+    concurrently and their events are interleaved as they arrive. Events
+    from a batch carry a 1-based ``batch`` number in their data. A failed
+    batch is skipped unless every batch fails; the final ``agent_complete``
+    event lists the files it held under ``failed_files``.
+
+    Args:
+        repo_files: Dict mapping filename to file content to audit.
+        context_files: Optional dict of surrounding files that are shown to the
+            model for reference only; violations in them are discarded.
+        reported: Optional violations in these files that were already
+            found (by the rule engine); the model is told about them and
+            repeats are discarded.
+        rules_by_file: Optional rule IDs to audit per file (the rule
+            engine's undecided rules) instead of routing by resource type.
+    """
+    from app.agents.gemini_client import invoke_streaming_async
 
     filenames = list(repo_files.keys())
     yield {
@@ -87,53 +342,132 @@ def run_auditor_streaming(repo_files: dict[str, str]):
         "data": {"agent": "Auditor", "chunk": f"Scanning {len(filenames)} infrastructure files...\n"}
     }
 
-    # Build user content
-    file_sections = []
-    for filename, content in repo_files.items():
-        file_sections.append(f"--- FILE: {filename} ---\n{content}\n")
+    context_sections = [
+        f"--- CONTEXT FILE: {filename} ---\n{content}\n"
+        for filename, content in (context_files or {}).items()
+    ]
+    batches = plan_batches(repo_files, rules_by_file, estimate_tokens("".join(context_sections)))
+    skipped = [path for path in filenames if not any(path in files for _, files, _ in batches)]
+    if skipped:
         yield {
             "event": "reasoning_chunk",
-            "data": {"agent": "Auditor", "chunk": f"Reading {filename}...\n"}
+            "data": {"agent": "Auditor", "chunk": f"No applicable rules for {len(skipped)} files: {', '.join(skipped)}\n"}
         }
-    user_content = "\n".join(file_sections)
-
-    yield {
-        "event": "reasoning_chunk",
-        "data": {"agent": "Auditor", "chunk": "Analyzing files against compliance ruleset...\n"}
-    }
-
-    # Stream Gemini reasoning
-    full_response = ""
-    for chunk in invoke_streaming(system_prompt=system_prompt, user_content=user_content):
-        full_response += chunk
+    if len(batches) > 1:
         yield {
             "event": "reasoning_chunk",
-            "data": {"agent": "Auditor", "chunk": chunk}
+            "data": {"agent": "Auditor", "chunk": f"Auditing in {len(batches)} batches, up to {settings.AUDITOR_CONCURRENCY} at a time...\n"}
         }
 
-    # Parse violations from complete response
-    text = full_response.strip()
-    if text.startswith("```"):
-        lines = text.split("\n")
-        text = "\n".join(lines[1:-1]).strip()
+    known = set().union(*(_finding_keys(v) for v in reported)) if reported else set()
+    queue: asyncio.Queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(max(1, settings.AUDITOR_CONCURRENCY))
 
+    async def audit_batch(number: int, rule_ids: tuple[str, ...], files: dict[str, str], offsets: dict[str, int]) -> None:
+        def event(name: str, data: dict) -> dict:
+            return {"event": name, "data": {"agent": "Auditor", **data, "batch": number}}
+
+        try:
+            async with semaphore:
+                system_prompt, notes = _build_request(rule_ids, offsets, has_context_files=bool(context_files))
+
+                # Build user content
+                file_sections = _file_sections(files, offsets)
+                for filename in files:
+                    await queue.put(event("reasoning_chunk", {"chunk": f"Reading {filename}...\n"}))
+                user_content = notes + "\n".join(file_sections + context_sections)
+                batch_reported = []
+                for v in reported or []:
+                    if v.get("file") not in files:
+                        continue
+                    line = v.get("line")
+                    if v["file"] in offsets and isinstance(line, int):
+                        # Number the finding as the model sees the excerpt
+                        line -= offsets[v["file"]] - 1
+                        if not 1 <= line <= files[v["file"]].count("\n") + 1:
+                            continue
+                    batch_reported.append((v, line))
+                if batch_reported:
+                    user_content += REPORTED_NOTE.format(findings="\n".join(
+                        f"- {v['file']}:{line or '?'} {v['rule_id']} {v.get('resource') or ''} {v.get('field') or ''}".rstrip()
+                        for v, line in batch_reported
+                    ))
+
+                await queue.put(event("reasoning_chunk", {"chunk": f"Analyzing {len(files)} files against {len(rule_ids)} applicable rules...\n"}))
+
+                # Stream Gemini reasoning
+                full_response = ""
+                async for chunk in invoke_streaming_async(
+                    system_prompt=system_prompt, user_content=user_content, use_context_cache=True, validate=_parse_violations
+                ):
+                    full_response += chunk
+                    await queue.put(event("reasoning_chunk", {"chunk": chunk}))
+
+            # Parse violations from complete response
+            found = []
+            for v in _parse_violations(full_response):
+                _locate(v, files, offsets)
+                if context_files and v.get("file") not in files:
+                    continue
+                if known and _finding_keys(v) & known:
+                    continue
+                found.append(v)
+            await queue.put(("done", found))
+        except Exception as e:
+            await queue.put(("failed", (e, list(files))))
+
+    tasks = [
+        asyncio.create_task(audit_batch(number, rule_ids, files, offsets))
+        for number, (rule_ids, files, offsets) in enumerate(batches, start=1)
+    ]
+    seen: set[tuple] = set()
+    violations = []
+    errors = []
+    failed_files: set[str] = set()
     try:
-        violations = json.loads(text)
-    except json.JSONDecodeError:
-        violations = []
+        remaining = len(tasks)
+        while remaining:
+            item = await queue.get()
+            if isinstance(item, dict):
+                yield item
+                continue
+            remaining -= 1
+            status, payload = item
+            if status == "failed":
+                error, paths = payload
+                logger.warning(f"Auditor batch failed: {error}")
+                errors.append(error)
+                failed_files.update(paths)
+                yield {
+                    "event": "reasoning_chunk",
+                    "data": {"agent": "Auditor", "chunk": f"\nA batch failed and was skipped: {error}\n"}
+                }
+                continue
+            # Merge, dropping findings another batch already reported
+            for v in payload:
+                keys = _finding_keys(v)
+                if keys & seen:
+                    continue
+                seen |= keys
+                violations.append(v)
+                yield {
+                    "event": "violation_found",
+                    "data": {"agent": "Auditor", "violation": v}
+                }
+    finally:
+        # The client may disconnect mid-stream; stop any batches still running
+        for task in tasks:
+            task.cancel()
 
-    if isinstance(violations, list):
-        for v in violations:
-            if not v.get("violation_id"):
-                v["violation_id"] = f"V-{uuid.uuid4().hex[:8]}"
-            yield {
-                "event": "violation_found",
-                "data": {"agent": "Auditor", "violation": v}
-            }
-    else:
-        violations = []
+    if errors and len(errors) == len(batches):
+        raise errors[0]
 
     yield {
         "event": "agent_complete",
-        "data": {"agent": "Auditor", "summary": f"{len(violations)} violations detected", "violations": violations}
+        "data": {
+            "agent": "Auditor",
+            "summary": f"{len(violations)} violations detected",
+            "violations": violations,
+            "failed_files": [path for path in filenames if path in failed_files],
+        }
     }
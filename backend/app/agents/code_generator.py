@@ -49,11 +49,11 @@ def run_code_generator(file_path: str, original_content: str, plans: list[dict])
     return corrected
 
 
-def run_code_generator_streaming(file_path: str, original_content: str, plans: list[dict]):
+async def run_code_generator_streaming(file_path: str, original_content: str, plans: list[dict]):
     """
-    Generator that yields SSE-compatible event dicts as it generates fixes.
+    Async generator that yields SSE-compatible event dicts as it generates fixes.
     """
-    from app.agents.gemini_client import invoke_streaming
+    from app.agents.gemini_client import invoke_streaming_async
 
     plans_json = json.dumps(plans, indent=2)
     user_content = (
@@ -68,7 +68,7 @@ def run_code_generator_streaming(file_path: str, original_content: str, plans: l
     }
 
     full_response = ""
-    for chunk in invoke_streaming(system_prompt=CODE_GENERATOR_SYSTEM_PROMPT, user_content=user_content):
+    async for chunk in invoke_streaming_async(system_prompt=CODE_GENERATOR_SYSTEM_PROMPT, user_content=user_content):
         full_response += chunk
 
     yield {
@@ -0,0 +1,183 @@
+"""
+Server-side Gemini context caching for long, stable system prompts.
+
+The Auditor sends the same multi-kilobyte ruleset prompt on every scan and
+QA re-scan.  Instead, the prompt is uploaded once as a cached content
+handle per (model, prompt), i.e. once per ruleset version, and later calls
+reference the handle, which cuts input-token cost and time-to-first-token.  Handles are refreshed shortly
+before their TTL runs out, so a busy server keeps using the same one.
+
+The Gemini calls live behind :class:`ContextCacheBackend`; tests and local
+runs can install a stub with :func:`set_backend`.  Prompts below the
+model's minimum cacheable size are not uploaded, and if a handle cannot be
+created the prompt is not retried for one TTL; either way the caller falls
+back to sending the prompt inline.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from app.core.config import settings
+from app.services.file_chunker import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Refresh a handle once less than this fraction of its TTL remains
+_REFRESH_FRACTION = 0.2
+
+
+class ContextCacheBackend:
+    """Creates, extends and uses cached content handles via google-generativeai."""
+
+    def create(self, model_name: str, system_instruction: str, ttl: int):
+        """Upload *system_instruction* and return a handle valid for *ttl* seconds."""
+        from google.generativeai import caching
+
+        if not model_name.startswith("models/"):
+            model_name = f"models/{model_name}"
+        return caching.CachedContent.create(
+            model=model_name,
+            system_instruction=system_instruction,
+            ttl=timedelta(seconds=ttl),
+        )
+
+    def extend(self, handle, ttl: int):
+        """Push the expiry of *handle* to *ttl* seconds from now and return it."""
+        handle.update(ttl=timedelta(seconds=ttl))
+        return handle
+
+    def model(self, handle, generation_config: dict | None = None):
+        """Return a model whose calls use *handle* as their prefix."""
+        import google.generativeai as genai
+
+        return genai.GenerativeModel.from_cached_content(
+            cached_content=handle, generation_config=generation_config
+        )
+
+
+class _Entry:
+    __slots__ = ("handle", "expires_at", "models")
+
+    def __init__(self, handle, expires_at: float):
+        self.handle = handle
+        self.expires_at = expires_at
+        self.models: dict[str, object] = {}
+
+
+_backend: ContextCacheBackend = ContextCacheBackend()
+_entries: dict[tuple[str, str], _Entry] = {}
+# Prompts the backend refused, with the time after which to try again
+_failures: dict[tuple[str, str], float] = {}
+# One lock per prompt serialises its uploads; _lock only guards the dicts,
+# so uploads of different prompts run concurrently
+_key_locks: dict[tuple[str, str], threading.Lock] = {}
+_lock = threading.Lock()
+
+
+def set_backend(backend: ContextCacheBackend) -> None:
+    """Install *backend* (e.g. a local stub) and drop every known handle."""
+    global _backend
+    with _lock:
+        _backend = backend
+        _entries.clear()
+        _failures.clear()
+        _key_locks.clear()
+
+
+def _fresh(entry: _Entry | None, now: float, ttl: int) -> bool:
+    return entry is not None and entry.expires_at - now >= ttl * _REFRESH_FRACTION
+
+
+def _key(system_prompt: str) -> tuple[str, str]:
+    return settings.GEMINI_MODEL, hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+
+
+def cacheable(system_prompt: str) -> bool:
+    """Return True if calls with *system_prompt* can use a cached handle.
+
+    False when context caching is disabled, the prompt is estimated below
+    settings.GEMINI_CONTEXT_CACHE_MIN_TOKENS (Gemini rejects it), or the
+    backend refused the prompt within the last TTL.
+    """
+    if settings.GEMINI_CONTEXT_CACHE_TTL <= 0:
+        return False
+    if estimate_tokens(system_prompt) < settings.GEMINI_CONTEXT_CACHE_MIN_TOKENS:
+        return False
+    with _lock:
+        return _failures.get(_key(system_prompt), 0) <= time.monotonic()
+
+
+def get_cached_model(system_prompt: str, generation_config: dict | None = None):
+    """
+    Return a model that uses a cached content handle for *system_prompt*,
+    creating or refreshing the handle as needed.
+
+    Prompts estimated below settings.GEMINI_CONTEXT_CACHE_MIN_TOKENS are
+    never uploaded, as Gemini rejects them.
+
+    Returns:
+        The model, or None when context caching is disabled or unavailable
+        for this prompt; callers then send the prompt inline.
+    """
+    ttl = settings.GEMINI_CONTEXT_CACHE_TTL
+    if ttl <= 0 or estimate_tokens(system_prompt) < settings.GEMINI_CONTEXT_CACHE_MIN_TOKENS:
+        return None
+
+    key = _key(system_prompt)
+    config_key = json.dumps(generation_config, sort_keys=True) if generation_config else ""
+
+    with _lock:
+        now = time.monotonic()
+        if _failures.get(key, 0) > now:
+            return None
+        entry = _entries.get(key)
+        if _fresh(entry, now, ttl) and config_key in entry.models:
+            return entry.models[config_key]
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+
+    # Creation and refresh are network calls; the prompt's own lock keeps
+    # concurrent audits from uploading it twice
+    with key_lock:
+        with _lock:
+            now = time.monotonic()
+            if _failures.get(key, 0) > now:
+                return None
+            entry = _entries.get(key)
+            backend = _backend
+
+        if entry is not None and not _fresh(entry, now, ttl):
+            try:
+                entry.handle = backend.extend(entry.handle, ttl)
+                entry.expires_at = now + ttl
+            except Exception as e:
+                logger.warning(f"Refreshing context cache {key[1][:12]} failed, recreating: {e}")
+                entry = None
+
+        if entry is None:
+            try:
+                handle = backend.create(settings.GEMINI_MODEL, system_prompt, ttl)
+            except Exception as e:
+                logger.warning(f"Context caching unavailable for prompt {key[1][:12]}: {e}")
+                with _lock:
+                    _failures[key] = now + ttl
+                    _entries.pop(key, None)
+                return None
+            entry = _Entry(handle, now + ttl)
+            logger.info(f"Created context cache for prompt {key[1][:12]} ({len(system_prompt)} chars)")
+            with _lock:
+                # Forget handles that have lapsed (e.g. for an old ruleset version)
+                for stale in [k for k, e in _entries.items() if e.expires_at <= now]:
+                    del _entries[stale]
+                    stale_lock = _key_locks.get(stale)
+                    if stale_lock is not None and not stale_lock.locked():
+                        del _key_locks[stale]
+                _entries[key] = entry
+
+        model = entry.models.get(config_key)
+        if model is None:
+            model = entry.models[config_key] = backend.model(entry.handle, generation_config)
+        return model
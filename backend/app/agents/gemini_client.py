@@ -1,20 +1,116 @@
 import google.generativeai as genai
+import asyncio
+import hashlib
 import json
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from app.agents import context_cache
 from app.core.config import settings
+from app.services import llm_cache
 
 genai.configure(api_key=settings.GEMINI_API_KEY)
 
+# GenerativeModel objects are cheap to call but not to build; they also hold
+# on to the shared gRPC client once used, so identical models are reused.
+_models: OrderedDict[tuple[str, str, str], genai.GenerativeModel] = OrderedDict()
+_models_lock = threading.Lock()
 
-def invoke(system_prompt: str, user_content: str, expect_json: bool = True):
+
+def get_model(system_prompt: str, generation_config: dict | None = None) -> genai.GenerativeModel:
     """
-    Call Gemini with a system prompt and user content.
-    If expect_json=True, parse the response as JSON.
-    Returns parsed JSON or raw text.
+    Return a cached GenerativeModel for the configured model name, system
+    prompt and generation config, creating it on first use.
+
+    Models are keyed by (model name, system prompt hash, generation config)
+    and evicted least-recently-used beyond settings.GEMINI_MODEL_CACHE_SIZE.
     """
+    key = (
+        settings.GEMINI_MODEL,
+        hashlib.sha256(system_prompt.encode("utf-8")).hexdigest(),
+        json.dumps(generation_config, sort_keys=True) if generation_config else "",
+    )
+    with _models_lock:
+        model = _models.get(key)
+        if model is not None:
+            _models.move_to_end(key)
+            return model
+
     model = genai.GenerativeModel(
         model_name=settings.GEMINI_MODEL,
         system_instruction=system_prompt,
+        generation_config=generation_config,
     )
+    with _models_lock:
+        model = _models.setdefault(key, model)
+        _models.move_to_end(key)
+        while len(_models) > settings.GEMINI_MODEL_CACHE_SIZE:
+            _models.popitem(last=False)
+    return model
+
+
+def _model(system_prompt: str, generation_config: dict | None, use_context_cache: bool):
+    if use_context_cache:
+        model = context_cache.get_cached_model(system_prompt, generation_config)
+        if model is not None:
+            return model
+    return get_model(system_prompt, generation_config)
+
+
+def _parse(text: str, expect_json: bool):
+    if expect_json:
+        # Strip markdown code fences if present
+        if text.startswith("```"):
+            lines = text.split("\n")
+            text = "\n".join(lines[1:-1]).strip()
+        return json.loads(text)
+    return text
+
+
+def _ttl(cache_ttl: int | None) -> int:
+    return settings.LLM_CACHE_DEFAULT_TTL if cache_ttl is None else cache_ttl
+
+
+def _accepted(chunks: list[str], validate: Callable[[str], object] | None) -> bool:
+    """Return True if a completed stream may be cached: *validate*, when
+    given, must accept the full response text without raising."""
+    if validate is None:
+        return True
+    try:
+        validate("".join(chunks))
+    except Exception:
+        return False
+    return True
+
+
+def invoke(
+    system_prompt: str,
+    user_content: str,
+    expect_json: bool = True,
+    generation_config: dict | None = None,
+    cache_ttl: int | None = None,
+    bypass_cache: bool = False,
+    use_context_cache: bool = False,
+):
+    """
+    Call Gemini with a system prompt and user content.
+    If expect_json=True, parse the response as JSON.
+    Returns parsed JSON or raw text.
+
+    Responses are served from / stored in the persistent response cache for
+    cache_ttl seconds (default settings.LLM_CACHE_DEFAULT_TTL; 0 skips
+    storing). bypass_cache=True neither reads nor writes the cache.
+
+    use_context_cache=True sends the system prompt as a server-side cached
+    context (see app.agents.context_cache) when available; use it for long
+    prompts that repeat across calls.
+    """
+    key = llm_cache.cache_key(settings.GEMINI_MODEL, system_prompt, user_content, generation_config)
+    cached = None if bypass_cache else llm_cache.get(key)
+    if cached is not None:
+        return _parse("".join(cached).strip(), expect_json)
+
+    model = _model(system_prompt, generation_config, use_context_cache)
     response = model.generate_content(user_content)
     try:
         text = response.text.strip()
@@ -25,29 +121,124 @@ def invoke(system_prompt: str, user_content: str, expect_json: bool = True):
             return []
         return ""
 
-    if expect_json:
-        # Strip markdown code fences if present
-        if text.startswith("```"):
-            lines = text.split("\n")
-            text = "\n".join(lines[1:-1]).strip()
-        return json.loads(text)
-    return text
+    result = _parse(text, expect_json)
+    # Only cache responses that parsed, so a malformed answer is retried next time
+    if not bypass_cache:
+        llm_cache.put(key, [text], _ttl(cache_ttl))
+    return result
+
+
+async def invoke_async(
+    system_prompt: str,
+    user_content: str,
+    expect_json: bool = True,
+    generation_config: dict | None = None,
+    cache_ttl: int | None = None,
+    bypass_cache: bool = False,
+    use_context_cache: bool = False,
+):
+    """
+    Async variant of invoke(): awaits Gemini without blocking a thread.
+    """
+    key = llm_cache.cache_key(settings.GEMINI_MODEL, system_prompt, user_content, generation_config)
+    cached = None if bypass_cache else await asyncio.to_thread(llm_cache.get, key)
+    if cached is not None:
+        return _parse("".join(cached).strip(), expect_json)
 
+    if use_context_cache:
+        # Creating or refreshing the cached context is a network round trip
+        model = await asyncio.to_thread(_model, system_prompt, generation_config, True)
+    else:
+        model = get_model(system_prompt, generation_config)
+    response = await model.generate_content_async(user_content)
+    try:
+        text = response.text.strip()
+    except ValueError:
+        if expect_json:
+            return []
+        return ""
+
+    result = _parse(text, expect_json)
+    if not bypass_cache:
+        await asyncio.to_thread(llm_cache.put, key, [text], _ttl(cache_ttl))
+    return result
 
-def invoke_streaming(system_prompt: str, user_content: str):
+
+def invoke_streaming(
+    system_prompt: str,
+    user_content: str,
+    generation_config: dict | None = None,
+    cache_ttl: int | None = None,
+    bypass_cache: bool = False,
+    use_context_cache: bool = False,
+    validate: Callable[[str], object] | None = None,
+):
     """
     Call Gemini with streaming enabled.
     Yields text chunks as they arrive from the model.
+
+    A cached response is replayed chunk by chunk; a fresh one is cached once
+    the stream completes, and only if *validate* (called with the full
+    response text) does not raise, so an answer the caller cannot use is
+    retried next time. cache_ttl, bypass_cache and use_context_cache
+    behave as in invoke().
     """
-    model = genai.GenerativeModel(
-        model_name=settings.GEMINI_MODEL,
-        system_instruction=system_prompt,
-    )
+    key = llm_cache.cache_key(settings.GEMINI_MODEL, system_prompt, user_content, generation_config)
+    cached = None if bypass_cache else llm_cache.get(key)
+    if cached is not None:
+        yield from cached
+        return
+
+    model = _model(system_prompt, generation_config, use_context_cache)
     response = model.generate_content(user_content, stream=True)
+    chunks = []
     for chunk in response:
         try:
             if chunk.text:
+                chunks.append(chunk.text)
                 yield chunk.text
         except ValueError:
             # Skip chunks with no valid text Part
             pass
+
+    if not bypass_cache and _accepted(chunks, validate):
+        llm_cache.put(key, chunks, _ttl(cache_ttl))
+
+
+async def invoke_streaming_async(
+    system_prompt: str,
+    user_content: str,
+    generation_config: dict | None = None,
+    cache_ttl: int | None = None,
+    bypass_cache: bool = False,
+    use_context_cache: bool = False,
+    validate: Callable[[str], object] | None = None,
+):
+    """
+    Async variant of invoke_streaming(): an async generator of text chunks,
+    so a single event loop can serve many concurrent streams.
+    """
+    key = llm_cache.cache_key(settings.GEMINI_MODEL, system_prompt, user_content, generation_config)
+    cached = None if bypass_cache else await asyncio.to_thread(llm_cache.get, key)
+    if cached is not None:
+        for chunk in cached:
+            yield chunk
+        return
+
+    if use_context_cache:
+        # Creating or refreshing the cached context is a network round trip
+        model = await asyncio.to_thread(_model, system_prompt, generation_config, True)
+    else:
+        model = get_model(system_prompt, generation_config)
+    response = await model.generate_content_async(user_content, stream=True)
+    chunks = []
+    async for chunk in response:
+        try:
+            if chunk.text:
+                chunks.append(chunk.text)
+                yield chunk.text
+        except ValueError:
+            pass
+
+    if not bypass_cache and _accepted(chunks, validate):
+        await asyncio.to_thread(llm_cache.put, key, chunks, _ttl(cache_ttl))
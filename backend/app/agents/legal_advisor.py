@@ -1,6 +1,9 @@
 from app.agents.gemini_client import invoke
 from app.services.regulation_service import get_article_context
 
+# Explanations depend only on the reference and its regulatory text
+CACHE_TTL = 7 * 24 * 3600
+
 LEGAL_ADVISOR_SYSTEM_PROMPT = """You are a regulatory legal advisor specializing in financial technology compliance.
 
 Your role: Explain regulations in plain language for a non-technical compliance officer.
@@ -45,6 +48,7 @@ def run_legal_advisor(regulation_ref: str) -> str:
         system_prompt=LEGAL_ADVISOR_SYSTEM_PROMPT,
         user_content=user_content,
         expect_json=False,
+        cache_ttl=CACHE_TTL,
     )
 
     return explanation
@@ -54,11 +54,23 @@ def run_strategist(violations: list[dict]) -> list[dict]:
     return plans
 
 
-def run_strategist_streaming(violations: list[dict]):
+def _parse_plans(text: str) -> list[dict]:
+    """Parse a streamed Strategist response, raising ValueError unless it is a JSON array."""
+    text = text.strip()
+    if text.startswith("```"):
+        lines = text.split("\n")
+        text = "\n".join(lines[1:-1]).strip()
+    plans = json.loads(text)
+    if not isinstance(plans, list):
+        raise ValueError("Strategist response is not a JSON array of plans")
+    return plans
+
+
+async def run_strategist_streaming(violations: list[dict]):
     """
-    Generator that yields SSE-compatible event dicts as it builds remediation plans.
+    Async generator that yields SSE-compatible event dicts as it builds remediation plans.
     """
-    from app.agents.gemini_client import invoke_streaming
+    from app.agents.gemini_client import invoke_streaming_async
 
     yield {
         "event": "reasoning_chunk",
@@ -89,7 +101,9 @@ def run_strategist_streaming(violations: list[dict]):
 
     # Stream Gemini reasoning
     full_response = ""
-    for chunk in invoke_streaming(system_prompt=STRATEGIST_SYSTEM_PROMPT, user_content=user_content):
+    async for chunk in invoke_streaming_async(
+        system_prompt=STRATEGIST_SYSTEM_PROMPT, user_content=user_content, validate=_parse_plans
+    ):
         full_response += chunk
         yield {
             "event": "reasoning_chunk",
@@ -97,17 +111,9 @@ def run_strategist_streaming(violations: list[dict]):
         }
 
     # Parse plans from complete response
-    text = full_response.strip()
-    if text.startswith("```"):
-        lines = text.split("\n")
-        text = "\n".join(lines[1:-1]).strip()
-
     try:
-        plans = json.loads(text)
-    except json.JSONDecodeError:
-        plans = []
-
-    if not isinstance(plans, list):
+        plans = _parse_plans(full_response)
+    except ValueError:
         plans = []
 
     for p in plans:
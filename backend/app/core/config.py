@@ -6,11 +6,37 @@ load_dotenv()
 class Settings:
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
     GEMINI_MODEL: str = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+    GEMINI_MODEL_CACHE_SIZE: int = int(os.getenv("GEMINI_MODEL_CACHE_SIZE", "32"))  # reusable model objects
+    LLM_CACHE_MAX_BYTES: int = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))  # 0 disables
+    LLM_CACHE_DEFAULT_TTL: int = int(os.getenv("LLM_CACHE_DEFAULT_TTL", str(24 * 3600)))  # seconds
+    GEMINI_CONTEXT_CACHE_TTL: int = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))  # seconds; 0 disables
+    GEMINI_CONTEXT_CACHE_MIN_TOKENS: int = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", "4096"))  # model's minimum cacheable prompt
+    RULE_ENGINE_ENABLED: bool = os.getenv("RULE_ENGINE_ENABLED", "true").lower() in ("1", "true", "yes")
+    AUDITOR_BATCH_TOKENS: int = int(os.getenv("AUDITOR_BATCH_TOKENS", "32000"))  # estimated prompt tokens per call
+    AUDITOR_CONCURRENCY: int = int(os.getenv("AUDITOR_CONCURRENCY", "4"))  # batches audited at once per scan
+    AUDITOR_CHUNK_OVERLAP_LINES: int = int(os.getenv("AUDITOR_CHUNK_OVERLAP_LINES", "20"))  # shared by consecutive excerpts
     GITHUB_CLIENT_ID: str = os.getenv("GITHUB_CLIENT_ID", "")
     GITHUB_CLIENT_SECRET: str = os.getenv("GITHUB_CLIENT_SECRET", "")
     GITHUB_REDIRECT_URI: str = os.getenv("GITHUB_REDIRECT_URI", "http://localhost:8000/api/v1/github/callback")
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./comply.db")
     FRONTEND_URL: str = os.getenv("FRONTEND_URL", "http://localhost:3000")
+    # GitHub repository ingestion
+    GITHUB_FETCH_CONCURRENCY: int = int(os.getenv("GITHUB_FETCH_CONCURRENCY", "8"))
+    GITHUB_FETCH_MODE: str = os.getenv("GITHUB_FETCH_MODE", "contents")  # contents | graphql | archive
+    GITHUB_GRAPHQL_BATCH_SIZE: int = int(os.getenv("GITHUB_GRAPHQL_BATCH_SIZE", "100"))
+    GITHUB_CLIENT_TTL: int = int(os.getenv("GITHUB_CLIENT_TTL", "900"))  # seconds an idle pooled client is kept
+    GITHUB_ETAG_CACHE_ENTRIES: int = int(os.getenv("GITHUB_ETAG_CACHE_ENTRIES", "128"))  # per token
+    GITHUB_ETAG_CACHE_BYTES: int = int(os.getenv("GITHUB_ETAG_CACHE_BYTES", str(64 * 1024 * 1024)))  # all tokens together
+    GITHUB_RATE_LIMIT_RESERVE: int = int(os.getenv("GITHUB_RATE_LIMIT_RESERVE", "100"))
+    GITHUB_RATE_LIMIT_MAX_WAIT: int = int(os.getenv("GITHUB_RATE_LIMIT_MAX_WAIT", "120"))  # seconds
+    SCAN_MAX_FILE_BYTES: int = int(os.getenv("SCAN_MAX_FILE_BYTES", str(1024 * 1024)))  # 0 disables
+    BLOB_CACHE_MAX_BYTES: int = int(os.getenv("BLOB_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))  # 0 disables
+    # Continuous scanning (push webhooks)
+    GITHUB_WEBHOOK_SECRET: str = os.getenv("GITHUB_WEBHOOK_SECRET", "")
+    SCAN_QUEUE_DEBOUNCE: int = int(os.getenv("SCAN_QUEUE_DEBOUNCE", "60"))  # seconds
+    SCAN_QUEUE_MAX_DELAY: int = int(os.getenv("SCAN_QUEUE_MAX_DELAY", "300"))  # seconds
+    SCAN_QUEUE_WORKERS: int = int(os.getenv("SCAN_QUEUE_WORKERS", "2"))
+    BULK_SCAN_CONCURRENCY: int = int(os.getenv("BULK_SCAN_CONCURRENCY", "4"))  # across all bulk jobs
     # Miro OAuth + MCP
     MIRO_CLIENT_ID: str = os.getenv("MIRO_CLIENT_ID", "3458764660706404976")
     MIRO_CLIENT_SECRET: str = os.getenv("MIRO_CLIENT_SECRET", "F9K8AcKSmtKxQVpLF72m4bCVGTPPjq9b")
@@ -33,6 +33,25 @@ def init_db() -> None:
         )
     """)
 
+    # Migration: diff-scan refs, pinned snapshot commit, ruleset version and
+    # owning bulk scan for existing databases
+    for column in ("base_ref", "head_ref", "commit_sha", "ruleset_version", "bulk_scan_id"):
+        try:
+            cursor.execute(f"ALTER TABLE scans ADD COLUMN {column} TEXT")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS bulk_scans (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            source TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
+
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS violations (
             id TEXT PRIMARY KEY,
@@ -138,6 +157,62 @@ def init_db() -> None:
         )
     """)
 
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scan_files (
+            scan_id TEXT NOT NULL REFERENCES scans(id),
+            path TEXT NOT NULL,
+            blob_sha TEXT NOT NULL,
+            PRIMARY KEY (scan_id, path)
+        )
+    """)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_scan_files_blob_sha ON scan_files (blob_sha)"
+    )
+
+    # Content of every scanned file, keyed by git blob SHA; scan_files is the
+    # per-scan manifest pointing into it
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS snapshot_blobs (
+            sha TEXT PRIMARY KEY,
+            content TEXT NOT NULL
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scan_skipped_files (
+            scan_id TEXT NOT NULL REFERENCES scans(id),
+            path TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            size INTEGER,
+            PRIMARY KEY (scan_id, path)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS blob_cache (
+            sha TEXT PRIMARY KEY,
+            content TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            last_accessed TEXT NOT NULL
+        )
+    """)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_blob_cache_last_accessed ON blob_cache (last_accessed)"
+    )
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            chunks TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            expires_at TEXT NOT NULL,
+            last_accessed TEXT NOT NULL
+        )
+    """)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_llm_cache_last_accessed ON llm_cache (last_accessed)"
+    )
+
     # Billing data (subscriptions, usage_events, enterprise_requests) is stored
     # in Firestore – not in SQLite.
 
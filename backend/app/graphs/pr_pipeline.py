@@ -1,9 +1,12 @@
+import logging
 from typing import TypedDict
 from langgraph.graph import StateGraph, END
 from app.agents.auditor import run_auditor
 from app.agents.code_generator import run_code_generator
 from app.agents.strategist import run_strategist
 
+logger = logging.getLogger(__name__)
+
 
 class PRState(TypedDict):
     repo_files: dict          # Original repo files (immutable)
@@ -64,8 +67,29 @@ def code_gen_node(state: PRState) -> dict:
 
 
 def qa_rescan_node(state: PRState) -> dict:
-    new_violations = run_auditor(state["current_files"], is_qa_rescan=True)
     iteration = state["qa_iterations"] + 1
+    try:
+        new_violations = run_auditor(state["current_files"], is_qa_rescan=True)
+    except Exception as e:
+        # A failed QA pass is not clean, but leaves nothing to replan;
+        # the fixes made so far still go into the PR
+        logger.warning(f"QA re-scan iteration {iteration} failed: {e}")
+        return {
+            "qa_iterations": iteration,
+            "qa_clean": False,
+            "qa_violations": [],
+            "qa_history": state["qa_history"] + [{
+                "iteration": iteration,
+                "violations": [],
+                "plans": [],
+                "is_clean": False,
+            }],
+            "reasoning_log": state["reasoning_log"] + [{
+                "agent": "QA Re-scan",
+                "action": f"iteration {iteration}",
+                "output": f"Failed: {e}"
+            }]
+        }
     is_clean = len(new_violations) == 0
 
     history_entry = {
@@ -108,7 +132,7 @@ def strategist_replan_node(state: PRState) -> dict:
 
 
 def qa_router(state: PRState) -> str:
-    if state["qa_clean"]:
+    if state["qa_clean"] or not state["qa_violations"]:
         return "done"
     elif state["qa_iterations"] >= 3:
         return "done"
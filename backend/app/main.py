@@ -1,3 +1,4 @@
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
@@ -5,12 +6,21 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.router import router as api_router
 from app.database import init_db
+from app.services import bulk_scan
+from app.services.continuous_scan import scan_queue
+from app.services.scan_runner import use_event_loop
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
+    bulk_scan.fail_interrupted_bulk_scans()
+    # Background scans share the server's loop with the SSE scans
+    use_event_loop(asyncio.get_running_loop())
     yield
+    scan_queue.shutdown(wait=False)
+    bulk_scan.shutdown(wait=False)
+    use_event_loop(None)
 
 
 app = FastAPI(title="Comply API", version="0.1.0", lifespan=lifespan)
@@ -82,6 +82,17 @@ class QAResult(BaseModel):
 class ScanRequest(BaseModel):
     repo_owner: str
     repo_name: str
+    # Diff mode: audit only the files changed between base_ref and head_ref
+    base_ref: Optional[str] = None
+    head_ref: Optional[str] = None
+
+
+class BulkScanRequest(BaseModel):
+    # Scan every repo in this GitHub org, or the listed "owner/name" repos;
+    # with neither, every repo the connected account can access
+    org: Optional[str] = None
+    repos: Optional[List[str]] = None
+    include_archived: bool = False
 
 
 class ApproveRequest(BaseModel):
@@ -4,9 +4,10 @@ from app.api.deps import get_current_user
 from app.core.security import _ensure_firebase_initialized
 from app.database import get_db
 from app.models.schemas import ChatRequest
-from app.agents.gemini_client import invoke_streaming
+from app.agents.gemini_client import invoke_streaming_async
 from app.services.regulation_service import get_article_context
 from firebase_admin import auth as firebase_auth
+import asyncio
 import json
 import uuid
 from datetime import datetime
@@ -145,12 +146,12 @@ def stream_chat(scan_id: str, question: str = Query(...), token: str = Query(...
     if not scan:
         raise HTTPException(status_code=404, detail="Scan not found")
 
-    def event_generator():
+    async def event_generator():
         try:
-            _save_message(scan_id, user_id, "user", question)
+            await asyncio.to_thread(_save_message, scan_id, user_id, "user", question)
 
-            violations_summary, regulation_context = _build_violations_summary(scan_id)
-            history = _get_conversation_history(scan_id, user_id)
+            violations_summary, regulation_context = await asyncio.to_thread(_build_violations_summary, scan_id)
+            history = await asyncio.to_thread(_get_conversation_history, scan_id, user_id)
 
             system_prompt = ADVISOR_SYSTEM_PROMPT.format(
                 violations_summary=violations_summary,
@@ -168,12 +169,13 @@ def stream_chat(scan_id: str, question: str = Query(...), token: str = Query(...
                 user_content += f"CONVERSATION HISTORY:\n{history_text}\n"
             user_content += f"CURRENT QUESTION:\n{question}"
 
+            # Conversations are not cached: a repeated question deserves a fresh answer
             full_response = ""
-            for chunk in invoke_streaming(system_prompt=system_prompt, user_content=user_content):
+            async for chunk in invoke_streaming_async(system_prompt=system_prompt, user_content=user_content, bypass_cache=True):
                 full_response += chunk
                 yield f"data: {json.dumps({'chunk': chunk})}\n\n"
 
-            _save_message(scan_id, user_id, "assistant", full_response)
+            await asyncio.to_thread(_save_message, scan_id, user_id, "assistant", full_response)
 
             yield f"event: done\ndata: {json.dumps({'complete': True})}\n\n"
 
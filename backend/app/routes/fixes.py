@@ -5,7 +5,9 @@ from app.api.plan_guard import require_feature
 from app.database import get_db
 from app.models.schemas import ApproveRequest, CreatePRsRequest
 from app.services.github_service import get_repo_infra_files, create_pr
+from app.services.repo_snapshot import load_snapshot
 from app.graphs.pr_pipeline import pr_app
+import asyncio
 import json
 import uuid
 import logging
@@ -16,6 +18,21 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+def _load_scanned_files(scan, access_token: str) -> tuple[str | None, dict[str, str]]:
+    """Return ``(commit_sha, files)`` the scan audited.
+
+    Scans recorded before snapshots existed fall back to fetching the
+    current head of the scanned branch (the default branch, or a diff
+    scan's head_ref).
+    """
+    commit_sha, repo_files = load_snapshot(scan["id"])
+    if not repo_files:
+        logger.info(f"No snapshot for scan {scan['id']}; fetching repository files")
+        commit_sha = None
+        repo_files = get_repo_infra_files(access_token, scan["repo_owner"], scan["repo_name"], ref=scan["head_ref"])
+    return commit_sha, repo_files
+
+
 @router.post("/fixes/approve")
 def approve_fixes(req: ApproveRequest, user: dict = Depends(get_current_user)):
     """Mark specific violations as approved for remediation."""
@@ -97,13 +114,11 @@ def create_prs(
             status_code=400, detail="No approved fixes to generate PRs for"
         )
 
-    # Get repo files
-    repo_files = get_repo_infra_files(
-        access_token, scan["repo_owner"], scan["repo_name"]
-    )
-
     db.close()
 
+    # Files exactly as scanned, so fixes apply to the audited content
+    commit_sha, repo_files = _load_scanned_files(scan, access_token)
+
     try:
         # Run PR pipeline
         result = pr_app.invoke(
@@ -135,8 +150,10 @@ def create_prs(
 
         # Use original approved_plans for PR description (all_fixes.plans gets
         # overwritten by QA loop iterations, but the PR should list all approved violations)
+        # A diff scan audited the head branch, so its fixes go back to it
         pr_result = create_pr(
-            access_token, scan["repo_owner"], scan["repo_name"], file_fixes, approved_plans
+            access_token, scan["repo_owner"], scan["repo_name"], file_fixes, approved_plans,
+            base_sha=commit_sha, base_branch=scan["head_ref"],
         )
 
         # Save to DB
@@ -200,9 +217,8 @@ def stream_create_prs(scan_id: str = Query(...), token: str = Query(...)):
     from app.core.security import _ensure_firebase_initialized
     from firebase_admin import auth as firebase_auth
     from app.agents.code_generator import run_code_generator_streaming
-    from app.agents.auditor import run_auditor
+    from app.agents.auditor import run_auditor_async
     from app.agents.strategist import run_strategist_streaming
-    from app.services.github_service import get_repo_infra_files, create_pr
 
     _ensure_firebase_initialized()
     try:
@@ -240,15 +256,15 @@ def stream_create_prs(scan_id: str = Query(...), token: str = Query(...)):
         db.close()
         raise HTTPException(status_code=400, detail="No approved fixes to generate PRs for")
 
-    repo_files = get_repo_infra_files(access_token, scan["repo_owner"], scan["repo_name"])
     db.close()
+    commit_sha, repo_files = _load_scanned_files(scan, access_token)
 
     def format_sse(event: str, data: dict) -> str:
         return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
     logger.info(f"PR stream: scan={scan_id}, approved_plans={len(approved_plans)}, repo_files={len(repo_files)}")
 
-    def event_generator():
+    async def event_generator():
         reasoning_traces: dict[str, list[str]] = {}
         current_files = dict(repo_files)
         current_plans = list(approved_plans)
@@ -268,7 +284,7 @@ def stream_create_prs(scan_id: str = Query(...), token: str = Query(...)):
                 files_fixed = 0
                 for file_path, file_plans in plans_by_file.items():
                     original = current_files.get(file_path, "")
-                    for event in run_code_generator_streaming(file_path, original, file_plans):
+                    async for event in run_code_generator_streaming(file_path, original, file_plans):
                         yield format_sse(event["event"], event["data"])
                         if event["event"] == "reasoning_chunk":
                             reasoning_traces.setdefault("Code Generator", []).append(event["data"].get("chunk", ""))
@@ -293,7 +309,15 @@ def stream_create_prs(scan_id: str = Query(...), token: str = Query(...)):
                 yield format_sse("agent_start", {"agent": "QA Re-scan", "message": f"Re-scanning for new violations (iteration {iteration + 1})..."})
                 reasoning_traces.setdefault("QA Re-scan", []).append(f"Re-scanning (iteration {iteration + 1})...\n")
 
-                new_violations = run_auditor(current_files, is_qa_rescan=True)
+                try:
+                    new_violations = await run_auditor_async(current_files, is_qa_rescan=True)
+                except Exception as qa_err:
+                    # Open the PR with the fixes made so far rather than abort it
+                    logger.warning(f"QA re-scan iteration {iteration + 1} failed: {qa_err}")
+                    qa_history.append({"iteration": iteration + 1, "violations": [], "is_clean": False})
+                    yield format_sse("agent_complete", {"agent": "QA Re-scan", "summary": f"Failed: {qa_err}"})
+                    reasoning_traces.setdefault("QA Re-scan", []).append(f"Failed: {qa_err}\n")
+                    break
                 is_clean = len(new_violations) == 0
 
                 qa_history.append({
@@ -318,7 +342,7 @@ def stream_create_prs(scan_id: str = Query(...), token: str = Query(...)):
                 reasoning_traces.setdefault("Strategist (Replan)", []).append("Replanning...\n")
 
                 new_plans = []
-                for event in run_strategist_streaming(new_violations):
+                async for event in run_strategist_streaming(new_violations):
                     # Override agent name to match the card we created
                     data = dict(event["data"])
                     data["agent"] = "Strategist (Replan)"
@@ -338,29 +362,37 @@ def stream_create_prs(scan_id: str = Query(...), token: str = Query(...)):
 
             # Create PR
             file_fixes = [{"file": f["file"], "fixed_content": f["fixed_content"]} for f in all_fixes.values()]
-            pr_result = create_pr(access_token, scan["repo_owner"], scan["repo_name"], file_fixes, approved_plans)
-
-            # Save to DB
-            db = get_db()
-            db.execute(
-                "INSERT INTO pull_requests (id, scan_id, pr_url, file, violation_count, branch_name) VALUES (?, ?, ?, ?, ?, ?)",
-                (str(uuid.uuid4()), scan_id, pr_result["pr_url"], ",".join(f["file"] for f in file_fixes), len(approved_plans), pr_result["branch"]),
+            pr_result = await asyncio.to_thread(
+                create_pr, access_token, scan["repo_owner"], scan["repo_name"], file_fixes, approved_plans,
+                base_sha=commit_sha, base_branch=scan["head_ref"],
             )
 
-            for entry in qa_history:
-                db.execute(
-                    "INSERT INTO qa_results (id, scan_id, iteration, is_clean, new_violations_json) VALUES (?, ?, ?, ?, ?)",
-                    (str(uuid.uuid4()), scan_id, entry["iteration"], 1 if entry["is_clean"] else 0, json.dumps(entry["violations"])),
-                )
-
-            for agent_name, chunks in reasoning_traces.items():
-                db.execute(
-                    "INSERT INTO reasoning_log (id, scan_id, agent, action, output, full_text, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                    (str(uuid.uuid4()), scan_id, agent_name, "pr_pipeline", "", "".join(chunks) or None, datetime.utcnow().isoformat()),
-                )
-
-            db.commit()
-            db.close()
+            # Save to DB, off the event loop
+            def save_results() -> None:
+                db = get_db()
+                try:
+                    db.execute(
+                        "INSERT INTO pull_requests (id, scan_id, pr_url, file, violation_count, branch_name) VALUES (?, ?, ?, ?, ?, ?)",
+                        (str(uuid.uuid4()), scan_id, pr_result["pr_url"], ",".join(f["file"] for f in file_fixes), len(approved_plans), pr_result["branch"]),
+                    )
+
+                    for entry in qa_history:
+                        db.execute(
+                            "INSERT INTO qa_results (id, scan_id, iteration, is_clean, new_violations_json) VALUES (?, ?, ?, ?, ?)",
+                            (str(uuid.uuid4()), scan_id, entry["iteration"], 1 if entry["is_clean"] else 0, json.dumps(entry["violations"])),
+                        )
+
+                    for agent_name, chunks in reasoning_traces.items():
+                        db.execute(
+                            "INSERT INTO reasoning_log (id, scan_id, agent, action, output, full_text, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (str(uuid.uuid4()), scan_id, agent_name, "pr_pipeline", "", "".join(chunks) or None, datetime.utcnow().isoformat()),
+                        )
+
+                    db.commit()
+                finally:
+                    db.close()
+
+            await asyncio.to_thread(save_results)
 
             yield format_sse("pr_complete", {
                 "pr_url": pr_result["pr_url"],
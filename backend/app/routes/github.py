@@ -1,15 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import RedirectResponse
 from app.api.deps import get_current_user
 from app.core.security import _ensure_firebase_initialized
 from app.core.config import settings
 from app.database import get_db
+from app.services import github_client
+from app.services.continuous_scan import handle_push_event, verify_signature
 from app.services.github_service import (
     exchange_code_for_token,
     get_user_info,
     get_user_repos,
 )
 from firebase_admin import auth as firebase_auth
+import asyncio
+import json
 import uuid
 from datetime import datetime
 import urllib.parse
@@ -98,9 +102,14 @@ def github_status(user: dict = Depends(get_current_user)):
 def github_disconnect(user: dict = Depends(get_current_user)):
     """Remove the stored GitHub token for the authenticated user."""
     db = get_db()
+    row = db.execute(
+        "SELECT access_token FROM github_tokens WHERE user_id = ?", (user["uid"],)
+    ).fetchone()
     db.execute("DELETE FROM github_tokens WHERE user_id = ?", (user["uid"],))
     db.commit()
     db.close()
+    if row:
+        github_client.discard(row["access_token"])
     return {"detail": "GitHub disconnected"}
 
 
@@ -121,3 +130,26 @@ def list_repos(user: dict = Depends(get_current_user)):
 
     repos = get_user_repos(row["access_token"])
     return {"repos": repos}
+
+
+# ── Push webhook (no auth – GitHub signs the request) ───────────────
+
+@router.post("/webhook")
+async def github_webhook(request: Request):
+    """Queue continuous scans for pushes to a repository's default branch."""
+    payload = await request.body()
+    if not verify_signature(payload, request.headers.get("x-hub-signature-256", "")):
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+
+    event = request.headers.get("x-github-event", "")
+    if event == "ping":
+        return {"status": "ok"}
+    if event != "push":
+        return {"status": "ignored"}
+
+    try:
+        body = json.loads(payload)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+    # Looking up subscribers reads the database; keep it off the event loop
+    return {"status": "queued", "scans": await asyncio.to_thread(handle_push_event, body)}
@@ -3,14 +3,15 @@ from fastapi.responses import StreamingResponse
 from app.api.deps import get_current_user
 from app.core.security import _ensure_firebase_initialized
 from app.database import get_db
-from app.models.schemas import ScanRequest
-from app.services.github_service import get_repo_infra_files
-from app.agents.auditor import run_auditor_streaming
-from app.agents.strategist import run_strategist_streaming
+from app.api.plan_guard import get_user_plan
+from app.models.schemas import PLAN_FEATURES, BulkScanRequest, ScanRequest
+from app.services.bulk_scan import get_bulk_scan, start_bulk_scan
+from app.services.github_service import get_org_repos, get_user_repos
+from app.services.repo_snapshot import delete_snapshot
+from app.services.scan_history import get_skipped_files
+from app.services.scan_runner import create_scan, run_scan
 from firebase_admin import auth as firebase_auth
-import uuid
 import json
-from datetime import datetime
 
 router = APIRouter()
 
@@ -32,20 +33,76 @@ def trigger_scan(req: ScanRequest, user: dict = Depends(get_current_user)):
     if not row:
         raise HTTPException(status_code=400, detail="GitHub not connected.")
 
-    # Create scan record
-    scan_id = str(uuid.uuid4())
-    now = datetime.utcnow().isoformat()
-    db = get_db()
-    db.execute(
-        "INSERT INTO scans (id, user_id, repo_url, repo_owner, repo_name, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-        (scan_id, user_id, f"{req.repo_owner}/{req.repo_name}", req.repo_owner, req.repo_name, "pending", now, now),
-    )
-    db.commit()
-    db.close()
+    if bool(req.base_ref) != bool(req.head_ref):
+        raise HTTPException(
+            status_code=400, detail="Diff scans require both base_ref and head_ref."
+        )
 
+    scan_id = create_scan(user_id, req.repo_owner, req.repo_name, req.base_ref, req.head_ref)
     return {"scan_id": scan_id}
 
 
+@router.post("/scans/bulk")
+def trigger_bulk_scan(req: BulkScanRequest, user: dict = Depends(get_current_user)):
+    """Scan every repository in an org, a given list, or the whole account.
+
+    Repositories are scanned in the background under a global concurrency
+    limit; poll ``GET /scans/bulk/{bulk_scan_id}`` for progress.
+    """
+    user_id = user["uid"]
+    db = get_db()
+    try:
+        row = db.execute(
+            "SELECT access_token FROM github_tokens WHERE user_id = ?", (user_id,)
+        ).fetchone()
+    finally:
+        db.close()
+
+    if not row:
+        raise HTTPException(status_code=400, detail="GitHub not connected.")
+    access_token = row["access_token"]
+
+    if req.repos:
+        source = "list"
+        repos = []
+        for full_name in req.repos:
+            owner, _, name = full_name.partition("/")
+            if not owner or not name:
+                raise HTTPException(status_code=400, detail=f"Invalid repository '{full_name}', expected owner/name.")
+            repos.append((owner, name))
+    else:
+        if req.org:
+            source = f"org:{req.org}"
+            listed = get_org_repos(access_token, req.org)
+        else:
+            source = "account"
+            listed = get_user_repos(access_token)
+        repos = [
+            (r["owner"], r["name"]) for r in listed if req.include_archived or not r["archived"]
+        ]
+    repos = list(dict.fromkeys(repos))
+
+    plan = get_user_plan(user_id)
+    max_repos = PLAN_FEATURES.get(plan, PLAN_FEATURES["free"]).get("max_repos", 1)
+    if max_repos != -1 and len(repos) > max_repos:
+        raise HTTPException(
+            status_code=403,
+            detail=f"Your {plan} plan allows up to {max_repos} repo(s); this bulk scan covers {len(repos)}. Upgrade to add more.",
+        )
+
+    bulk_id = start_bulk_scan(user_id, access_token, source, repos)
+    return {"bulk_scan_id": bulk_id, "total_repos": len(repos)}
+
+
+@router.get("/scans/bulk/{bulk_scan_id}")
+def get_bulk_scan_status(bulk_scan_id: str, user: dict = Depends(get_current_user)):
+    """Per-repository progress and aggregated summary of a bulk scan."""
+    result = get_bulk_scan(bulk_scan_id, user["uid"])
+    if result is None:
+        raise HTTPException(status_code=404, detail="Bulk scan not found")
+    return result
+
+
 def format_sse(event: str, data: dict) -> str:
     """Format a dict as an SSE event string."""
     return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -80,132 +137,9 @@ def stream_scan(scan_id: str, token: str = Query(...)):
     if not gh_row:
         raise HTTPException(status_code=400, detail="GitHub not connected.")
 
-    access_token = gh_row["access_token"]
-    repo_owner = scan["repo_owner"]
-    repo_name = scan["repo_name"]
-
-    def event_generator():
-        reasoning_traces: dict[str, list[str]] = {}
-
-        try:
-            # Update status to scanning
-            db = get_db()
-            db.execute(
-                "UPDATE scans SET status = 'scanning', updated_at = ? WHERE id = ?",
-                (datetime.utcnow().isoformat(), scan_id),
-            )
-            db.commit()
-            db.close()
-
-            # Fetch infra files
-            yield format_sse("agent_start", {"agent": "Auditor", "message": "Fetching repository files..."})
-            reasoning_traces.setdefault("Auditor", []).append("Fetching repository files...\n")
-            repo_files = get_repo_infra_files(access_token, repo_owner, repo_name)
-
-            if not repo_files:
-                yield format_sse("agent_complete", {"agent": "Auditor", "summary": "No infrastructure files found"})
-                yield format_sse("scan_complete", {"scan_id": scan_id, "status": "completed"})
-                db = get_db()
-                db.execute(
-                    "UPDATE scans SET status = 'completed', updated_at = ? WHERE id = ?",
-                    (datetime.utcnow().isoformat(), scan_id),
-                )
-                db.commit()
-                db.close()
-                return
-
-            # Run auditor (streaming)
-            violations = []
-            for event in run_auditor_streaming(repo_files):
-                yield format_sse(event["event"], event["data"])
-                if event["event"] == "reasoning_chunk":
-                    reasoning_traces.setdefault(event["data"].get("agent", "Auditor"), []).append(event["data"].get("chunk", ""))
-                if event["event"] == "agent_complete":
-                    violations = event["data"].get("violations", [])
-
-            # Save violations to DB with unique IDs (Gemini reuses simple IDs like V-001 across scans)
-            db = get_db()
-            for v in violations:
-                vid = str(uuid.uuid4())
-                v["db_id"] = vid  # Track the DB ID for plan linking
-                db.execute(
-                    "INSERT INTO violations (id, scan_id, rule_id, severity, file, line, resource, field, current_value, description, regulation_ref) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                    (vid, scan_id, v.get("rule_id", ""), v.get("severity", "medium"), v.get("file", ""), v.get("line"), v.get("resource"), v.get("field"), v.get("current_value"), v.get("description", ""), v.get("regulation_ref", "")),
-                )
-            db.commit()
-            db.close()
-
-            # Save auditor reasoning log
-            auditor_full_text = "".join(reasoning_traces.get("Auditor", []))
-            db = get_db()
-            db.execute(
-                "INSERT INTO reasoning_log (id, scan_id, agent, action, output, full_text, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (str(uuid.uuid4()), scan_id, "Auditor", "scan", f"{len(violations)} violations detected", auditor_full_text or None, datetime.utcnow().isoformat()),
-            )
-            db.commit()
-            db.close()
-
-            # Run strategist (streaming) — isolated so auditor results are preserved on failure
-            plans = []
-            try:
-                yield format_sse("agent_start", {"agent": "Strategist", "message": "Building remediation plans..."})
-                reasoning_traces.setdefault("Strategist", []).append("Building remediation plans...\n")
-                for event in run_strategist_streaming(violations):
-                    yield format_sse(event["event"], event["data"])
-                    if event["event"] == "reasoning_chunk":
-                        reasoning_traces.setdefault(event["data"].get("agent", "Strategist"), []).append(event["data"].get("chunk", ""))
-                    if event["event"] == "agent_complete":
-                        plans = event["data"].get("plans", [])
-
-                # Save plans to DB, linking to the DB violation IDs
-                vid_map = {v.get("violation_id", ""): v.get("db_id", "") for v in violations}
-                db = get_db()
-                for p in plans:
-                    pid = str(uuid.uuid4())
-                    db_vid = vid_map.get(p.get("violation_id", ""), p.get("violation_id", ""))
-                    db.execute(
-                        "INSERT INTO remediation_plans (id, scan_id, violation_id, explanation, regulation_citation, what_needs_to_change, sample_fix, estimated_effort, priority, file, approved) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                        (pid, scan_id, db_vid, p.get("explanation", ""), p.get("regulation_citation", ""), p.get("what_needs_to_change", ""), p.get("sample_fix"), p.get("estimated_effort"), p.get("priority", "P2"), p.get("file", ""), 0),
-                    )
-                strategist_full_text = "".join(reasoning_traces.get("Strategist", []))
-                db.execute(
-                    "INSERT INTO reasoning_log (id, scan_id, agent, action, output, full_text, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                    (str(uuid.uuid4()), scan_id, "Strategist", "plan", f"{len(plans)} remediation plans produced", strategist_full_text or None, datetime.utcnow().isoformat()),
-                )
-                db.commit()
-                db.close()
-
-            except Exception as strat_err:
-                yield format_sse("agent_complete", {"agent": "Strategist", "summary": f"Failed: {strat_err}"})
-                strategist_full_text = "".join(reasoning_traces.get("Strategist", []))
-                db = get_db()
-                db.execute(
-                    "INSERT INTO reasoning_log (id, scan_id, agent, action, output, full_text, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                    (str(uuid.uuid4()), scan_id, "Strategist", "plan", f"Error: {strat_err}", strategist_full_text or None, datetime.utcnow().isoformat()),
-                )
-                db.commit()
-                db.close()
-
-            # Mark scan completed (violations are always preserved)
-            db = get_db()
-            db.execute(
-                "UPDATE scans SET status = 'completed', updated_at = ? WHERE id = ?",
-                (datetime.utcnow().isoformat(), scan_id),
-            )
-            db.commit()
-            db.close()
-
-            yield format_sse("scan_complete", {"scan_id": scan_id, "status": "completed"})
-
-        except Exception as e:
-            db = get_db()
-            db.execute(
-                "UPDATE scans SET status = 'failed', updated_at = ? WHERE id = ?",
-                (datetime.utcnow().isoformat(), scan_id),
-            )
-            db.commit()
-            db.close()
-            yield format_sse("scan_error", {"message": str(e)})
+    async def event_generator():
+        async for event in run_scan(scan, gh_row["access_token"]):
+            yield format_sse(event["event"], event["data"])
 
     return StreamingResponse(
         event_generator(),
@@ -305,11 +239,16 @@ def get_scan(scan_id: str, user: dict = Depends(get_current_user)):
         "repo_owner": scan["repo_owner"],
         "repo_name": scan["repo_name"],
         "status": scan["status"],
+        "base_ref": scan["base_ref"],
+        "head_ref": scan["head_ref"],
+        "commit_sha": scan["commit_sha"],
+        "ruleset_version": scan["ruleset_version"],
         "created_at": scan["created_at"],
         "violations": violations,
         "remediation_plans": plans,
         "reasoning_log": reasoning,
         "pull_requests": prs,
+        "skipped_files": get_skipped_files(scan_id),
     }
 
 
@@ -331,6 +270,8 @@ def delete_scan(scan_id: str, user: dict = Depends(get_current_user)):
     db.execute("DELETE FROM pull_requests WHERE scan_id = ?", (scan_id,))
     db.execute("DELETE FROM qa_results WHERE scan_id = ?", (scan_id,))
     db.execute("DELETE FROM approved_fixes WHERE scan_id = ?", (scan_id,))
+    delete_snapshot(db, scan_id)
+    db.execute("DELETE FROM scan_skipped_files WHERE scan_id = ?", (scan_id,))
     db.execute("DELETE FROM remediation_plans WHERE scan_id = ?", (scan_id,))
     db.execute("DELETE FROM violations WHERE scan_id = ?", (scan_id,))
     db.execute("DELETE FROM scans WHERE id = ?", (scan_id,))
@@ -0,0 +1,126 @@
+"""
+Content-addressed cache of repository file contents keyed by git blob SHA.
+
+Git blob SHAs identify file content exactly, so a cached entry never needs
+invalidation: if the tree still points at the same SHA, the cached text is
+the file.  Entries live in the ``blob_cache`` SQLite table and are evicted
+least-recently-used once the total cached size exceeds
+``settings.BLOB_CACHE_MAX_BYTES``.
+"""
+
+import hashlib
+from datetime import datetime
+
+from app.core.config import settings
+from app.database import get_db
+
+# SQLite caps the number of bound parameters per statement.
+_SQL_BATCH = 500
+
+
+def git_blob_sha(data: bytes) -> str:
+    """Return the git blob SHA-1 for raw file bytes (as ``git hash-object``)."""
+    header = f"blob {len(data)}\0".encode()
+    return hashlib.sha1(header + data).hexdigest()
+
+
+def get_blobs(shas: list[str]) -> dict[str, str]:
+    """Return cached contents for the given blob SHAs, marking them as used.
+
+    Args:
+        shas: Blob SHAs to look up.
+
+    Returns:
+        A dict mapping each cached SHA to its text content. Misses are absent.
+    """
+    found: dict[str, str] = {}
+    if not shas:
+        return found
+
+    now = datetime.utcnow().isoformat()
+    unique = list(dict.fromkeys(shas))
+    db = get_db()
+    try:
+        for i in range(0, len(unique), _SQL_BATCH):
+            batch = unique[i:i + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = db.execute(
+                f"SELECT sha, content FROM blob_cache WHERE sha IN ({placeholders})",
+                batch,
+            ).fetchall()
+            for row in rows:
+                found[row["sha"]] = row["content"]
+            if rows:
+                hit = [row["sha"] for row in rows]
+                db.execute(
+                    f"UPDATE blob_cache SET last_accessed = ? WHERE sha IN ({','.join('?' * len(hit))})",
+                    [now, *hit],
+                )
+        db.commit()
+    finally:
+        db.close()
+    return found
+
+
+def missing(shas: list[str]) -> set[str]:
+    """Return the subset of *shas* not present in the cache (read-only)."""
+    unique = list(dict.fromkeys(shas))
+    present: set[str] = set()
+    db = get_db()
+    try:
+        for i in range(0, len(unique), _SQL_BATCH):
+            batch = unique[i:i + _SQL_BATCH]
+            rows = db.execute(
+                f"SELECT sha FROM blob_cache WHERE sha IN ({','.join('?' * len(batch))})",
+                batch,
+            ).fetchall()
+            present.update(row["sha"] for row in rows)
+    finally:
+        db.close()
+    return set(unique) - present
+
+
+def put_blobs(blobs: dict[str, str]) -> None:
+    """Store blob contents keyed by SHA and evict old entries over the cap.
+
+    Args:
+        blobs: A dict mapping blob SHA to decoded text content.
+    """
+    if not blobs or settings.BLOB_CACHE_MAX_BYTES <= 0:
+        return
+
+    now = datetime.utcnow().isoformat()
+    db = get_db()
+    try:
+        db.executemany(
+            "INSERT OR REPLACE INTO blob_cache (sha, content, size, last_accessed) VALUES (?, ?, ?, ?)",
+            [
+                (sha, content, len(content.encode("utf-8")), now)
+                for sha, content in blobs.items()
+            ],
+        )
+        _evict(db, settings.BLOB_CACHE_MAX_BYTES)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _evict(db, max_bytes: int) -> None:
+    """Delete least-recently-used entries until the cache fits *max_bytes*."""
+    total = db.execute("SELECT COALESCE(SUM(size), 0) AS total FROM blob_cache").fetchone()["total"]
+    if total <= max_bytes:
+        return
+
+    stale = []
+    for row in db.execute("SELECT sha, size FROM blob_cache ORDER BY last_accessed"):
+        if total <= max_bytes:
+            break
+        stale.append(row["sha"])
+        total -= row["size"]
+
+    for i in range(0, len(stale), _SQL_BATCH):
+        batch = stale[i:i + _SQL_BATCH]
+        db.execute(
+            f"DELETE FROM blob_cache WHERE sha IN ({','.join('?' * len(batch))})",
+            batch,
+        )
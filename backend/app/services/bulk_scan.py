@@ -0,0 +1,217 @@
+"""
+Organization-wide bulk scans.
+
+A bulk scan creates one ordinary scan per repository (linked through
+``scans.bulk_scan_id``) and runs them on a single process-wide worker pool,
+so ``settings.BULK_SCAN_CONCURRENCY`` bounds the number of repositories
+being scanned at once across all bulk jobs.  Progress and the aggregated
+summary are derived from the member scans, which stay individually
+viewable through ``/scans/{scan_id}``.
+"""
+
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app.core.config import settings
+from app.database import get_db
+from app.services.scan_runner import create_scan, drain_scan
+
+logger = logging.getLogger(__name__)
+
+_pool = ThreadPoolExecutor(
+    max_workers=max(1, settings.BULK_SCAN_CONCURRENCY), thread_name_prefix="bulk-scan"
+)
+
+_TOP_RULES = 10
+
+
+def start_bulk_scan(
+    user_id: str, access_token: str, source: str, repos: list[tuple[str, str]]
+) -> str:
+    """Create a bulk scan over *repos* and start scanning them in the background.
+
+    Args:
+        user_id: The requesting user's ID.
+        access_token: The user's GitHub OAuth access token.
+        source: Human-readable origin of the repo list, e.g. ``"org:acme"``.
+        repos: ``(owner, name)`` pairs to scan.
+
+    Returns:
+        The new bulk scan ID.
+    """
+    bulk_id = str(uuid.uuid4())
+    now = datetime.utcnow().isoformat()
+    db = get_db()
+    try:
+        db.execute(
+            "INSERT INTO bulk_scans (id, user_id, source, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (bulk_id, user_id, source, "running" if repos else "completed", now, now),
+        )
+        db.commit()
+    finally:
+        db.close()
+
+    # Create every member scan up front so progress covers the whole set
+    scan_ids = [create_scan(user_id, owner, name, bulk_scan_id=bulk_id) for owner, name in repos]
+    for scan_id in scan_ids:
+        _pool.submit(_run_member_scan, bulk_id, scan_id, access_token)
+    logger.info(f"Bulk scan {bulk_id} ({source}): queued {len(scan_ids)} repositories")
+    return bulk_id
+
+
+def shutdown(wait: bool = True) -> None:
+    """Drop queued member scans and stop the pool; running scans finish if *wait*."""
+    _pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def fail_interrupted_bulk_scans() -> None:
+    """Mark bulk scans left running by a previous process as failed.
+
+    Their queued and in-flight member scans lived only in that process's
+    pool, so nothing will ever finish them. Call once at startup, before
+    any new bulk scan is started.
+    """
+    now = datetime.utcnow().isoformat()
+    db = get_db()
+    try:
+        members = db.execute(
+            """
+            UPDATE scans SET status = 'failed', updated_at = ?
+            WHERE status IN ('pending', 'scanning')
+              AND bulk_scan_id IN (SELECT id FROM bulk_scans WHERE status = 'running')
+            """,
+            (now,),
+        ).rowcount
+        bulks = db.execute(
+            "UPDATE bulk_scans SET status = 'failed', updated_at = ? WHERE status = 'running'", (now,)
+        ).rowcount
+        db.commit()
+    finally:
+        db.close()
+    if bulks:
+        logger.warning(f"Marked {bulks} interrupted bulk scan(s) and {members} member scan(s) as failed")
+
+
+def _run_member_scan(bulk_id: str, scan_id: str, access_token: str) -> None:
+    try:
+        db = get_db()
+        try:
+            scan = db.execute("SELECT * FROM scans WHERE id = ?", (scan_id,)).fetchone()
+        finally:
+            db.close()
+        error = drain_scan(scan, access_token)
+        if error:
+            logger.warning(f"Bulk scan {bulk_id}: {scan['repo_url']} failed: {error}")
+    except Exception:
+        logger.exception(f"Bulk scan {bulk_id}: scan {scan_id} crashed")
+    finally:
+        _finish_if_done(bulk_id)
+
+
+def _finish_if_done(bulk_id: str) -> None:
+    db = get_db()
+    try:
+        remaining = db.execute(
+            "SELECT COUNT(*) AS cnt FROM scans WHERE bulk_scan_id = ? AND status IN ('pending', 'scanning')",
+            (bulk_id,),
+        ).fetchone()["cnt"]
+        if remaining == 0:
+            db.execute(
+                "UPDATE bulk_scans SET status = 'completed', updated_at = ? WHERE id = ? AND status = 'running'",
+                (datetime.utcnow().isoformat(), bulk_id),
+            )
+            db.commit()
+    finally:
+        db.close()
+
+
+def get_bulk_scan(bulk_id: str, user_id: str) -> dict | None:
+    """Return progress and the aggregated summary of a bulk scan.
+
+    Returns:
+        A dict with the bulk scan fields, a ``repos`` list (one entry per
+        member scan with its status and violation count) and a ``summary``
+        with status counts, violation totals by severity, the most
+        frequently violated rules and the repositories with the most
+        violations. None if the bulk scan does not belong to *user_id*.
+    """
+    db = get_db()
+    try:
+        bulk = db.execute(
+            "SELECT * FROM bulk_scans WHERE id = ? AND user_id = ?", (bulk_id, user_id)
+        ).fetchone()
+        if not bulk:
+            return None
+        repos = [
+            dict(row)
+            for row in db.execute(
+                """
+                SELECT s.id AS scan_id, s.repo_owner, s.repo_name, s.status, s.updated_at,
+                       COUNT(v.id) AS violation_count
+                FROM scans s
+                LEFT JOIN violations v ON v.scan_id = s.id
+                WHERE s.bulk_scan_id = ?
+                GROUP BY s.id
+                ORDER BY s.repo_owner, s.repo_name
+                """,
+                (bulk_id,),
+            ).fetchall()
+        ]
+        by_severity = {
+            row["severity"]: row["cnt"]
+            for row in db.execute(
+                """
+                SELECT v.severity, COUNT(*) AS cnt FROM violations v
+                JOIN scans s ON s.id = v.scan_id
+                WHERE s.bulk_scan_id = ?
+                GROUP BY v.severity
+                """,
+                (bulk_id,),
+            ).fetchall()
+        }
+        top_rules = [
+            dict(row)
+            for row in db.execute(
+                """
+                SELECT v.rule_id, COUNT(*) AS violation_count, COUNT(DISTINCT s.id) AS repo_count
+                FROM violations v
+                JOIN scans s ON s.id = v.scan_id
+                WHERE s.bulk_scan_id = ?
+                GROUP BY v.rule_id
+                ORDER BY violation_count DESC
+                LIMIT ?
+                """,
+                (bulk_id, _TOP_RULES),
+            ).fetchall()
+        ]
+    finally:
+        db.close()
+
+    by_status: dict[str, int] = {}
+    for repo in repos:
+        by_status[repo["status"]] = by_status.get(repo["status"], 0) + 1
+    worst = sorted(
+        (r for r in repos if r["violation_count"]), key=lambda r: r["violation_count"], reverse=True
+    )
+
+    return {
+        "bulk_scan_id": bulk["id"],
+        "source": bulk["source"],
+        "status": bulk["status"],
+        "created_at": bulk["created_at"],
+        "updated_at": bulk["updated_at"],
+        "repos": repos,
+        "summary": {
+            "total_repos": len(repos),
+            "by_status": by_status,
+            "total_violations": sum(by_severity.values()),
+            "by_severity": by_severity,
+            "top_rules": top_rules,
+            "most_violations": [
+                {"repo": f"{r['repo_owner']}/{r['repo_name']}", "scan_id": r["scan_id"], "violation_count": r["violation_count"]}
+                for r in worst[:_TOP_RULES]
+            ],
+        },
+    }
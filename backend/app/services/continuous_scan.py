@@ -0,0 +1,124 @@
+"""
+Push-webhook driven continuous scanning.
+
+GitHub push events for a repository's default branch enqueue a background
+scan for every user who has scanned that repository before and whose plan
+includes ``continuous_scanning``.  Scans go through a
+:class:`~app.services.scan_queue.DebouncedQueue` keyed by
+``(user_id, owner, repo)``, so a burst of pushes becomes one scan of the
+latest head.  Each scan is a normal full scan, so unchanged files are carried
+forward incrementally and an unchanged head is short-circuited.
+"""
+
+import hashlib
+import hmac
+import logging
+
+from app.api.plan_guard import get_user_plan
+from app.core.config import settings
+from app.database import get_db
+from app.models.schemas import PLAN_FEATURES
+from app.services.scan_queue import DebouncedQueue
+from app.services.scan_runner import create_scan, drain_scan
+
+logger = logging.getLogger(__name__)
+
+_ZERO_SHA = "0" * 40
+
+
+def verify_signature(payload: bytes, signature: str) -> bool:
+    """Check a GitHub ``X-Hub-Signature-256`` header against *payload*.
+
+    Returns False when no webhook secret is configured.
+    """
+    if not settings.GITHUB_WEBHOOK_SECRET or not signature.startswith("sha256="):
+        return False
+    expected = hmac.new(
+        settings.GITHUB_WEBHOOK_SECRET.encode(), payload, hashlib.sha256
+    ).hexdigest()
+    return hmac.compare_digest(expected, signature.removeprefix("sha256="))
+
+
+def _subscribers(repo_owner: str, repo_name: str) -> list[tuple[str, str, str]]:
+    """Return ``(user_id, owner, repo)`` for users with a GitHub token who have
+    scanned this repository, using the spelling of their own scans so new
+    scans line up with their history."""
+    db = get_db()
+    try:
+        rows = db.execute(
+            """
+            SELECT s.user_id, MAX(s.repo_owner) AS repo_owner, MAX(s.repo_name) AS repo_name
+            FROM scans s
+            JOIN github_tokens t ON t.user_id = s.user_id
+            WHERE s.repo_owner = ? COLLATE NOCASE AND s.repo_name = ? COLLATE NOCASE
+            GROUP BY s.user_id
+            """,
+            (repo_owner, repo_name),
+        ).fetchall()
+    finally:
+        db.close()
+    return [(row["user_id"], row["repo_owner"], row["repo_name"]) for row in rows]
+
+
+def handle_push_event(payload: dict) -> int:
+    """Enqueue scans for a GitHub ``push`` event payload.
+
+    Pushes to branches other than the default branch, and branch deletions,
+    are ignored.
+
+    Returns:
+        The number of scans enqueued (before debouncing).
+    """
+    repository = payload.get("repository") or {}
+    owner = (repository.get("owner") or {}).get("login") or (repository.get("owner") or {}).get("name")
+    name = repository.get("name")
+    head_sha = payload.get("after")
+    if not owner or not name or not head_sha or head_sha == _ZERO_SHA:
+        return 0
+    if payload.get("ref") != f"refs/heads/{repository.get('default_branch')}":
+        return 0
+
+    subscribers = _subscribers(owner, name)
+    for key in subscribers:
+        scan_queue.submit(key, head_sha)
+    if subscribers:
+        logger.info(f"Push to {owner}/{name}@{head_sha[:7]}: queued scans for {len(subscribers)} users")
+    return len(subscribers)
+
+
+def _scan_latest_head(key: tuple[str, str, str], head_sha: str) -> None:
+    """Queue handler: run one background scan of the repository's current head."""
+    user_id, owner, name = key
+    plan = get_user_plan(user_id)
+    if not PLAN_FEATURES.get(plan, PLAN_FEATURES["free"]).get("continuous_scanning", False):
+        logger.debug(f"Skipping push scan of {owner}/{name} for {user_id}: plan {plan}")
+        return
+
+    db = get_db()
+    try:
+        row = db.execute(
+            "SELECT access_token FROM github_tokens WHERE user_id = ?", (user_id,)
+        ).fetchone()
+    finally:
+        db.close()
+    if not row:
+        return
+
+    scan_id = create_scan(user_id, owner, name)
+    db = get_db()
+    try:
+        scan = db.execute("SELECT * FROM scans WHERE id = ?", (scan_id,)).fetchone()
+    finally:
+        db.close()
+
+    error = drain_scan(scan, row["access_token"])
+    status = f"failed: {error}" if error else "completed"
+    logger.info(f"Push scan {scan_id} of {owner}/{name} (pushed {head_sha[:7]}) {status}")
+
+
+scan_queue = DebouncedQueue(
+    _scan_latest_head,
+    debounce=settings.SCAN_QUEUE_DEBOUNCE,
+    max_delay=settings.SCAN_QUEUE_MAX_DELAY,
+    workers=settings.SCAN_QUEUE_WORKERS,
+)
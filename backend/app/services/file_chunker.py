@@ -0,0 +1,89 @@
+"""
+Split files too large for one model prompt into line-addressed chunks.
+
+Chunks break at top-level Terraform blocks (with the comments directly
+above them) or at YAML ``---`` document separators, so a resource is only
+cut when it alone exceeds the budget.  Consecutive chunks overlap by a few
+lines for context, and every chunk records the line it starts on, so line
+numbers reported against a chunk map back to the original file.
+"""
+
+import re
+
+# A top-level HCL block header, e.g. `resource "aws_s3_bucket" "logs" {`
+_TF_BLOCK_RE = re.compile(r'^[A-Za-z_][\w-]*(?:\s+(?:"[^"]*"|[A-Za-z_][\w-]*))*\s*\{')
+_TF_COMMENT_RE = re.compile(r"^\s*(#|//)")
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the model tokens in *text* (about four characters each)."""
+    return len(text) // 4 + 1
+
+
+def _boundaries(path: str, lines: list[str]) -> list[int]:
+    """Return the 0-based line indexes where a resource or document starts."""
+    lower = path.lower()
+    starts = {0}
+    if lower.endswith(".tf"):
+        for i, line in enumerate(lines):
+            if _TF_BLOCK_RE.match(line):
+                # Keep the comments documenting a block with it
+                while i > 0 and _TF_COMMENT_RE.match(lines[i - 1]):
+                    i -= 1
+                starts.add(i)
+    elif lower.endswith((".yaml", ".yml")):
+        starts.update(i for i, line in enumerate(lines) if line.startswith("---"))
+    return sorted(starts)
+
+
+def chunk_file(path: str, content: str, max_tokens: int, overlap_lines: int = 0) -> list[tuple[int, str]]:
+    """Split *content* into chunks of at most about *max_tokens*.
+
+    Args:
+        path: The file's path, which selects the boundary rules.
+        content: The file content.
+        max_tokens: Token budget per chunk, excluding overlap.
+        overlap_lines: Lines of the previous chunk repeated at the start of
+            each following chunk.
+
+    Returns:
+        ``(start_line, text)`` pairs with 1-based start lines, in file order.
+        A file within budget is returned as a single chunk.
+    """
+    if estimate_tokens(content) <= max_tokens:
+        return [(1, content)]
+
+    lines = content.splitlines(keepends=True)
+    starts = _boundaries(path, lines)
+    segments = [(start, end) for start, end in zip(starts, starts[1:] + [len(lines)]) if start < end]
+
+    # Pack whole segments; split a segment only when it alone is too large
+    ranges: list[tuple[int, int]] = []
+    chunk_start, chunk_tokens = 0, 0
+    for start, end in segments:
+        tokens = estimate_tokens("".join(lines[start:end]))
+        if chunk_tokens and chunk_tokens + tokens > max_tokens:
+            ranges.append((chunk_start, start))
+            chunk_start, chunk_tokens = start, 0
+        if tokens <= max_tokens:
+            chunk_tokens += tokens
+            continue
+        if chunk_start < start:
+            ranges.append((chunk_start, start))
+        piece_start, piece_tokens = start, 0
+        for i in range(start, end):
+            line_tokens = estimate_tokens(lines[i])
+            if piece_tokens and piece_tokens + line_tokens > max_tokens:
+                ranges.append((piece_start, i))
+                piece_start, piece_tokens = i, 0
+            piece_tokens += line_tokens
+        chunk_start, chunk_tokens = piece_start, piece_tokens
+    if chunk_start < len(lines):
+        ranges.append((chunk_start, len(lines)))
+
+    chunks = []
+    for n, (start, end) in enumerate(ranges):
+        if n:
+            start = max(0, start - overlap_lines)
+        chunks.append((start + 1, "".join(lines[start:end])))
+    return chunks
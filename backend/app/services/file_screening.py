@@ -0,0 +1,56 @@
+"""
+Screening of repository files before they are scanned.
+
+Every file source (GitHub blobs and tarballs, local directories and git
+repositories) applies the same size limit and binary detection, and reports
+files it leaves out as ``{"path", "reason", "size"}`` entries so the scan can
+list them instead of silently dropping them.
+"""
+
+from app.core.config import settings
+from app.services.path_filter import PathFilter
+
+# Bytes inspected for NUL when sniffing binary content (same heuristic as git)
+BINARY_SNIFF_BYTES = 8192
+
+
+class SkippedFile(Exception):
+    """Raised for a file that is deliberately left out of a scan."""
+    def __init__(self, reason: str, size: int | None = None):
+        self.reason = reason
+        self.size = size
+        super().__init__(reason)
+
+
+def max_file_size(path_filter: PathFilter) -> int | None:
+    """Return the effective per-file size limit in bytes, or None for no limit.
+
+    ``settings.SCAN_MAX_FILE_BYTES`` is the global cap; a repository's
+    ``.comply.yml`` ``max_file_size`` can only lower it.
+    """
+    limits = [
+        limit
+        for limit in (settings.SCAN_MAX_FILE_BYTES, path_filter.max_file_size)
+        if limit is not None and limit > 0
+    ]
+    return min(limits) if limits else None
+
+
+def decode_text(data: bytes) -> str:
+    """Decode file bytes as UTF-8, rejecting binary content early.
+
+    Raises:
+        SkippedFile: If the data contains NUL bytes or is not valid UTF-8.
+    """
+    if b"\0" in data[:BINARY_SNIFF_BYTES]:
+        raise SkippedFile("binary", len(data))
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        raise SkippedFile("binary", len(data))
+
+
+def record_skip(skipped: list[dict] | None, path: str, reason: str, size: int | None) -> None:
+    """Append a skipped-file entry to *skipped* when the caller collects them."""
+    if skipped is not None:
+        skipped.append({"path": path, "reason": reason, "size": size})
@@ -0,0 +1,237 @@
+"""
+Process-wide pool of reusable GitHub clients, keyed by access token.
+
+A PyGithub ``Github`` instance owns a ``requests`` session, so reusing one per
+token keeps HTTP keep-alive connections (and their TLS sessions) warm across
+``/github/repos``, ``/scan`` and ``/fixes/create-prs`` calls.  Idle entries
+expire after ``settings.GITHUB_CLIENT_TTL`` seconds.
+
+Each pooled client also keeps:
+
+- an ETag cache for read-mostly JSON endpoints (repo metadata, trees,
+  directory contents, the user's repo list).  Cached entries are revalidated
+  with ``If-None-Match``; GitHub does not count ``304 Not Modified``
+  responses against the rate limit.  Entries are capped per token, and
+  the cached bodies of all tokens together by size.
+- the token's rate-limit budget, which PyGithub refreshes from the
+  ``X-RateLimit-*`` headers of every response made through the client.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from github import Auth, Github, GithubException
+from github.Repository import Repository
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class GitHubRateLimitError(Exception):
+    """Raised when a token's rate-limit budget cannot cover a request soon enough."""
+    def __init__(self, remaining: int, reset_in: float):
+        self.remaining = remaining
+        self.reset_in = reset_in
+        super().__init__(
+            f"GitHub rate limit nearly exhausted ({remaining} requests left, "
+            f"resets in {reset_in:.0f}s). Try again later."
+        )
+
+
+class _PooledClient:
+    def __init__(self, access_token: str):
+        self.github = Github(
+            auth=Auth.Token(access_token),
+            # Concurrent blob fetches share this client's connection pool; pacing
+            # and secondary-limit back-off are handled by github_service itself
+            pool_size=max(10, settings.GITHUB_FETCH_CONCURRENCY),
+            seconds_between_requests=None,
+        )
+        # cache key -> (etag, decoded body, body size in bytes), oldest first
+        self.etags: OrderedDict[str, tuple[str, object, int]] = OrderedDict()
+        self.last_used = time.monotonic()
+
+
+_lock = threading.Lock()
+_clients: dict[str, _PooledClient] = {}
+
+# Every client's ETag entries in least-recently-used order, and their total
+# body size; _etag_lock guards these and each client's etags
+_etag_lru: OrderedDict[tuple[_PooledClient, str], None] = OrderedDict()
+_etag_bytes = 0
+_etag_lock = threading.Lock()
+
+# Shared keep-alive session for raw HTTP calls (OAuth exchange, archive downloads)
+http_session = requests.Session()
+
+
+def _key(access_token: str) -> str:
+    return hashlib.sha256(access_token.encode()).hexdigest()
+
+
+def _release_etags(client: _PooledClient) -> None:
+    global _etag_bytes
+    with _etag_lock:
+        for cache_key, (_, _, size) in client.etags.items():
+            del _etag_lru[(client, cache_key)]
+            _etag_bytes -= size
+        client.etags.clear()
+
+
+def _evict_expired(now: float) -> None:
+    expired = [k for k, c in _clients.items() if now - c.last_used > settings.GITHUB_CLIENT_TTL]
+    for k in expired:
+        client = _clients.pop(k)
+        _release_etags(client)
+        client.github.close()
+
+
+def _drop_etag(client: _PooledClient, cache_key: str) -> None:
+    global _etag_bytes
+    _, _, size = client.etags.pop(cache_key)
+    del _etag_lru[(client, cache_key)]
+    _etag_bytes -= size
+
+
+def _store_etag(client: _PooledClient, cache_key: str, etag: str, data, size: int) -> None:
+    """Cache a response body for revalidation within the entry and byte limits.
+
+    ``settings.GITHUB_ETAG_CACHE_BYTES`` bounds the bodies of all clients
+    together: the least recently used entries of any token are evicted to
+    make room, and a body larger than the whole budget (e.g. a huge
+    recursive tree) is not cached.
+    """
+    global _etag_bytes
+    if size > settings.GITHUB_ETAG_CACHE_BYTES or settings.GITHUB_ETAG_CACHE_ENTRIES <= 0:
+        return
+    with _etag_lock:
+        if cache_key in client.etags:
+            _drop_etag(client, cache_key)
+        while len(client.etags) >= settings.GITHUB_ETAG_CACHE_ENTRIES:
+            _drop_etag(client, next(iter(client.etags)))
+        while _etag_bytes + size > settings.GITHUB_ETAG_CACHE_BYTES:
+            owner, oldest = next(iter(_etag_lru))
+            _drop_etag(owner, oldest)
+        client.etags[cache_key] = (etag, data, size)
+        _etag_lru[(client, cache_key)] = None
+        _etag_bytes += size
+
+
+def _get_pooled(access_token: str) -> _PooledClient:
+    now = time.monotonic()
+    with _lock:
+        _evict_expired(now)
+        key = _key(access_token)
+        client = _clients.get(key)
+        if client is None:
+            client = _PooledClient(access_token)
+            _clients[key] = client
+        client.last_used = now
+        return client
+
+
+def get_github(access_token: str) -> Github:
+    """Return the pooled ``Github`` client for *access_token*."""
+    return _get_pooled(access_token).github
+
+
+def get_json(access_token: str, path: str, params: dict | None = None):
+    """GET a GitHub REST endpoint, revalidating cached bodies via ETag.
+
+    Args:
+        access_token: A valid GitHub OAuth access token.
+        path: API path such as ``/repos/{owner}/{repo}``.
+        params: Optional query parameters.
+
+    Returns:
+        The decoded JSON body (served from cache on ``304 Not Modified``).
+
+    Raises:
+        GithubException: For non-2xx/304 responses.
+    """
+    client = _get_pooled(access_token)
+    cache_key = path + "?" + "&".join(f"{k}={v}" for k, v in sorted((params or {}).items()))
+    with _etag_lock:
+        cached = client.etags.get(cache_key)
+
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    status, response_headers, body = client.github.requester.requestJson(
+        "GET", path, parameters=params, headers=headers
+    )
+
+    if status == 304 and cached:
+        with _etag_lock:
+            if cache_key in client.etags:
+                client.etags.move_to_end(cache_key)
+                _etag_lru.move_to_end((client, cache_key))
+        return cached[1]
+
+    data = json.loads(body) if body else None
+    if status >= 400:
+        raise GithubException(status, data, response_headers)
+
+    etag = response_headers.get("etag")
+    if etag:
+        _store_etag(client, cache_key, etag, data, len(body or ""))
+    return data
+
+
+def get_repo(access_token: str, owner: str, repo_name: str) -> Repository:
+    """Return a ``Repository`` for *owner/repo_name* under *access_token*.
+
+    The metadata request is revalidated with the cached ETag, so repeat
+    lookups stay fresh without spending rate-limit budget.
+    """
+    data = get_json(access_token, f"/repos/{owner}/{repo_name}")
+    return get_github(access_token).create_from_raw_data(Repository, data)
+
+
+def rate_budget(access_token: str) -> tuple[int, float]:
+    """Return ``(remaining, seconds_until_reset)`` for *access_token*."""
+    github = get_github(access_token)
+    remaining, _ = github.rate_limiting
+    reset_in = max(0.0, github.rate_limiting_resettime - time.time())
+    return remaining, reset_in
+
+
+def has_budget(access_token: str, needed: int) -> bool:
+    """Return True if *needed* requests fit in the token's remaining budget.
+
+    When they do not, but the window resets within
+    ``settings.GITHUB_RATE_LIMIT_MAX_WAIT`` seconds, this blocks until the
+    reset (queueing the caller) and then returns True.  Otherwise it returns
+    False so the caller can degrade, e.g. to a single archive download.
+    """
+    remaining, reset_in = rate_budget(access_token)
+    if remaining - needed >= settings.GITHUB_RATE_LIMIT_RESERVE:
+        return True
+    if reset_in <= settings.GITHUB_RATE_LIMIT_MAX_WAIT:
+        logger.warning(
+            f"GitHub budget low ({remaining} left, {needed} needed); waiting {reset_in:.0f}s for reset"
+        )
+        time.sleep(reset_in + 1)
+        return True
+    return False
+
+
+def require_budget(access_token: str, needed: int = 1) -> None:
+    """Like :func:`has_budget`, but raise :class:`GitHubRateLimitError` instead
+    of returning False."""
+    if not has_budget(access_token, needed):
+        remaining, reset_in = rate_budget(access_token)
+        raise GitHubRateLimitError(remaining, reset_in)
+
+
+def discard(access_token: str) -> None:
+    """Drop the pooled client for *access_token* (e.g. on disconnect)."""
+    with _lock:
+        client = _clients.pop(_key(access_token), None)
+    if client is not None:
+        _release_etags(client)
+        client.github.close()
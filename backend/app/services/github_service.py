@@ -1,10 +1,28 @@
 import base64
+import logging
+import tarfile
+import threading
 import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
-from github import Github
+from github import GithubException, InputGitTreeElement, RateLimitExceededException
 
 from app.core.config import settings
+from app.services import blob_cache
+from app.services.file_screening import SkippedFile, decode_text, max_file_size, record_skip
+from app.services.github_client import (
+    get_github,
+    get_json,
+    get_repo,
+    has_budget,
+    http_session,
+    require_budget,
+)
+from app.services.path_filter import CONFIG_FILENAME, PathFilter, parse_config
+
+logger = logging.getLogger(__name__)
 
 
 def exchange_code_for_token(code: str) -> dict:
@@ -20,7 +38,7 @@ def exchange_code_for_token(code: str) -> dict:
         A dict containing access_token, token_type, scope, and other fields
         returned by the GitHub OAuth API.
     """
-    response = requests.post(
+    response = http_session.post(
         "https://github.com/login/oauth/access_token",
         json={
             "client_id": settings.GITHUB_CLIENT_ID,
@@ -42,8 +60,7 @@ def get_user_info(access_token: str) -> dict:
     Returns:
         A dict with login, name, and avatar_url for the authenticated user.
     """
-    g = Github(access_token)
-    user = g.get_user()
+    user = get_github(access_token).get_user()
     return {
         "login": user.login,
         "name": user.name,
@@ -51,95 +68,820 @@ def get_user_info(access_token: str) -> dict:
     }
 
 
+_REPOS_PER_PAGE = 100
+
+
+def _list_repos(access_token: str, path: str, params: dict) -> list[dict]:
+    """Page through a repository listing endpoint until it is exhausted."""
+    repos = []
+    page = 1
+    while True:
+        batch = get_json(access_token, path, {**params, "per_page": _REPOS_PER_PAGE, "page": page})
+        repos.extend(
+            {
+                "name": repo["name"],
+                "full_name": repo["full_name"],
+                "owner": repo["owner"]["login"],
+                "private": repo["private"],
+                "default_branch": repo["default_branch"],
+                "archived": repo.get("archived", False),
+            }
+            for repo in batch
+        )
+        if len(batch) < _REPOS_PER_PAGE:
+            return repos
+        page += 1
+
+
 def get_user_repos(access_token: str) -> list[dict]:
-    """List repositories the authenticated user has access to.
+    """List every repository the authenticated user has access to.
 
-    Returns up to 50 repos sorted by most recently updated.
+    Repos are sorted by most recently updated. Pages are revalidated through
+    the ETag cache, so re-listing an unchanged account is cheap.
 
     Args:
         access_token: A valid GitHub OAuth access token.
 
     Returns:
         A list of dicts each containing name, full_name, owner, private,
-        and default_branch.
+        default_branch and archived.
     """
-    g = Github(access_token)
-    repos = []
-    for repo in g.get_user().get_repos(sort="updated"):
-        repos.append(
-            {
-                "name": repo.name,
-                "full_name": repo.full_name,
-                "owner": repo.owner.login,
-                "private": repo.private,
-                "default_branch": repo.default_branch,
-            }
+    return _list_repos(access_token, "/user/repos", {"sort": "updated"})
+
+
+def get_org_repos(access_token: str, org: str) -> list[dict]:
+    """List every repository in the GitHub organization *org* visible to the
+    token, in the same format as :func:`get_user_repos`."""
+    return _list_repos(access_token, f"/orgs/{org}/repos", {"type": "all", "sort": "updated"})
+
+
+# Secondary rate limits surface as 403/429 responses carrying a Retry-After
+# header (or only a "secondary rate limit" message).  When any worker hits one,
+# every worker pauses until the window has passed instead of hammering GitHub.
+_SECONDARY_LIMIT_DEFAULT_WAIT = 60
+_FETCH_MAX_ATTEMPTS = 4
+
+
+class _RateLimitGate:
+    """Back-off window shared by all fetch workers of a single scan."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+
+    def wait(self) -> None:
+        with self._lock:
+            delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+
+def _secondary_limit_wait(exc: GithubException) -> float | None:
+    """Return how long to back off for a rate-limit error, or None if the
+    exception is not rate-limit related."""
+    if exc.status not in (403, 429):
+        return None
+    headers = {k.lower(): v for k, v in (exc.headers or {}).items()}
+    if "retry-after" in headers:
+        try:
+            return float(headers["retry-after"])
+        except ValueError:
+            return _SECONDARY_LIMIT_DEFAULT_WAIT
+    if headers.get("x-ratelimit-remaining") == "0" and "x-ratelimit-reset" in headers:
+        return max(float(headers["x-ratelimit-reset"]) - time.time(), 1.0)
+    if isinstance(exc, RateLimitExceededException) or "rate limit" in str(exc.data).lower():
+        return _SECONDARY_LIMIT_DEFAULT_WAIT
+    return None
+
+
+def load_path_filter(access_token: str, owner: str, repo_name: str, ref: str) -> PathFilter:
+    """Build the repository's path filter from its optional ``.comply.yml``.
+
+    The config lookup goes through the ETag cache, so repeat scans of an
+    unchanged config cost no rate-limit budget. Repositories without a
+    config get the default infra patterns.
+    """
+    try:
+        entry = get_json(
+            access_token,
+            f"/repos/{owner}/{repo_name}/contents/{CONFIG_FILENAME}",
+            {"ref": ref},
+        )
+    except GithubException as exc:
+        if exc.status != 404:
+            logger.warning(f"Could not read {CONFIG_FILENAME} from {owner}/{repo_name}: {exc}")
+        return PathFilter()
+    if not isinstance(entry, dict) or entry.get("encoding") != "base64":
+        return PathFilter()
+    return parse_config(base64.b64decode(entry["content"]).decode("utf-8", errors="replace"))
+
+
+def resolve_commit_sha(
+    access_token: str, owner: str, repo_name: str, ref: str | None = None
+) -> str:
+    """Return the commit SHA *ref* currently points at.
+
+    Args:
+        access_token: A valid GitHub OAuth access token.
+        owner: The repository owner (user or organization login).
+        repo_name: The repository name.
+        ref: Branch, tag or commit SHA; defaults to the default branch.
+    """
+    if ref is None:
+        ref = get_repo(access_token, owner, repo_name).default_branch
+    commit = get_json(
+        access_token, f"/repos/{owner}/{repo_name}/commits/{urllib.parse.quote(ref, safe='')}"
+    )
+    return commit["sha"]
+
+
+def list_repo_blobs(
+    access_token: str,
+    owner: str,
+    repo_name: str,
+    ref: str,
+    max_workers: int | None = None,
+    path_filter: PathFilter | None = None,
+) -> list[dict]:
+    """List every blob in the repository tree at *ref*.
+
+    Tries a single recursive tree request first. GitHub truncates recursive
+    trees past ~100k entries / 7 MB, so when ``truncated`` is set the tree is
+    walked instead: directories are expanded one level at a time, excluded
+    directories are pruned before anything beneath them is requested, and
+    each remaining subtree is fetched recursively in parallel (expanding it
+    further only if that response is truncated too).
+
+    Args:
+        access_token: A valid GitHub OAuth access token.
+        owner: The repository owner (user or organization login).
+        repo_name: The repository name.
+        ref: Branch, tag, commit or tree SHA to list.
+        max_workers: Parallelism limit for subtree requests; defaults to
+            ``settings.GITHUB_FETCH_CONCURRENCY``.
+        path_filter: Filter whose excluded directories are pruned; defaults
+            to the standard infra filter.
+
+    Returns:
+        Tree entry dicts (``path``, ``sha``, ``size``, ...) for every blob,
+        with paths relative to the repository root.
+    """
+    path_filter = path_filter or PathFilter()
+    trees_path = f"/repos/{owner}/{repo_name}/git/trees"
+    root = get_json(access_token, f"{trees_path}/{ref}", {"recursive": "1"})
+    if not root.get("truncated"):
+        return [
+            item for item in root["tree"]
+            if item["type"] == "blob" and not path_filter.excludes_dir(item["path"].rpartition("/")[0])
+        ]
+
+    logger.warning(f"Tree for {owner}/{repo_name}@{ref} is truncated; walking subtrees")
+
+    def _get_tree(item: tuple[str, str, bool]) -> tuple[str, str, dict]:
+        prefix, sha, recursive = item
+        params = {"recursive": "1"} if recursive else None
+        return prefix, sha, get_json(access_token, f"{trees_path}/{sha}", params)
+
+    blobs: list[dict] = []
+    to_expand = [("", root["sha"], False)]
+    workers = max(1, max_workers or settings.GITHUB_FETCH_CONCURRENCY)
+    requests_made = 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while to_expand:
+            # One level down: collect blobs and the non-excluded subdirectories
+            subtrees = []
+            for prefix, _, listing in pool.map(_get_tree, to_expand):
+                for item in listing["tree"]:
+                    path = prefix + item["path"]
+                    if item["type"] == "blob":
+                        blobs.append({**item, "path": path})
+                    elif item["type"] == "tree" and not path_filter.excludes_dir(path):
+                        subtrees.append((path + "/", item["sha"], True))
+            requests_made += len(to_expand) + len(subtrees)
+
+            # Each subtree in one recursive request; re-expand truncated ones
+            to_expand = []
+            for prefix, sha, listing in pool.map(_get_tree, subtrees):
+                if listing.get("truncated"):
+                    to_expand.append((prefix, sha, False))
+                    continue
+                for item in listing["tree"]:
+                    path = prefix + item["path"]
+                    if item["type"] == "blob" and not path_filter.excludes_dir(path.rpartition("/")[0]):
+                        blobs.append({**item, "path": path})
+
+    logger.info(
+        f"Walked truncated tree of {owner}/{repo_name}: {len(blobs)} blobs "
+        f"in {requests_made} tree requests"
+    )
+    return blobs
+
+
+def _fetch_blob_text(
+    repo, path: str, sha: str, gate: _RateLimitGate, limit: int | None = None
+) -> str:
+    """Download and decode a single blob by SHA, backing off on rate limits.
+
+    Raises:
+        SkippedFile: If the blob is larger than *limit* bytes or binary.
+    """
+    for attempt in range(_FETCH_MAX_ATTEMPTS):
+        gate.wait()
+        try:
+            blob = repo.get_git_blob(sha)
+        except GithubException as exc:
+            wait = _secondary_limit_wait(exc)
+            if wait is None or attempt == _FETCH_MAX_ATTEMPTS - 1:
+                raise
+            logger.warning(f"GitHub rate limit while fetching {path}; pausing {wait:.0f}s")
+            gate.pause(wait)
+            continue
+
+        if limit is not None and blob.size > limit:
+            raise SkippedFile("too_large", blob.size)
+        if blob.encoding == "base64":
+            return decode_text(base64.b64decode(blob.content))
+        return blob.content
+    raise RuntimeError(f"Exhausted retries fetching {path}")
+
+
+def fetch_files_concurrently(
+    repo,
+    blobs: dict[str, str],
+    max_workers: int | None = None,
+    stats: dict[str, float] | None = None,
+    max_file_size: int | None = None,
+    skipped: list[dict] | None = None,
+    prefetched: dict[str, str] | None = None,
+) -> dict[str, str]:
+    """Download blobs from *repo* through a bounded worker pool.
+
+    Blobs already present in *prefetched* or the content-addressed cache are
+    served locally; only unseen SHAs hit the GitHub API, and those are added
+    to the cache.
+    Files that are binary, larger than *max_file_size* or cannot be read are
+    skipped.
+
+    Args:
+        repo: A PyGithub ``Repository``.
+        blobs: A dict mapping repository-relative file paths to blob SHAs.
+        max_workers: Parallelism limit; defaults to
+            ``settings.GITHUB_FETCH_CONCURRENCY``.
+        stats: Optional dict that is filled with per-file fetch durations in
+            seconds (including failed fetches, excluding cache hits).
+        max_file_size: Optional size limit in bytes for downloaded blobs.
+        skipped: Optional list extended with ``{"path", "reason", "size"}``
+            for every file left out (``"too_large"``, ``"binary"`` or
+            ``"unreadable"``).
+        prefetched: Optional dict mapping blob SHAs to text already read
+            by other means, e.g. :func:`fetch_files_graphql`.
+
+    Returns:
+        A dict mapping file paths to their decoded text content.
+    """
+    prefetched = prefetched or {}
+    cached = {
+        **blob_cache.get_blobs([sha for sha in blobs.values() if sha not in prefetched]),
+        **prefetched,
+    }
+    files: dict[str, str] = {
+        path: cached[sha] for path, sha in blobs.items() if sha in cached
+    }
+    missing = {path: sha for path, sha in blobs.items() if sha not in cached}
+    prefetched_hits = sum(1 for sha in blobs.values() if sha in prefetched)
+
+    workers = max(1, max_workers or settings.GITHUB_FETCH_CONCURRENCY)
+    gate = _RateLimitGate()
+    timings: dict[str, float] = {}
+    fetched: dict[str, str] = {}
+
+    def _fetch(item: tuple[str, str]) -> tuple[str, str | None]:
+        path, sha = item
+        started = time.perf_counter()
+        try:
+            return path, _fetch_blob_text(repo, path, sha, gate, max_file_size)
+        except SkippedFile as exc:
+            record_skip(skipped, path, exc.reason, exc.size)
+            return path, None
+        except Exception as exc:
+            logger.debug(f"Skipping {path}: {exc}")
+            record_skip(skipped, path, "unreadable", None)
+            return path, None
+        finally:
+            timings[path] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if missing:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for path, text in pool.map(_fetch, missing.items()):
+                if text is not None:
+                    files[path] = text
+                    fetched[missing[path]] = text
+        blob_cache.put_blobs(fetched)
+    elapsed = time.perf_counter() - started
+
+    summary = (
+        f"Fetched {len(files)}/{len(blobs)} files from {repo.full_name} in {elapsed:.2f}s "
+        f"(prefetched={prefetched_hits}, cache hits={len(blobs) - len(missing) - prefetched_hits}, downloaded={len(fetched)}, workers={workers}"
+    )
+    if timings:
+        slowest = max(timings, key=timings.get)
+        summary += (
+            f", mean={sum(timings.values()) / len(timings):.3f}s, "
+            f"slowest={slowest} {timings[slowest]:.3f}s"
         )
-        if len(repos) >= 50:
+    logger.info(summary + ")")
+    if stats is not None:
+        stats.update(timings)
+
+    # Keep tree order regardless of which files came from the cache
+    return {path: files[path] for path in blobs if path in files}
+
+
+def extract_infra_files_from_tarball(
+    fileobj,
+    shas: dict[str, str] | None = None,
+    path_filter: PathFilter | None = None,
+    skipped: list[dict] | None = None,
+) -> dict[str, str]:
+    """Read infrastructure files out of a gzipped repository tarball stream.
+
+    The archive is consumed sequentially (``r|gz``) so it never needs to be
+    seekable or written to disk; only entries that pass the infra filters are
+    read into memory, everything else is skipped as the stream advances.
+    GitHub wraps archive contents in a single ``<owner>-<repo>-<sha>/``
+    directory, which is stripped from the returned paths. Extracted files are
+    added to the blob cache so later per-file scans can skip downloading them.
+
+    Args:
+        fileobj: A binary file-like object yielding the ``.tar.gz`` bytes.
+        shas: Optional dict filled with path -> git blob SHA for every
+            extracted file.
+        path_filter: Filter selecting which entries to keep; defaults to the
+            standard infra filter.
+        skipped: Optional list extended with matching entries that were left
+            out, as in :func:`fetch_files_concurrently`. Oversized entries
+            are skipped without being read.
+
+    Returns:
+        A dict mapping repository-relative file paths to their text content.
+    """
+    path_filter = path_filter or PathFilter()
+    limit = max_file_size(path_filter)
+    files: dict[str, str] = {}
+    blobs: dict[str, str] = {}
+    with tarfile.open(fileobj=fileobj, mode="r|gz") as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            _, _, path = member.name.partition("/")
+            if not path or not path_filter.matches(path):
+                continue
+            if limit is not None and member.size > limit:
+                record_skip(skipped, path, "too_large", member.size)
+                continue
+            extracted = archive.extractfile(member)
+            if extracted is None:
+                continue
+            data = extracted.read()
+            try:
+                files[path] = decode_text(data)
+            except SkippedFile as exc:
+                record_skip(skipped, path, exc.reason, exc.size)
+                continue
+            sha = blob_cache.git_blob_sha(data)
+            blobs[sha] = files[path]
+            if shas is not None:
+                shas[path] = sha
+    blob_cache.put_blobs(blobs)
+    return files
+
+
+def _fetch_infra_files_from_archive(
+    repo,
+    access_token: str,
+    ref: str,
+    shas: dict[str, str] | None = None,
+    path_filter: PathFilter | None = None,
+    skipped: list[dict] | None = None,
+) -> dict[str, str]:
+    """Stream the tarball for *ref* in a single request and extract infra files."""
+    url = repo.get_archive_link("tarball", ref=ref)
+    started = time.perf_counter()
+    with http_session.get(
+        url,
+        headers={"Authorization": f"Bearer {access_token}"},
+        stream=True,
+        timeout=60,
+    ) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        files = extract_infra_files_from_tarball(
+            response.raw, shas=shas, path_filter=path_filter, skipped=skipped
+        )
+    logger.info(
+        f"Extracted {len(files)} files from {repo.full_name} archive "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+    return files
+
+
+_GRAPHQL_URL = "https://api.github.com/graphql"
+# GraphQL errors that mean "this query was too big", answered by halving the batch
+_GRAPHQL_SPLIT_ERRORS = ("RESOURCE_LIMITS_EXCEEDED", "MAX_NODE_LIMIT_EXCEEDED", "timeout", "too large")
+
+
+class _GraphQLBatchTooLarge(Exception):
+    pass
+
+
+def _graphql_blob_batch(
+    access_token: str, owner: str, repo_name: str, expressions: list[str], gate: _RateLimitGate
+) -> list[dict | None]:
+    """Resolve up to ~100 ``ref:path`` expressions to blobs in one query."""
+    variables = {"owner": owner, "name": repo_name}
+    declarations = ["$owner: String!", "$name: String!"]
+    fields = []
+    for i, expression in enumerate(expressions):
+        variables[f"e{i}"] = expression
+        declarations.append(f"$e{i}: String!")
+        fields.append(f"f{i}: object(expression: $e{i}) {{ ... on Blob {{ oid text isBinary isTruncated }} }}")
+    query = (
+        f"query({', '.join(declarations)}) {{ repository(owner: $owner, name: $name) {{ "
+        + " ".join(fields)
+        + " } }"
+    )
+
+    for attempt in range(_FETCH_MAX_ATTEMPTS):
+        gate.wait()
+        response = http_session.post(
+            _GRAPHQL_URL,
+            json={"query": query, "variables": variables},
+            headers={"Authorization": f"Bearer {access_token}"},
+            timeout=60,
+        )
+        if response.status_code in (403, 429) and attempt < _FETCH_MAX_ATTEMPTS - 1:
+            wait = float(response.headers.get("Retry-After", _SECONDARY_LIMIT_DEFAULT_WAIT))
+            logger.warning(f"GitHub GraphQL rate limit; pausing {wait:.0f}s")
+            gate.pause(wait)
+            continue
+        if response.status_code in (502, 504):
+            # GitHub answers queries that time out server-side with a 502
+            raise _GraphQLBatchTooLarge()
+        response.raise_for_status()
+        break
+
+    payload = response.json()
+    errors = payload.get("errors") or []
+    if any(
+        marker.lower() in (str(e.get("type", "")) + " " + str(e.get("message", ""))).lower()
+        for e in errors
+        for marker in _GRAPHQL_SPLIT_ERRORS
+    ):
+        raise _GraphQLBatchTooLarge()
+    repository = (payload.get("data") or {}).get("repository")
+    if repository is None:
+        raise RuntimeError(f"GraphQL query failed: {errors}")
+    return [repository.get(f"f{i}") for i in range(len(expressions))]
+
+
+def fetch_files_graphql(
+    access_token: str,
+    owner: str,
+    repo_name: str,
+    ref: str,
+    paths: list[str],
+    batch_size: int | None = None,
+) -> dict[str, str]:
+    """Read file texts through GitHub's GraphQL API in batched queries.
+
+    Each query resolves up to *batch_size* ``object(expression: "ref:path")``
+    lookups. Batches that GitHub rejects as too expensive are split in half
+    and retried; a single path that still fails is skipped. Any other
+    failure (an HTTP error such as 401 or 500, or no ``repository`` in the
+    response) stops the fetch and returns what was read so far. Binary
+    blobs, missing paths, blobs whose text GitHub truncates and paths left
+    after a failure are not in the result, so callers can fall back to REST
+    for them.
+
+    Args:
+        access_token: A valid GitHub OAuth access token.
+        owner: The repository owner (user or organization login).
+        repo_name: The repository name.
+        ref: Branch, tag or commit SHA to read from.
+        paths: Repository-relative file paths.
+        batch_size: Paths per query; defaults to
+            ``settings.GITHUB_GRAPHQL_BATCH_SIZE``.
+
+    Returns:
+        A dict mapping file paths to their text content.
+    """
+    size = max(1, batch_size or settings.GITHUB_GRAPHQL_BATCH_SIZE)
+    gate = _RateLimitGate()
+    files: dict[str, str] = {}
+    pending = [paths[i:i + size] for i in range(0, len(paths), size)]
+
+    started = time.perf_counter()
+    queries = 0
+    while pending:
+        batch = pending.pop()
+        queries += 1
+        try:
+            blobs = _graphql_blob_batch(
+                access_token, owner, repo_name, [f"{ref}:{p}" for p in batch], gate
+            )
+        except _GraphQLBatchTooLarge:
+            if len(batch) == 1:
+                logger.debug(f"Skipping {batch[0]}: too large for GraphQL")
+                continue
+            mid = len(batch) // 2
+            pending.extend([batch[:mid], batch[mid:]])
+            continue
+        except (requests.RequestException, RuntimeError, ValueError) as exc:
+            # Not a cost problem, so smaller batches would fail the same way
+            remaining = len(batch) + sum(len(b) for b in pending)
+            logger.warning(
+                f"GraphQL fetch from {owner}/{repo_name} failed; leaving {remaining} files to REST: {exc}"
+            )
             break
-    return repos
+        for path, blob in zip(batch, blobs):
+            if blob and blob.get("text") is not None and not blob.get("isBinary") and not blob.get("isTruncated"):
+                files[path] = blob["text"]
+
+    logger.info(
+        f"Fetched {len(files)}/{len(paths)} files from {owner}/{repo_name} via GraphQL "
+        f"in {time.perf_counter() - started:.2f}s ({queries} queries)"
+    )
+    return files
 
 
 def get_repo_infra_files(
-    access_token: str, owner: str, repo_name: str
+    access_token: str,
+    owner: str,
+    repo_name: str,
+    max_workers: int | None = None,
+    stats: dict[str, float] | None = None,
+    mode: str | None = None,
+    shas: dict[str, str] | None = None,
+    skipped: list[dict] | None = None,
+    ref: str | None = None,
 ) -> dict[str, str]:
     """Fetch infrastructure-related files from a repository.
 
-    Walks the repository tree recursively and reads files matching
+    Walks the repository tree recursively (see :func:`list_repo_blobs`, which
+    also handles truncated trees) and reads files matching
     infrastructure patterns (Terraform, YAML/YML configs, Dockerfiles,
     docker-compose files). Directories such as node_modules, .git, vendor,
-    __pycache__, and .next are excluded.
+    __pycache__, and .next are excluded. A ``.comply.yml`` at the repository
+    root can override the include patterns, add excludes and cap file size
+    (see :mod:`app.services.path_filter`).
+
+    Three fetch modes are supported:
+
+    - ``"contents"``: list the tree and download matching files concurrently
+      (see :func:`fetch_files_concurrently`).
+    - ``"graphql"``: list the tree and read uncached files in batched GraphQL
+      queries (see :func:`fetch_files_graphql`), falling back to REST for
+      blobs GraphQL cannot return.
+    - ``"archive"``: stream the tarball for the ref in one request and
+      extract matching files in memory.
+
+    ``"contents"`` mode degrades to ``"archive"`` when the token's remaining
+    rate-limit budget cannot cover the uncached blob downloads.
+
+    Files over the size limit (see :func:`max_file_size`) are skipped using
+    the size recorded in the tree, so they are never downloaded; binary
+    files are detected from their first bytes and dropped before decoding.
 
     Args:
         access_token: A valid GitHub OAuth access token.
         owner: The repository owner (user or organization login).
         repo_name: The repository name.
+        max_workers: Optional override for the download parallelism limit.
+        stats: Optional dict filled with per-file fetch durations in seconds
+            (``"contents"`` mode only).
+        mode: ``"contents"``, ``"graphql"`` or ``"archive"``; defaults to
+            ``settings.GITHUB_FETCH_MODE``.
+        shas: Optional dict filled with path -> git blob SHA for every
+            returned file, e.g. to record a scan manifest.
+        skipped: Optional list extended with ``{"path", "reason", "size"}``
+            for every matching file that was left out of the result.
+        ref: Branch, tag or commit SHA to read; defaults to the default
+            branch. Pass a commit SHA to pin the result to one commit.
 
     Returns:
         A dict mapping file paths to their decoded text content.
     """
-    g = Github(access_token)
-    repo = g.get_repo(f"{owner}/{repo_name}")
+    repo = get_repo(access_token, owner, repo_name)
 
-    # Get full tree recursively
-    tree = repo.get_git_tree(repo.default_branch, recursive=True)
+    mode = mode or settings.GITHUB_FETCH_MODE
+    if mode not in ("contents", "graphql", "archive"):
+        raise ValueError(f"Unknown GitHub fetch mode: {mode}")
 
-    infra_extensions = {".tf", ".yaml", ".yml"}
-    infra_filenames = {"Dockerfile"}
-    exclude_dirs = {"node_modules", ".git", "vendor", "__pycache__", ".next"}
+    ref = ref or repo.default_branch
+    path_filter = load_path_filter(access_token, owner, repo_name, ref)
+    limit = max_file_size(path_filter)
 
-    files: dict[str, str] = {}
-    for item in tree.tree:
-        if item.type != "blob":
-            continue
+    if mode in ("contents", "graphql"):
+        tree = list_repo_blobs(
+            access_token, owner, repo_name, ref,
+            max_workers=max_workers, path_filter=path_filter,
+        )
+        blobs = {}
+        for item in tree:
+            if not path_filter.matches(item["path"]):
+                continue
+            if limit is not None and item.get("size", 0) > limit:
+                record_skip(skipped, item["path"], "too_large", item["size"])
+                continue
+            blobs[item["path"]] = item["sha"]
+        uncached = blob_cache.missing(list(blobs.values()))
+        if mode == "contents" and not has_budget(access_token, len(uncached)):
+            logger.warning(
+                f"Rate-limit budget too low for {len(uncached)} blob fetches on "
+                f"{owner}/{repo_name}; falling back to archive download"
+            )
+            mode = "archive"
+
+    if mode == "archive":
+        require_budget(access_token)
+        return _fetch_infra_files_from_archive(
+            repo, access_token, ref,
+            shas=shas, path_filter=path_filter, skipped=skipped,
+        )
 
-        # Skip excluded directories
-        if any(excluded in item.path for excluded in exclude_dirs):
-            continue
+    prefetched: dict[str, str] = {}
+    if mode == "graphql" and uncached:
+        wanted = [path for path, sha in blobs.items() if sha in uncached]
+        found = fetch_files_graphql(access_token, owner, repo_name, ref, wanted)
+        prefetched = {blobs[path]: text for path, text in found.items()}
+        blob_cache.put_blobs(prefetched)
+
+    files = fetch_files_concurrently(
+        repo, blobs, max_workers=max_workers, stats=stats,
+        max_file_size=limit, skipped=skipped, prefetched=prefetched,
+    )
+    if shas is not None:
+        shas.update({path: blobs[path] for path in files})
+    return files
+
+
+# The compare API returns at most this many changed files
+_COMPARE_FILES_LIMIT = 300
 
-        # Check if file matches infra patterns
-        name = item.path.split("/")[-1]
-        ext = "." + name.rsplit(".", 1)[-1] if "." in name else ""
 
-        is_infra = (
-            ext in infra_extensions
-            or name in infra_filenames
-            or name.startswith("docker-compose")
+def get_repo_diff_files(
+    access_token: str,
+    owner: str,
+    repo_name: str,
+    base: str,
+    head: str,
+    max_workers: int | None = None,
+    skipped: list[dict] | None = None,
+    shas: dict[str, str] | None = None,
+) -> tuple[dict[str, str], dict[str, str]]:
+    """Fetch the infrastructure files touched between two refs.
+
+    Uses the compare API to find added, modified and renamed infra files
+    (removed files have nothing left to audit) and reads them at *head*.
+    The compare API lists at most 300 files, so larger diffs are computed
+    instead by comparing the tree listings of the merge base and *head*.
+    Other infra files living in the same directories as a changed file are
+    fetched as context, so the Auditor can resolve references to resources
+    declared next to the changed code (e.g. a Terraform module split across
+    several ``.tf`` files).
+
+    Args:
+        access_token: A valid GitHub OAuth access token.
+        owner: The repository owner (user or organization login).
+        repo_name: The repository name.
+        base: The base ref (branch, tag or commit SHA) of the comparison.
+        head: The head ref of the comparison.
+        max_workers: Optional override for the download parallelism limit.
+        skipped: Optional list extended with changed or context files left
+            out for being binary, oversized or unreadable.
+        shas: Optional dict filled with path -> git blob SHA for every
+            returned changed or context file.
+
+    Returns:
+        A tuple of (changed_files, context_files), each mapping file paths to
+        decoded text content at *head*.
+    """
+    repo = get_repo(access_token, owner, repo_name)
+    comparison = repo.compare(base, head)
+    path_filter = load_path_filter(access_token, owner, repo_name, head)
+    limit = max_file_size(path_filter)
+
+    if len(comparison.files) < _COMPARE_FILES_LIMIT:
+        changed = {
+            f.filename: f.sha
+            for f in comparison.files
+            if f.status != "removed" and path_filter.matches(f.filename)
+        }
+    else:
+        logger.info(
+            f"{owner}/{repo_name} {base}...{head} changes {_COMPARE_FILES_LIMIT}+ files; "
+            f"diffing tree listings instead"
         )
+        changed = {}
+        base_blobs = {
+            item["path"]: item["sha"]
+            for item in list_repo_blobs(
+                access_token, owner, repo_name, comparison.merge_base_commit.sha,
+                max_workers=max_workers, path_filter=path_filter,
+            )
+        }
+        for item in list_repo_blobs(
+            access_token, owner, repo_name, head, max_workers=max_workers, path_filter=path_filter
+        ):
+            if base_blobs.get(item["path"]) != item["sha"] and path_filter.matches(item["path"]):
+                changed[item["path"]] = item["sha"]
+
+    context: dict[str, str] = {}
+    for directory in sorted({path.rpartition("/")[0] for path in changed}):
+        try:
+            entries = get_json(
+                access_token,
+                f"/repos/{owner}/{repo_name}/contents/{urllib.parse.quote(directory)}".rstrip("/"),
+                {"ref": head},
+            )
+        except GithubException:
+            continue
+        if not isinstance(entries, list):
+            entries = [entries]
+        for entry in entries:
+            if (
+                entry["type"] == "file"
+                and entry["path"] not in changed
+                and path_filter.matches(entry["path"])
+            ):
+                if limit is not None and entry.get("size", 0) > limit:
+                    record_skip(skipped, entry["path"], "too_large", entry["size"])
+                    continue
+                context[entry["path"]] = entry["sha"]
+
+    blobs = {**changed, **context}
+    require_budget(access_token, len(blob_cache.missing(list(blobs.values()))))
+    # Changed files are size-checked once their blob metadata arrives, as
+    # compare entries carry no size
+    files = fetch_files_concurrently(
+        repo, blobs, max_workers=max_workers, max_file_size=limit, skipped=skipped
+    )
+    changed_files = {path: files[path] for path in changed if path in files}
+    context_files = {path: files[path] for path in context if path in files}
+    if shas is not None:
+        shas.update({path: blobs[path] for path in files})
+    return changed_files, context_files
 
-        if is_infra:
-            try:
-                content = repo.get_contents(item.path, ref=repo.default_branch)
-                if content.encoding == "base64":
-                    files[item.path] = base64.b64decode(content.content).decode(
-                        "utf-8"
-                    )
-                else:
-                    files[item.path] = content.decoded_content.decode("utf-8")
-            except Exception:
-                continue  # Skip files we can't read
 
-    return files
+# Requests made by create_pr besides one tree listing per directory on the
+# fixed files' paths: repository metadata, base ref, base commit, new tree,
+# commit, branch ref and pull request
+_CREATE_PR_REQUESTS = 7
+
+# Tree entry modes for regular and executable files
+_FILE_MODE = "100644"
+_EXECUTABLE_MODE = "100755"
+
+
+def _directories(paths: list[str]) -> set[str]:
+    """Return every directory on *paths*, ancestors and the root ("") included."""
+    directories = {""}
+    for path in paths:
+        parts = path.split("/")[:-1]
+        directories.update("/".join(parts[:i]) for i in range(1, len(parts) + 1))
+    return directories
+
+
+def _file_modes(access_token: str, owner: str, repo_name: str, tree_sha: str, paths: list[str]) -> dict[str, str]:
+    """Return the tree entry mode of each of *paths* that exists under *tree_sha*.
+
+    Walks down from the root one non-recursive tree listing per directory on
+    the paths (see :func:`_directories`), so the cost does not depend on the
+    size of the repository. Directories that do not exist yet are skipped.
+    """
+    trees_path = f"/repos/{owner}/{repo_name}/git/trees"
+    wanted = set(paths)
+    directories = _directories(paths)
+    tree_shas = {"": tree_sha}
+    modes: dict[str, str] = {}
+    # Parents are listed before their subdirectories
+    for directory in sorted(directories, key=lambda d: (d.count("/") + bool(d), d)):
+        sha = tree_shas.get(directory)
+        if sha is None:
+            continue
+        prefix = f"{directory}/" if directory else ""
+        for item in get_json(access_token, f"{trees_path}/{sha}")["tree"]:
+            path = prefix + item["path"]
+            if item["type"] == "tree" and path in directories:
+                tree_shas[path] = item["sha"]
+            elif item["type"] == "blob" and path in wanted:
+                modes[path] = item["mode"]
+    return modes
 
 
 def create_pr(
@@ -148,13 +890,18 @@ def create_pr(
     repo_name: str,
     file_fixes: list[dict],
     plans: list[dict],
+    base_sha: str | None = None,
+    base_branch: str | None = None,
 ) -> dict:
     """Create a branch with fixed files and open a pull request.
 
-    For each entry in file_fixes, the corresponding file on the new branch is
-    updated with the fixed content. A pull request is opened against the
-    repository's default branch with a description summarising the
-    remediation plans.
+    All entries in file_fixes are written as one git tree and committed once
+    on a new branch, so the number of API calls (and CI runs) does not grow
+    with the number of fixed files. The branch starts from *base_sha* (the
+    commit that was scanned) when given, otherwise from the head of
+    *base_branch*. Files that are executable in the base tree stay
+    executable. A pull request is opened against *base_branch* with a
+    description summarising the remediation plans.
 
     Args:
         access_token: A valid GitHub OAuth access token.
@@ -164,31 +911,48 @@ def create_pr(
             ``fixed_content`` (the corrected file text).
         plans: A list of remediation plan dicts used to build the PR
             description.
+        base_sha: Optional commit SHA to base the fix commit on; it must be
+            on *base_branch*, or the pull request carries that branch's
+            unmerged commits too.
+        base_branch: The branch the pull request targets; defaults to the
+            repository's default branch.
 
     Returns:
         A dict with pr_url, branch, and pr_number.
     """
-    g = Github(access_token)
-    repo = g.get_repo(f"{owner}/{repo_name}")
-    base_branch = repo.default_branch
+    paths = [fix["file"] for fix in file_fixes]
+    require_budget(access_token, _CREATE_PR_REQUESTS + len(_directories(paths)))
+    repo = get_repo(access_token, owner, repo_name)
+    base_branch = base_branch or repo.default_branch
 
     # Create branch name
     branch_name = f"comply/fix-{int(time.time())}"
 
-    # Create branch from default branch
-    base_ref = repo.get_git_ref(f"heads/{base_branch}")
-    repo.create_git_ref(f"refs/heads/{branch_name}", base_ref.object.sha)
-
-    # Commit each fixed file
-    for fix in file_fixes:
-        contents = repo.get_contents(fix["file"], ref=branch_name)
-        repo.update_file(
-            fix["file"],
-            f"fix: resolve regulatory violations in {fix['file']}",
-            fix["fixed_content"],
-            contents.sha,
-            branch=branch_name,
-        )
+    # Write every fixed file into a single tree on top of the base commit,
+    # commit it once, and point the new branch at that commit
+    if base_sha is None:
+        base_sha = repo.get_git_ref(f"heads/{base_branch}").object.sha
+    base_commit = repo.get_git_commit(base_sha)
+    modes = _file_modes(access_token, owner, repo_name, base_commit.tree.sha, paths)
+    tree = repo.create_git_tree(
+        [
+            InputGitTreeElement(
+                fix["file"],
+                _EXECUTABLE_MODE if modes.get(fix["file"]) == _EXECUTABLE_MODE else _FILE_MODE,
+                "blob",
+                content=fix["fixed_content"],
+            )
+            for fix in file_fixes
+        ],
+        base_tree=base_commit.tree,
+    )
+    files_list = "\n".join(f"- {fix['file']}" for fix in file_fixes)
+    commit = repo.create_git_commit(
+        f"fix: resolve regulatory violations in {len(file_fixes)} file(s)\n\n{files_list}",
+        tree,
+        [base_commit],
+    )
+    repo.create_git_ref(f"refs/heads/{branch_name}", commit.sha)
 
     # Build PR description
     pr_body = build_pr_description(plans)
@@ -0,0 +1,439 @@
+"""
+Structural parsing of Terraform HCL and Kubernetes YAML into resources.
+
+Both formats are reduced to the same shape: a :class:`Resource` whose body
+is a :class:`Node` (a dict that also remembers the line of every field), so
+rule checks can address fields by path and report exact line numbers.
+
+Only literal values are evaluated.  Anything Terraform would compute at plan
+time (references, function calls, interpolated strings, ``dynamic`` blocks)
+becomes :data:`UNKNOWN`, letting callers tell "absent" from "cannot know".
+"""
+
+import re
+
+import yaml
+
+
+class ParseError(ValueError):
+    """The file is not valid HCL/YAML of a supported shape."""
+
+
+class _Unknown:
+    """Marker for values that depend on evaluation (variables, functions, ...)."""
+
+    def __repr__(self) -> str:
+        return "UNKNOWN"
+
+
+UNKNOWN = _Unknown()
+
+# Resource.type of a Terraform ``module`` call; the resources it creates are
+# defined elsewhere, so its arguments cannot be checked field by field
+MODULE = "module"
+
+
+class Node(dict):
+    """A mapping (HCL body/object or YAML mapping) with line information.
+
+    Attributes:
+        line: 1-based line where the mapping starts.
+        field_lines: Line of each key.
+    """
+
+    def __init__(self, line: int):
+        super().__init__()
+        self.line = line
+        self.field_lines: dict[str, int] = {}
+
+    def set(self, key: str, value, line: int) -> None:
+        self[key] = value
+        self.field_lines.setdefault(key, line)
+
+
+class Resource:
+    """A Terraform ``resource`` block, a Terraform ``module`` call or a Kubernetes object."""
+
+    __slots__ = ("provider", "type", "name", "file", "line", "body")
+
+    def __init__(self, provider: str, type: str, name: str, file: str, line: int, body: Node):
+        self.provider = provider
+        self.type = type
+        self.name = name
+        self.file = file
+        self.line = line
+        self.body = body
+
+    @property
+    def address(self) -> str:
+        """Human-readable identifier, e.g. ``aws_db_instance.main`` or ``Deployment/web``."""
+        if self.provider == "kubernetes":
+            return f"{self.type.rsplit('/', 1)[-1]}/{self.name}"
+        # Terraform's own addresses: aws_db_instance.main, module.db
+        return f"{self.type}.{self.name}"
+
+
+# ── HCL ──────────────────────────────────────────────────────────────
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<newline>\n)
+  | (?P<space>[ \t\r]+)
+  | (?P<comment>\#[^\n]*|//[^\n]*)
+  | (?P<block_comment>/\*.*?\*/)
+  | (?P<heredoc><<-?(?P<marker>[A-Za-z_][A-Za-z0-9_]*)[ \t]*\n)
+  | (?P<number>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_\-]*)
+  | (?P<op>==|!=|>=|<=|=>|&&|\|\||\.\.\.|[{}\[\]()=,:.?!<>+\-*/%])
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", '"': '"', "\\": "\\"}
+
+
+class _Token:
+    __slots__ = ("kind", "value", "line")
+
+    def __init__(self, kind: str, value, line: int):
+        self.kind = kind
+        self.value = value
+        self.line = line
+
+
+def _scan_string(text: str, pos: int) -> tuple[int, str, bool]:
+    """Scan a quoted string starting after its opening quote.
+
+    Returns:
+        (position after the closing quote, literal text, has template).
+    """
+    out = []
+    templated = False
+    depth = 0
+    i = pos
+    while i < len(text):
+        c = text[i]
+        if c == "\\" and i + 1 < len(text):
+            out.append(_ESCAPES.get(text[i + 1], text[i + 1]))
+            i += 2
+            continue
+        if depth == 0:
+            if c == '"':
+                return i + 1, "".join(out), templated
+            if c == "\n":
+                break
+            if text.startswith(("${", "%{"), i) and not text.startswith(("$${", "%%{"), i - 1):
+                templated = True
+                depth = 1
+                i += 2
+                continue
+            out.append(c)
+        else:
+            # Inside an interpolation: track braces and skip nested strings
+            if c == '"':
+                i, _, _ = _scan_string(text, i + 1)
+                continue
+            if c == "{":
+                depth += 1
+            elif c == "}":
+                depth -= 1
+        i += 1
+    raise ParseError("unterminated string")
+
+
+def _tokenize(text: str) -> list[_Token]:
+    tokens = []
+    line = 1
+    pos = 0
+    while pos < len(text):
+        if text[pos] == '"':
+            end, value, templated = _scan_string(text, pos + 1)
+            tokens.append(_Token("string", UNKNOWN if templated else value, line))
+            pos = end
+            continue
+        m = _TOKEN_RE.match(text, pos)
+        if not m:
+            raise ParseError(f"unexpected character {text[pos]!r} on line {line}")
+        kind = m.lastgroup if m.lastgroup != "marker" else "heredoc"
+        if kind == "heredoc":
+            marker = m.group("marker")
+            body_start = m.end()
+            end_re = re.compile(rf"^[ \t]*{re.escape(marker)}[ \t]*$", re.MULTILINE)
+            end = end_re.search(text, body_start)
+            if not end:
+                raise ParseError(f"unterminated heredoc on line {line}")
+            body = text[body_start:end.start()]
+            tokens.append(_Token("string", UNKNOWN if "${" in body or "%{" in body else body, line))
+            line += text.count("\n", pos, end.end())
+            pos = end.end()
+            continue
+        value = m.group()
+        if kind == "newline":
+            tokens.append(_Token("newline", value, line))
+            line += 1
+        elif kind == "block_comment":
+            line += value.count("\n")
+        elif kind in ("number", "ident", "op"):
+            tokens.append(_Token(kind, value, line))
+        pos = m.end()
+    tokens.append(_Token("eof", None, line))
+    return tokens
+
+
+class _HCLParser:
+    def __init__(self, text: str):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def peek(self) -> _Token:
+        return self.tokens[self.pos]
+
+    def next(self) -> _Token:
+        tok = self.tokens[self.pos]
+        self.pos += 1
+        return tok
+
+    def skip_newlines(self) -> None:
+        while self.peek().kind == "newline":
+            self.pos += 1
+
+    def expect_op(self, op: str) -> _Token:
+        tok = self.next()
+        if tok.kind != "op" or tok.value != op:
+            raise ParseError(f"expected {op!r} on line {tok.line}")
+        return tok
+
+    def parse_body(self, line: int, closing: str | None) -> tuple[Node, list[tuple[str, list, Node]]]:
+        """Parse attributes and blocks until *closing* (or EOF).
+
+        Returns:
+            The body as a Node (nested blocks stored as lists of Nodes under
+            their type) and the blocks in order as (type, labels, body).
+        """
+        node = Node(line)
+        blocks = []
+        while True:
+            self.skip_newlines()
+            tok = self.next()
+            if closing is None and tok.kind == "eof":
+                return node, blocks
+            if tok.kind == "op" and tok.value == closing:
+                return node, blocks
+            if tok.kind != "ident":
+                raise ParseError(f"unexpected {tok.value!r} on line {tok.line}")
+
+            nxt = self.peek()
+            if nxt.kind == "op" and nxt.value == "=":
+                self.next()
+                node.set(tok.value, self.parse_expr(), tok.line)
+                continue
+
+            labels = []
+            while self.peek().kind in ("string", "ident"):
+                labels.append(self.next().value)
+            self.expect_op("{")
+            body, _ = self.parse_body(tok.line, "}")
+            blocks.append((tok.value, labels, body))
+            if tok.value == "dynamic" and labels:
+                # Generated blocks cannot be known without evaluation
+                node.set(labels[0] if isinstance(labels[0], str) else "dynamic", UNKNOWN, tok.line)
+            elif isinstance(node.get(tok.value), list):
+                node[tok.value].append(body)
+            elif tok.value not in node:
+                node.set(tok.value, [body], tok.line)
+
+    def parse_expr(self):
+        value = self.parse_primary()
+        if not self.at_expr_end():
+            # Operators, indexing, conditionals, ...: evaluate at plan time
+            self.skip_expr()
+            return UNKNOWN
+        return value
+
+    def at_expr_end(self) -> bool:
+        tok = self.peek()
+        return tok.kind in ("newline", "eof") or (tok.kind == "op" and tok.value in (",", "]", "}", ")"))
+
+    def skip_expr(self) -> None:
+        depth = 0
+        while True:
+            tok = self.peek()
+            if tok.kind == "eof":
+                return
+            if depth == 0 and self.at_expr_end():
+                return
+            if tok.kind == "op" and tok.value in ("(", "[", "{"):
+                depth += 1
+            elif tok.kind == "op" and tok.value in (")", "]", "}"):
+                depth -= 1
+            self.next()
+
+    def parse_primary(self):
+        tok = self.next()
+        if tok.kind == "string":
+            return tok.value
+        if tok.kind == "number":
+            return float(tok.value) if any(c in tok.value for c in ".eE") else int(tok.value)
+        if tok.kind == "ident":
+            if tok.value in ("true", "false"):
+                return tok.value == "true"
+            if tok.value == "null":
+                return None
+            self.skip_expr()
+            return UNKNOWN
+        if tok.kind == "op" and tok.value == "[":
+            return self.parse_list()
+        if tok.kind == "op" and tok.value == "{":
+            return self.parse_object(tok.line)
+        self.pos -= 1
+        self.skip_expr()
+        return UNKNOWN
+
+    def parse_list(self):
+        self.skip_newlines()
+        if self.peek().kind == "ident" and self.peek().value == "for":
+            self.skip_to_close("]")
+            return UNKNOWN
+        items = []
+        while True:
+            self.skip_newlines()
+            if self.peek().kind == "op" and self.peek().value == "]":
+                self.next()
+                return items
+            items.append(self.parse_expr())
+            self.skip_newlines()
+            tok = self.next()
+            if tok.kind == "op" and tok.value == "]":
+                return items
+            if not (tok.kind == "op" and tok.value == ","):
+                raise ParseError(f"expected ',' or ']' on line {tok.line}")
+
+    def parse_object(self, line: int):
+        self.skip_newlines()
+        if self.peek().kind == "ident" and self.peek().value == "for":
+            self.skip_to_close("}")
+            return UNKNOWN
+        node = Node(line)
+        while True:
+            self.skip_newlines()
+            tok = self.next()
+            if tok.kind == "op" and tok.value == "}":
+                return node
+            if tok.kind not in ("ident", "string") or self.peek().kind != "op" or self.peek().value not in ("=", ":"):
+                # Computed keys such as (var.name) = ...
+                self.pos -= 1
+                self.skip_to_close("}")
+                return UNKNOWN
+            self.next()
+            value = self.parse_expr()
+            if isinstance(tok.value, str):
+                node.set(tok.value, value, tok.line)
+            tok = self.peek()
+            if tok.kind == "op" and tok.value == ",":
+                self.next()
+
+    def skip_to_close(self, closing: str) -> None:
+        depth = 1
+        while depth:
+            tok = self.next()
+            if tok.kind == "eof":
+                raise ParseError(f"missing {closing!r}")
+            if tok.kind == "op" and tok.value in ("(", "[", "{"):
+                depth += 1
+            elif tok.kind == "op" and tok.value in (")", "]", "}"):
+                depth -= 1
+
+
+def parse_terraform(path: str, text: str) -> list[Resource]:
+    """Return the ``resource`` blocks and ``module`` calls of a Terraform file.
+
+    A module call is returned with type :data:`MODULE` and provider
+    ``"module"``.
+
+    Raises:
+        ParseError: If the file is not valid HCL.
+    """
+    _, blocks = _HCLParser(text).parse_body(1, None)
+    resources = []
+    for block_type, labels, body in blocks:
+        if block_type == MODULE and len(labels) == 1 and isinstance(labels[0], str):
+            resources.append(Resource(MODULE, MODULE, labels[0], path, body.line, body))
+            continue
+        if block_type != "resource" or len(labels) != 2 or not all(isinstance(label, str) for label in labels):
+            continue
+        resource_type, name = labels
+        resources.append(
+            Resource(resource_type.split("_", 1)[0], resource_type, name, path, body.line, body)
+        )
+    return resources
+
+
+# ── Kubernetes YAML ──────────────────────────────────────────────────
+
+def _convert_yaml(node, constructor: yaml.constructor.SafeConstructor):
+    if isinstance(node, yaml.MappingNode):
+        out = Node(node.start_mark.line + 1)
+        for key_node, value_node in node.value:
+            if isinstance(key_node, yaml.ScalarNode):
+                out.set(str(key_node.value), _convert_yaml(value_node, constructor), key_node.start_mark.line + 1)
+        return out
+    if isinstance(node, yaml.SequenceNode):
+        return [_convert_yaml(item, constructor) for item in node.value]
+    return constructor.construct_object(node, deep=True)
+
+
+def parse_kubernetes(path: str, text: str) -> list[Resource]:
+    """Return the Kubernetes objects in a (multi-document) YAML file.
+
+    ``List`` kinds are expanded into their items.
+
+    Raises:
+        ParseError: If the file is not YAML, is a template (``{{ ... }}``),
+            or contains a document that is not a Kubernetes object.
+    """
+    if "{{" in text:
+        raise ParseError("templated YAML")
+    # A constructor per file: it memoises every node it has built
+    constructor = yaml.constructor.SafeConstructor()
+    try:
+        documents = [
+            _convert_yaml(doc, constructor)
+            for doc in yaml.compose_all(text, Loader=yaml.SafeLoader)
+            if doc is not None
+        ]
+    except yaml.YAMLError as exc:
+        raise ParseError(str(exc)) from exc
+
+    resources = []
+    pending = list(documents)
+    while pending:
+        doc = pending.pop(0)
+        if not isinstance(doc, Node) or not isinstance(doc.get("apiVersion"), str) or not isinstance(doc.get("kind"), str):
+            raise ParseError("not a Kubernetes manifest")
+        if doc["kind"].endswith("List") and isinstance(doc.get("items"), list):
+            pending.extend(doc["items"])
+            continue
+        metadata = doc.get("metadata")
+        name = metadata.get("name", "") if isinstance(metadata, Node) else ""
+        resources.append(
+            Resource("kubernetes", f"{doc['apiVersion']}/{doc['kind']}", str(name), path, doc.line, doc)
+        )
+    return resources
+
+
+def parse_file(path: str, text: str) -> list[Resource] | None:
+    """Parse a Terraform or Kubernetes file into resources.
+
+    Returns:
+        The resources, or None if the file's format is not supported or it
+        cannot be parsed.
+    """
+    lower = path.lower()
+    try:
+        if lower.endswith(".tf"):
+            return parse_terraform(path, text)
+        if lower.endswith((".yaml", ".yml")):
+            return parse_kubernetes(path, text)
+    except ParseError:
+        return None
+    return None
@@ -0,0 +1,104 @@
+"""
+Persistent cache of Gemini responses keyed by a hash of the full request.
+
+The key covers the model name, system prompt, user content and generation
+config, so any change to the prompt or the audited content is a miss.
+Entries live in the ``llm_cache`` SQLite table with a per-entry expiry
+(call sites choose their own TTL) and are evicted least-recently-used once
+the total cached size exceeds ``settings.LLM_CACHE_MAX_BYTES``.
+
+Streaming responses are stored as their chunk list so a hit can be replayed
+chunk by chunk, keeping the SSE experience unchanged.
+"""
+
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+from app.database import get_db
+
+
+def cache_key(
+    model: str, system_prompt: str, user_content: str, generation_config: dict | None = None
+) -> str:
+    """Return the content hash identifying a Gemini request."""
+    digest = hashlib.sha256()
+    for part in (
+        model,
+        system_prompt,
+        user_content,
+        json.dumps(generation_config, sort_keys=True) if generation_config else "",
+    ):
+        data = part.encode("utf-8")
+        # Length-prefix each part so boundaries cannot be shifted between fields
+        digest.update(f"{len(data)}:".encode())
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def enabled() -> bool:
+    return settings.LLM_CACHE_MAX_BYTES > 0
+
+
+def get(key: str) -> list[str] | None:
+    """Return the cached response chunks for *key*, or None on a miss.
+
+    Expired entries count as misses (and are removed).
+    """
+    if not enabled():
+        return None
+
+    now = datetime.utcnow().isoformat()
+    db = get_db()
+    try:
+        row = db.execute(
+            "SELECT chunks, expires_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row["expires_at"] <= now:
+            db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            db.commit()
+            return None
+        db.execute("UPDATE llm_cache SET last_accessed = ? WHERE key = ?", (now, key))
+        db.commit()
+    finally:
+        db.close()
+    return json.loads(row["chunks"])
+
+
+def put(key: str, chunks: list[str], ttl: int) -> None:
+    """Store response *chunks* under *key* for *ttl* seconds and evict old
+    entries over the size cap."""
+    if not enabled() or ttl <= 0 or not "".join(chunks).strip():
+        return
+
+    now = datetime.utcnow()
+    payload = json.dumps(chunks)
+    db = get_db()
+    try:
+        db.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, chunks, size, expires_at, last_accessed) VALUES (?, ?, ?, ?, ?)",
+            (key, payload, len(payload.encode("utf-8")), (now + timedelta(seconds=ttl)).isoformat(), now.isoformat()),
+        )
+        _evict(db, settings.LLM_CACHE_MAX_BYTES, now.isoformat())
+        db.commit()
+    finally:
+        db.close()
+
+
+def _evict(db, max_bytes: int, now: str) -> None:
+    """Drop expired entries, then least-recently-used ones until under *max_bytes*."""
+    db.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+    total = db.execute("SELECT COALESCE(SUM(size), 0) AS total FROM llm_cache").fetchone()["total"]
+    if total <= max_bytes:
+        return
+
+    stale = []
+    for row in db.execute("SELECT key, size FROM llm_cache ORDER BY last_accessed"):
+        if total <= max_bytes:
+            break
+        stale.append((row["key"],))
+        total -= row["size"]
+    db.executemany("DELETE FROM llm_cache WHERE key = ?", stale)
@@ -0,0 +1,233 @@
+"""
+Offline repository source: read infrastructure files from a local directory
+or a local (bare or non-bare) git repository at a ref.
+
+Applies the same ``.comply.yml`` path filter, size limit and binary
+detection as :func:`app.services.github_service.get_repo_infra_files`, and
+returns the same ``{path: content}`` mapping, so the scan pipeline can run
+from CI runners and batch jobs without GitHub API calls or OAuth tokens.
+
+Run directly for a network-free scan or throughput benchmark::
+
+    python -m app.services.local_source /path/to/checkout
+    python -m app.services.local_source /path/to/repo.git --ref main --audit
+"""
+
+import logging
+import os
+import subprocess
+import time
+
+from app.services.blob_cache import git_blob_sha
+from app.services.file_screening import SkippedFile, decode_text, max_file_size, record_skip
+from app.services.path_filter import CONFIG_FILENAME, PathFilter, parse_config
+
+logger = logging.getLogger(__name__)
+
+
+def _git(path: str, *args: str, stdin: bytes | None = None) -> bytes:
+    result = subprocess.run(
+        ["git", "-C", path, *args], input=stdin, capture_output=True, check=False
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"git {' '.join(args)} failed: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+
+def _is_bare_repo(path: str) -> bool:
+    try:
+        return _git(path, "rev-parse", "--is-bare-repository").strip() == b"true"
+    except (RuntimeError, FileNotFoundError):
+        return False
+
+
+def _read_git_files(
+    path: str, ref: str, shas: dict[str, str] | None, skipped: list[dict] | None
+) -> dict[str, str]:
+    """Read matching files from the git object database at *ref*."""
+    commit = _git(path, "rev-parse", "--verify", f"{ref}^{{commit}}").decode().strip()
+    try:
+        path_filter = parse_config(
+            _git(path, "cat-file", "blob", f"{commit}:{CONFIG_FILENAME}").decode("utf-8", errors="replace")
+        )
+    except RuntimeError:
+        path_filter = PathFilter()
+    limit = max_file_size(path_filter)
+
+    # <mode> SP <type> SP <sha> SP+ <size> TAB <path>, NUL-terminated
+    blobs: dict[str, str] = {}
+    for entry in _git(path, "ls-tree", "-r", "-l", "-z", commit).split(b"\0"):
+        if not entry:
+            continue
+        meta, _, name = entry.partition(b"\t")
+        _, kind, sha, size = meta.decode().split()
+        file_path = name.decode("utf-8", errors="surrogateescape")
+        if kind != "blob" or not path_filter.matches(file_path):
+            continue
+        if path_filter.excludes_dir(file_path.rpartition("/")[0]):
+            continue
+        # ls-tree prints "BAD" for the size of a missing blob; cat-file
+        # reports it as missing below
+        if limit is not None and size.isdigit() and int(size) > limit:
+            record_skip(skipped, file_path, "too_large", int(size))
+            continue
+        blobs[file_path] = sha
+
+    # One cat-file process for every blob: "<sha> blob <size>\n<data>\n" each,
+    # or a bare "<sha> missing\n" for objects absent from a partial clone
+    output = _git(path, "cat-file", "--batch", stdin="".join(f"{sha}\n" for sha in blobs.values()).encode())
+    contents: dict[str, bytes] = {}
+    offset = 0
+    while offset < len(output):
+        header_end = output.index(b"\n", offset)
+        header = output[offset:header_end].decode().split()
+        offset = header_end + 1
+        if len(header) != 3:
+            continue
+        sha, _, size = header
+        contents[sha] = output[offset:offset + int(size)]
+        offset += int(size) + 1
+
+    files: dict[str, str] = {}
+    for file_path, sha in blobs.items():
+        if sha not in contents:
+            logger.debug(f"Skipping {file_path}: blob {sha} is missing")
+            record_skip(skipped, file_path, "unreadable", None)
+            continue
+        try:
+            files[file_path] = decode_text(contents[sha])
+        except SkippedFile as exc:
+            record_skip(skipped, file_path, exc.reason, exc.size)
+            continue
+        if shas is not None:
+            shas[file_path] = sha
+    return files
+
+
+def _read_directory_files(
+    path: str, shas: dict[str, str] | None, skipped: list[dict] | None
+) -> dict[str, str]:
+    """Read matching files from a working directory on disk."""
+    config_path = os.path.join(path, CONFIG_FILENAME)
+    if os.path.isfile(config_path):
+        with open(config_path, encoding="utf-8", errors="replace") as f:
+            path_filter = parse_config(f.read())
+    else:
+        path_filter = PathFilter()
+    limit = max_file_size(path_filter)
+
+    files: dict[str, str] = {}
+    for root, dirs, names in os.walk(path):
+        rel_root = os.path.relpath(root, path).replace(os.sep, "/")
+        rel_root = "" if rel_root == "." else rel_root
+        # Prune excluded directories before descending into them
+        dirs[:] = sorted(
+            d for d in dirs
+            if not path_filter.excludes_dir(f"{rel_root}/{d}" if rel_root else d)
+        )
+        for name in sorted(names):
+            file_path = f"{rel_root}/{name}" if rel_root else name
+            full_path = os.path.join(root, name)
+            if not path_filter.matches(file_path) or not os.path.isfile(full_path):
+                continue
+            size = os.path.getsize(full_path)
+            if limit is not None and size > limit:
+                record_skip(skipped, file_path, "too_large", size)
+                continue
+            try:
+                with open(full_path, "rb") as f:
+                    data = f.read()
+                files[file_path] = decode_text(data)
+            except SkippedFile as exc:
+                record_skip(skipped, file_path, exc.reason, exc.size)
+                continue
+            except OSError as exc:
+                logger.debug(f"Skipping {file_path}: {exc}")
+                record_skip(skipped, file_path, "unreadable", size)
+                continue
+            if shas is not None:
+                shas[file_path] = git_blob_sha(data)
+    return files
+
+
+def get_local_infra_files(
+    path: str,
+    ref: str | None = None,
+    shas: dict[str, str] | None = None,
+    skipped: list[dict] | None = None,
+) -> dict[str, str]:
+    """Read infrastructure files from a local directory or git repository.
+
+    With *ref* (or for a bare repository, which has no working tree), files
+    are read from git objects at that ref; otherwise the directory is walked
+    as it is on disk, including uncommitted changes.
+
+    Args:
+        path: A directory, a non-bare git checkout or a bare repository.
+        ref: Optional branch, tag or commit to read; bare repositories
+            default to ``HEAD``.
+        shas: Optional dict filled with path -> git blob SHA for every
+            returned file.
+        skipped: Optional list extended with ``{"path", "reason", "size"}``
+            for every matching file that was left out.
+
+    Returns:
+        A dict mapping repository-relative file paths to their text content.
+
+    Raises:
+        FileNotFoundError: If *path* does not exist.
+        RuntimeError: If a git command fails (e.g. an unknown ref).
+    """
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"No such directory: {path}")
+
+    started = time.perf_counter()
+    if ref is None and _is_bare_repo(path):
+        ref = "HEAD"
+    if ref is not None:
+        files = _read_git_files(path, ref, shas, skipped)
+    else:
+        files = _read_directory_files(path, shas, skipped)
+    logger.info(
+        f"Read {len(files)} files from {path}{f'@{ref}' if ref else ''} "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+    return files
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Scan a local directory or git repository offline.")
+    parser.add_argument("path", help="Directory, git checkout or bare repository")
+    parser.add_argument("--ref", help="Branch, tag or commit to read from git objects")
+    parser.add_argument("--audit", action="store_true", help="Run the Auditor/Strategist pipeline on the files")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    skipped_files: list[dict] = []
+    read_started = time.perf_counter()
+    repo_files = get_local_infra_files(args.path, ref=args.ref, skipped=skipped_files)
+    report = {
+        "files": len(repo_files),
+        "bytes": sum(len(content.encode("utf-8")) for content in repo_files.values()),
+        "skipped_files": skipped_files,
+        "read_seconds": round(time.perf_counter() - read_started, 3),
+    }
+
+    if args.audit:
+        from app.graphs.scan_pipeline import scan_app
+
+        audit_started = time.perf_counter()
+        result = scan_app.invoke({
+            "repo_files": repo_files,
+            "violations": [],
+            "remediation_plans": [],
+            "reasoning_log": [],
+        })
+        report["violations"] = result["violations"]
+        report["remediation_plans"] = result["remediation_plans"]
+        report["audit_seconds"] = round(time.perf_counter() - audit_started, 3)
+
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,248 @@
+"""
+Compiled include/exclude glob matching for repository paths.
+
+Glob patterns are compiled into a segment trie that is walked once per path
+component, so matching cost depends on path depth rather than on the number
+of patterns:
+
+- literal segments (``infra``, ``Dockerfile``) are dict lookups;
+- ``*.ext`` / ``prefix*`` segments are dict lookups keyed by suffix/prefix;
+- ``**`` matches any number of directories;
+- anything else (``?``, ``[...]``, ``a*b``) falls back to a compiled regex.
+
+Directory match states are memoised, so evaluating a tree with many files per
+directory costs roughly one trie step per file.
+
+Repositories can tune what gets audited with an optional ``.comply.yml`` at
+the repository root::
+
+    include:            # replaces the default include patterns
+      - "infra/**/*.tf"
+      - "k8s/**/*.yaml"
+    exclude:            # added to the default exclude patterns
+      - ".github/**"
+      - "charts/*/tests/**"
+    max_file_size: 524288   # bytes; larger files are skipped
+"""
+
+import fnmatch
+import logging
+import re
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FILENAME = ".comply.yml"
+
+DEFAULT_INCLUDE = ["*.tf", "*.yaml", "*.yml", "Dockerfile", "docker-compose*"]
+DEFAULT_EXCLUDE = [
+    "**/node_modules/**",
+    "**/.git/**",
+    "**/vendor/**",
+    "**/__pycache__/**",
+    "**/.next/**",
+]
+
+_GLOB_CHARS = re.compile(r"[*?\[]")
+
+
+class _Node:
+    __slots__ = ("literal", "suffix", "prefix", "regex", "star", "is_star", "terminal")
+
+    def __init__(self, is_star: bool = False):
+        self.literal: dict[str, _Node] = {}
+        self.suffix: dict[str, _Node] = {}
+        self.prefix: dict[str, _Node] = {}
+        self.regex: list[tuple[re.Pattern, _Node]] = []
+        self.star: _Node | None = None
+        self.is_star = is_star
+        self.terminal = False
+
+
+class _GlobTrie:
+    """A set of glob patterns compiled into a segment trie."""
+
+    def __init__(self, patterns: list[str]):
+        self.root = _Node()
+        self._suffix_lengths: set[int] = set()
+        self._prefix_lengths: set[int] = set()
+        for pattern in patterns:
+            self._add(pattern)
+        self._root_states = self._closure([self.root])
+
+    def _add(self, pattern: str) -> None:
+        pattern = pattern.strip()
+        if not pattern:
+            return
+        if pattern.endswith("/"):
+            pattern += "**"
+        if "/" not in pattern.strip("/"):
+            # Bare names match at any depth, like .gitignore
+            pattern = "**/" + pattern
+        node = self.root
+        for segment in pattern.strip("/").split("/"):
+            node = self._child(node, segment)
+        node.terminal = True
+
+    def _child(self, node: _Node, segment: str) -> _Node:
+        if segment == "**":
+            if node.star is None:
+                node.star = _Node(is_star=True)
+            return node.star
+        if not _GLOB_CHARS.search(segment):
+            return node.literal.setdefault(segment, _Node())
+        body = segment[1:]
+        if segment.startswith("*") and not _GLOB_CHARS.search(body):
+            self._suffix_lengths.add(len(body))
+            return node.suffix.setdefault(body, _Node())
+        head = segment[:-1]
+        if segment.endswith("*") and not _GLOB_CHARS.search(head):
+            self._prefix_lengths.add(len(head))
+            return node.prefix.setdefault(head, _Node())
+        for rx, child in node.regex:
+            if rx.pattern == fnmatch.translate(segment):
+                return child
+        child = _Node()
+        node.regex.append((re.compile(fnmatch.translate(segment)), child))
+        return child
+
+    @staticmethod
+    def _closure(nodes) -> tuple[_Node, ...]:
+        """Add the zero-directory expansion of every ``**`` reachable."""
+        seen: dict[int, _Node] = {}
+        stack = list(nodes)
+        while stack:
+            node = stack.pop()
+            if id(node) in seen:
+                continue
+            seen[id(node)] = node
+            if node.star is not None:
+                stack.append(node.star)
+        return tuple(seen.values())
+
+    def step(self, states: tuple[_Node, ...], segment: str) -> tuple[_Node, ...]:
+        """Advance *states* by one path segment."""
+        following = []
+        for node in states:
+            if node.is_star:
+                following.append(node)
+            child = node.literal.get(segment)
+            if child is not None:
+                following.append(child)
+            if node.suffix:
+                for n in self._suffix_lengths:
+                    child = node.suffix.get(segment[len(segment) - n:]) if len(segment) >= n else None
+                    if child is not None:
+                        following.append(child)
+            if node.prefix:
+                for n in self._prefix_lengths:
+                    child = node.prefix.get(segment[:n]) if len(segment) >= n else None
+                    if child is not None:
+                        following.append(child)
+            for rx, child in node.regex:
+                if rx.match(segment):
+                    following.append(child)
+        return self._closure(following)
+
+    @property
+    def root_states(self) -> tuple[_Node, ...]:
+        return self._root_states
+
+    @staticmethod
+    def accepts(states: tuple[_Node, ...]) -> bool:
+        return any(node.terminal for node in states)
+
+    @staticmethod
+    def accepts_everything_below(states: tuple[_Node, ...]) -> bool:
+        """True if every path under the current directory matches (``dir/**``)."""
+        return any(node.is_star and node.terminal for node in states)
+
+
+class PathFilter:
+    """Decides which repository files are sent to the Auditor.
+
+    Args:
+        include: Glob patterns a file must match.
+        exclude: Glob patterns that reject a file (or a whole directory).
+        max_file_size: Optional size limit in bytes from ``.comply.yml``.
+            Size is not part of :meth:`matches`; callers enforce it so that
+            oversized files can be reported as skipped rather than ignored.
+    """
+
+    def __init__(
+        self,
+        include: list[str] | None = None,
+        exclude: list[str] | None = None,
+        max_file_size: int | None = None,
+    ):
+        self.include = _GlobTrie(include if include is not None else DEFAULT_INCLUDE)
+        self.exclude = _GlobTrie(exclude if exclude is not None else DEFAULT_EXCLUDE)
+        self.max_file_size = max_file_size
+        self._dirs: dict[str, tuple[tuple[_Node, ...], tuple[_Node, ...]]] = {
+            "": (self.include.root_states, self.exclude.root_states)
+        }
+
+    def _dir_states(self, directory: str) -> tuple[tuple[_Node, ...], tuple[_Node, ...]]:
+        states = self._dirs.get(directory)
+        if states is None:
+            parent, _, name = directory.rpartition("/")
+            inc, exc = self._dir_states(parent)
+            states = (self.include.step(inc, name), self.exclude.step(exc, name))
+            self._dirs[directory] = states
+        return states
+
+    def excludes_dir(self, directory: str) -> bool:
+        """Return True if nothing under *directory* can ever match.
+
+        Used to prune directories before their contents are listed.
+        """
+        directory = directory.strip("/")
+        if not directory:
+            return False
+        inc, exc = self._dir_states(directory)
+        return self.exclude.accepts_everything_below(exc) or not inc
+
+    def matches(self, path: str) -> bool:
+        """Return True if the file at *path* should be audited."""
+        directory, _, name = path.rpartition("/")
+        inc, exc = self._dir_states(directory)
+        if self.exclude.accepts_everything_below(exc):
+            return False
+        if not self.include.accepts(self.include.step(inc, name)):
+            return False
+        if self.exclude.accepts(self.exclude.step(exc, name)):
+            return False
+        return True
+
+    @classmethod
+    def from_config(cls, config: dict | None) -> "PathFilter":
+        """Build a filter from a parsed ``.comply.yml`` mapping."""
+        config = config or {}
+        include = config.get("include")
+        exclude = DEFAULT_EXCLUDE + list(config.get("exclude") or [])
+        max_file_size = config.get("max_file_size")
+        return cls(
+            include=list(include) if include else None,
+            exclude=exclude,
+            max_file_size=int(max_file_size) if max_file_size is not None else None,
+        )
+
+
+def parse_config(text: str) -> PathFilter:
+    """Parse ``.comply.yml`` text into a :class:`PathFilter`.
+
+    Invalid configuration is logged and the default filter is returned, so a
+    broken config file never blocks a scan.
+    """
+    try:
+        config = yaml.safe_load(text) or {}
+        if not isinstance(config, dict):
+            raise ValueError("top level must be a mapping")
+        for key in ("include", "exclude"):
+            if config.get(key) is not None and not isinstance(config[key], list):
+                raise ValueError(f"'{key}' must be a list of glob patterns")
+        return PathFilter.from_config(config)
+    except (yaml.YAMLError, ValueError, TypeError) as exc:
+        logger.warning(f"Ignoring invalid {CONFIG_FILENAME}: {exc}")
+        return PathFilter()
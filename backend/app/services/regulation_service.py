@@ -1,9 +1,11 @@
+import hashlib
 import json
 import os
 
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data")
 
 _rules = None
+_ruleset_version = None
 _regulatory_texts = None
 
 
@@ -16,6 +18,18 @@ def get_rules() -> list:
     return _rules
 
 
+def get_ruleset_version() -> str:
+    """Return a short content hash identifying the loaded ruleset.
+
+    Scan results are only reused while this version is unchanged.
+    """
+    global _ruleset_version
+    if _ruleset_version is None:
+        canonical = json.dumps(get_rules(), sort_keys=True, separators=(",", ":"))
+        _ruleset_version = hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+    return _ruleset_version
+
+
 def get_regulatory_texts() -> dict:
     """Load and return all regulatory texts from regulatory_texts.json."""
     global _regulatory_texts
@@ -0,0 +1,91 @@
+"""
+Per-scan snapshots of the repository files that were audited.
+
+A snapshot is the scan's ``scan_files`` manifest (path -> git blob SHA), the
+commit SHA the files were read at (``scans.commit_sha``) and the file
+contents in ``snapshot_blobs``.  Contents are stored once per blob SHA, so
+rescans of a mostly unchanged repository add only the files that changed.
+
+Unlike the LRU ``blob_cache``, snapshot blobs are kept for as long as a scan
+references them: the PR pipeline loads its input from here, so fixes are
+applied to exactly the content the Auditor saw, even if the branch has
+moved since.
+"""
+
+from app.database import get_db
+from app.services.scan_history import record_scan_files
+
+# SQLite caps the number of bound parameters per statement.
+_SQL_BATCH = 500
+
+
+def save_snapshot(
+    scan_id: str, commit_sha: str | None, files: dict[str, str], shas: dict[str, str]
+) -> None:
+    """Persist the files audited by *scan_id*.
+
+    Args:
+        scan_id: The scan the snapshot belongs to.
+        commit_sha: The commit the files were read at.
+        files: A dict mapping file paths to their text content.
+        shas: A dict mapping file paths to git blob SHAs; paths missing from
+            *files* are ignored.
+    """
+    manifest = {path: shas[path] for path in files if path in shas}
+    record_scan_files(scan_id, manifest)
+
+    db = get_db()
+    try:
+        db.executemany(
+            "INSERT OR IGNORE INTO snapshot_blobs (sha, content) VALUES (?, ?)",
+            [(sha, files[path]) for path, sha in manifest.items()],
+        )
+        db.execute("UPDATE scans SET commit_sha = ? WHERE id = ?", (commit_sha, scan_id))
+        db.commit()
+    finally:
+        db.close()
+
+
+def load_snapshot(scan_id: str) -> tuple[str | None, dict[str, str]]:
+    """Return ``(commit_sha, files)`` for *scan_id*.
+
+    *files* maps paths to content and is empty for scans recorded before
+    snapshots existed.
+    """
+    db = get_db()
+    try:
+        scan = db.execute("SELECT commit_sha FROM scans WHERE id = ?", (scan_id,)).fetchone()
+        rows = db.execute(
+            """
+            SELECT f.path, b.content FROM scan_files f
+            JOIN snapshot_blobs b ON b.sha = f.blob_sha
+            WHERE f.scan_id = ?
+            ORDER BY f.path
+            """,
+            (scan_id,),
+        ).fetchall()
+    finally:
+        db.close()
+    return (scan["commit_sha"] if scan else None), {row["path"]: row["content"] for row in rows}
+
+
+def delete_snapshot(db, scan_id: str) -> None:
+    """Delete the manifest of *scan_id* and any blobs no other scan references.
+
+    Runs on the caller's connection so it commits together with the rest of
+    the scan deletion.
+    """
+    shas = [
+        row["blob_sha"]
+        for row in db.execute("SELECT blob_sha FROM scan_files WHERE scan_id = ?", (scan_id,))
+    ]
+    db.execute("DELETE FROM scan_files WHERE scan_id = ?", (scan_id,))
+    for i in range(0, len(shas), _SQL_BATCH):
+        batch = shas[i:i + _SQL_BATCH]
+        db.execute(
+            f"""
+            DELETE FROM snapshot_blobs WHERE sha IN ({','.join('?' * len(batch))})
+              AND NOT EXISTS (SELECT 1 FROM scan_files f WHERE f.blob_sha = snapshot_blobs.sha)
+            """,
+            batch,
+        )
@@ -0,0 +1,140 @@
+"""
+Inventory of the resource types each file defines, used to route files to
+only the rules that can apply to them.
+
+Types come from :mod:`app.services.iac_parser` when a file parses, and from
+a line-based scan otherwise (Helm templates, HCL the parser rejects), so a
+file is never dropped just because it is unusual.  A file whose types match
+no rule's ``resource_checks`` - CI workflows, docker-compose files,
+Dockerfiles - needs no audit at all.  A Terraform file that calls modules
+gets every rule, as the resources its modules create are not visible here.
+"""
+
+import re
+
+from app.services.iac_parser import MODULE, parse_file
+from app.services.regulation_service import get_rules
+
+_TF_RESOURCE_RE = re.compile(r'^\s*resource\s+"([^"]+)"', re.MULTILINE)
+_TF_MODULE_RE = re.compile(r'^\s*module\s+"[^"]+"', re.MULTILINE)
+_YAML_DOC_SPLIT_RE = re.compile(r"^---", re.MULTILINE)
+_API_VERSION_RE = re.compile(r"^apiVersion:\s*[\"']?([^\s\"']+)", re.MULTILINE)
+_KIND_RE = re.compile(r"^kind:\s*[\"']?([^\s\"']+)", re.MULTILINE)
+
+
+def provider_of(resource_type: str) -> str:
+    """Return the provider of a resource type (``aws`` or ``kubernetes``)."""
+    return "kubernetes" if "/" in resource_type else resource_type.split("_", 1)[0]
+
+
+def is_existence_condition(condition: str) -> bool:
+    """Return True for repository-wide ``resource missing ...`` conditions."""
+    return condition.strip().lower().startswith("resource missing")
+
+
+def _group_kind(k8s_type: str) -> tuple[str, str]:
+    parts = k8s_type.split("/")
+    return ("/".join(parts[:-2]) if len(parts) > 2 else "", parts[-1])
+
+
+def type_matches(found: str, wanted: str) -> bool:
+    """Return True if a resource of type *found* is covered by a check on *wanted*.
+
+    Kubernetes types match on API group and kind; versions (v1, v1beta1) vary.
+    """
+    if "/" in found and "/" in wanted:
+        return _group_kind(found) == _group_kind(wanted)
+    return found == wanted
+
+
+def resource_types(path: str, content: str) -> set[str]:
+    """Return the resource types defined in a file (empty if none or unknown format).
+
+    Terraform module calls are reported as the type ``MODULE``.
+    """
+    resources = parse_file(path, content)
+    if resources is not None:
+        return {r.type for r in resources}
+
+    lower = path.lower()
+    if lower.endswith(".tf"):
+        types = set(_TF_RESOURCE_RE.findall(content))
+        if _TF_MODULE_RE.search(content):
+            types.add(MODULE)
+        return types
+    if lower.endswith((".yaml", ".yml")):
+        types = set()
+        for doc in _YAML_DOC_SPLIT_RE.split(content):
+            api_version = _API_VERSION_RE.search(doc)
+            kind = _KIND_RE.search(doc)
+            if api_version and kind:
+                types.add(f"{api_version.group(1)}/{kind.group(1)}")
+        return types
+    return set()
+
+
+def route_files(
+    files: dict[str, str], rules_by_file: dict[str, set[str] | None] | None = None
+) -> tuple[list[tuple[tuple[str, ...], dict[str, str]]], list[str]]:
+    """Group files by the rules that can apply to them.
+
+    A rule applies to a file when one of its ``resource_checks`` targets a
+    resource type the file defines; every rule applies to a file that calls
+    a Terraform module.  Rules whose check is a repository-wide
+    ``resource missing`` condition are routed to the first file (by path)
+    defining any resource of that provider, so they are still evaluated
+    exactly once.
+
+    Args:
+        files: Dict mapping file paths to content.
+        rules_by_file: Optional narrower routing already known for some
+            files (the rule engine's undecided rules); a None value falls
+            back to the index.  When given, ``resource missing`` rules are
+            not re-anchored, as the caller has placed them.
+
+    Returns:
+        ``(groups, skipped)``: groups of ``(rule_ids, {path: content})``
+        sharing the same applicable rules, and the paths no rule applies to.
+    """
+    rules = get_rules()
+    index: dict[str, set[str]] = {}
+    applicable: dict[str, list[str]] = {}
+    for path, content in files.items():
+        if rules_by_file is not None and rules_by_file.get(path) is not None:
+            applicable[path] = list(rules_by_file[path])
+            continue
+        types = index[path] = resource_types(path, content)
+        if MODULE in types:
+            applicable[path] = [rule["rule_id"] for rule in rules]
+            continue
+        applicable[path] = [
+            rule["rule_id"] for rule in rules
+            if any(
+                type_matches(found, check.get("resource_type", ""))
+                for check in rule.get("resource_checks", [])
+                for found in types
+            )
+        ]
+
+    for rule in rules if rules_by_file is None else []:
+        for check in rule.get("resource_checks", []):
+            if not is_existence_condition(check.get("violation_condition", "")):
+                continue
+            provider = check.get("provider", "")
+            anchors = sorted(
+                path for path, types in index.items()
+                if any(provider_of(t) == provider for t in types)
+            )
+            if anchors and rule["rule_id"] not in applicable[anchors[0]]:
+                applicable[anchors[0]].append(rule["rule_id"])
+
+    order = {rule["rule_id"]: i for i, rule in enumerate(rules)}
+    groups: dict[tuple[str, ...], dict[str, str]] = {}
+    skipped = []
+    for path, content in files.items():
+        rule_ids = tuple(sorted(applicable[path], key=order.__getitem__))
+        if not rule_ids:
+            skipped.append(path)
+            continue
+        groups.setdefault(rule_ids, {})[path] = content
+    return list(groups.items()), skipped
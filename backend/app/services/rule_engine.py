@@ -0,0 +1,422 @@
+"""
+Deterministic evaluation of ``rules.json`` resource checks.
+
+Each check names a ``resource_type``, a ``field`` path and a free-text
+``violation_condition`` such as ``"equals false OR field missing"``.  The
+conditions that follow the common grammar (``field missing``, ``empty``,
+``not configured``, ``equals X``, ``contains X``, joined by ``OR``, with
+parenthesised remarks ignored) are compiled into predicates and evaluated
+against resources parsed by :mod:`app.services.iac_parser`; ``resource
+missing`` conditions become repository-wide existence checks.
+
+Anything the engine cannot decide is left to the LLM Auditor at file
+granularity: files it cannot parse, files that call Terraform modules,
+files with a resource covered by a check it cannot compile, and files
+where a checked field depends on a Terraform expression.
+"""
+
+import json
+import logging
+import re
+import time
+import uuid
+from functools import lru_cache
+
+from app.services.iac_parser import MODULE, UNKNOWN, Node, Resource, parse_file
+from app.services.regulation_service import get_rules, get_ruleset_version
+from app.services.resource_index import is_existence_condition, type_matches
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class _Undecidable(Exception):
+    """The value needed to evaluate a check is only known at plan time."""
+
+
+# ── Condition compilation ────────────────────────────────────────────
+
+
+def _literal(text: str):
+    lowered = text.lower()
+    if lowered in ("true", "false"):
+        return lowered == "true"
+    if re.fullmatch(r"-?\d+", text):
+        return int(text)
+    return text
+
+
+def _equals(value, expected) -> bool:
+    if value is UNKNOWN:
+        raise _Undecidable()
+    if isinstance(expected, bool):
+        if isinstance(value, str):
+            return value.strip().lower() == str(expected).lower()
+        return isinstance(value, bool) and value == expected
+    if isinstance(expected, int):
+        if isinstance(value, bool):
+            return False
+        if isinstance(value, str) and re.fullmatch(r"-?\d+", value.strip()):
+            return int(value) == expected
+        return isinstance(value, (int, float)) and value == expected
+    return isinstance(value, str) and value.strip().lower() == expected.lower()
+
+
+def _is_empty(value) -> bool:
+    if value is UNKNOWN:
+        raise _Undecidable()
+    return value is None or value == "" or (isinstance(value, (list, dict)) and not value)
+
+
+def _contains(value, expected) -> bool:
+    if isinstance(value, list):
+        if any(_equals(item, expected) for item in value if item is not UNKNOWN):
+            return True
+        if any(item is UNKNOWN for item in value):
+            raise _Undecidable()
+        return False
+    return _equals(value, expected)
+
+
+def compile_condition(condition: str):
+    """Compile a ``violation_condition`` into ``predicate(value) -> bool``.
+
+    The predicate receives the field value, or ``_MISSING`` when the field is
+    absent, and may raise ``_Undecidable``.
+
+    Returns:
+        The predicate, or None if the condition is outside the supported
+        grammar.
+    """
+    text = re.sub(r"\([^)]*\)", "", condition).strip()
+    tests = []
+    for clause in re.split(r"\s+OR\s+", text):
+        clause = clause.strip()
+        lowered = clause.lower()
+        if lowered == "field missing":
+            tests.append(lambda value: value is _MISSING)
+        elif lowered in ("empty", "not configured"):
+            tests.append(lambda value: value is not _MISSING and _is_empty(value))
+        elif lowered.startswith("equals "):
+            expected = _literal(clause[len("equals "):].strip())
+            tests.append(lambda value, expected=expected: value is not _MISSING and _equals(value, expected))
+        elif lowered.startswith("contains "):
+            expected = _literal(clause[len("contains "):].strip())
+            tests.append(lambda value, expected=expected: value is not _MISSING and _contains(value, expected))
+        else:
+            return None
+
+    def predicate(value) -> bool:
+        return any(test(value) for test in tests)
+
+    return predicate
+
+
+class _Check:
+    __slots__ = ("rule", "provider", "resource_type", "field", "path", "predicate", "existence")
+
+    def __init__(self, rule: dict, check: dict):
+        self.rule = rule
+        self.provider = check.get("provider", "")
+        self.resource_type = check.get("resource_type", "")
+        self.field = check.get("field", "")
+        self.path = [
+            (part[:-3], True) if part.endswith("[*]") else (part, False)
+            for part in self.field.split(".")
+        ]
+        condition = check.get("violation_condition", "")
+        self.existence = is_existence_condition(condition)
+        self.predicate = None if self.existence else compile_condition(condition)
+
+    def applies_to(self, resource: Resource) -> bool:
+        return resource.provider == self.provider and type_matches(resource.type, self.resource_type)
+
+
+@lru_cache(maxsize=4)
+def _compiled_checks(ruleset_version: str) -> tuple[_Check, ...]:
+    checks = tuple(
+        _Check(rule, check) for rule in get_rules() for check in rule.get("resource_checks", [])
+    )
+    unsupported = [f"{c.rule['rule_id']}:{c.field}" for c in checks if not c.existence and c.predicate is None]
+    if unsupported:
+        logger.info(f"Rule engine leaves {len(unsupported)} checks to the Auditor: {', '.join(unsupported)}")
+    return checks
+
+
+# ── Evaluation ───────────────────────────────────────────────────────
+
+
+def _resolve(value, path: list[tuple[str, bool]], line: int) -> list[tuple[object, int]]:
+    """Return ``(value, line)`` for every location *path* addresses under *value*.
+
+    Lists of blocks/objects are expanded, so ``ingress.cidr_blocks`` checks
+    every ``ingress`` block.  A missing segment yields ``_MISSING`` at the
+    line of the deepest mapping found.
+    """
+    if value is UNKNOWN:
+        raise _Undecidable()
+    if not path:
+        return [(value, line)]
+    if isinstance(value, list):
+        results = []
+        for item in value:
+            results.extend(_resolve(item, path, item.line if isinstance(item, Node) else line))
+        return results
+    if not isinstance(value, Node):
+        return [(_MISSING, line)]
+
+    (key, expand), rest = path[0], path[1:]
+    if key not in value:
+        return [(_MISSING, value.line)]
+    child = value[key]
+    child_line = value.field_lines.get(key, value.line)
+    if expand and child is not UNKNOWN:
+        items = child if isinstance(child, list) else [child]
+        results = []
+        for item in items:
+            results.extend(_resolve(item, rest, item.line if isinstance(item, Node) else child_line))
+        return results
+    return _resolve(child, rest, child_line)
+
+
+def _format_value(value) -> str:
+    if value is _MISSING:
+        return "missing"
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, (list, dict)) or value == "" or value is None:
+        return json.dumps(value, default=str)
+    return str(value)
+
+
+def _violation(check: _Check, file: str, line: int | None, resource: str, value) -> dict:
+    current = _format_value(value)
+    detail = f"{check.field} is missing" if value is _MISSING else f"{check.field} is {current}"
+    return {
+        "violation_id": f"V-{uuid.uuid4().hex[:8]}",
+        "rule_id": check.rule["rule_id"],
+        "severity": check.rule.get("severity", "medium"),
+        "file": file,
+        "line": line,
+        "resource": resource,
+        "field": check.field,
+        "current_value": current,
+        "description": f"{detail} on {resource} ({check.rule.get('title', check.rule['rule_id'])})",
+        "regulation_ref": check.rule.get("regulation_ref", ""),
+    }
+
+
+class EngineResult:
+    """Outcome of :func:`evaluate`.
+
+    Attributes:
+        violations: Violations the engine decided, auditor-style dicts.
+        undecided_files: Paths that still need the LLM Auditor, each mapped
+            to the rule IDs left undecided in it, or to None when the file
+            could not be parsed and every applicable rule needs the model.
+        resources: Number of resources parsed.
+        elapsed: Evaluation time in seconds.
+    """
+
+    __slots__ = ("violations", "undecided_files", "resources", "elapsed")
+
+    def __init__(self):
+        self.violations: list[dict] = []
+        self.undecided_files: dict[str, set[str] | None] = {}
+        self.resources = 0
+        self.elapsed = 0.0
+
+    def leave(self, path: str, rule_id: str | None = None) -> None:
+        """Mark *rule_id* (or, with None, every rule) undecided for *path*."""
+        if rule_id is None:
+            self.undecided_files[path] = None
+        elif path not in self.undecided_files:
+            self.undecided_files[path] = {rule_id}
+        elif self.undecided_files[path] is not None:
+            self.undecided_files[path].add(rule_id)
+
+
+def evaluate(files: dict[str, str], inventory: dict[str, str] | None = None) -> EngineResult:
+    """Run every compilable resource check against *files*.
+
+    Args:
+        files: Dict mapping file paths to content to audit.
+        inventory: Every infrastructure file in the repository (including
+            *files*), used for checks that span files: ``resource missing``
+            conditions, and Terraform's split resources (e.g. an
+            ``aws_s3_bucket_server_side_encryption_configuration`` that
+            configures a bucket's missing ``server_side_encryption_configuration``).
+            None when the full repository is not known, as in diff scans;
+            such checks are then left to the Auditor.
+
+    Returns:
+        An EngineResult.  With an inventory, ``resource missing``
+        violations and undecided files may name a file of the inventory
+        that is not in *files*.
+    """
+    started = time.perf_counter()
+    checks = _compiled_checks(get_ruleset_version())
+    result = EngineResult()
+
+    parsed: dict[str, list[Resource] | None] = {path: parse_file(path, content) for path, content in files.items()}
+    if inventory is not None:
+        known = dict(parsed)
+        for path, content in inventory.items():
+            if path not in known:
+                known[path] = parse_file(path, content)
+        inventory_types = {r.type for resources in known.values() if resources for r in resources}
+    else:
+        known = parsed
+        inventory_types = set()
+
+    for path, resources in parsed.items():
+        if resources is None:
+            result.leave(path)
+            continue
+        result.resources += len(resources)
+        if any(r.type == MODULE for r in resources):
+            # Module arguments configure resources the engine cannot see
+            result.leave(path)
+        for resource in resources:
+            for check in checks:
+                if check.existence or not check.applies_to(resource):
+                    continue
+                if check.predicate is None:
+                    result.leave(path, check.rule["rule_id"])
+                    continue
+                try:
+                    for value, line in _resolve(resource.body, check.path, resource.line):
+                        if not check.predicate(value):
+                            continue
+                        if value is _MISSING and not _missing_is_decidable(check, inventory, inventory_types):
+                            raise _Undecidable()
+                        result.violations.append(_violation(check, path, line, resource.address, value))
+                except _Undecidable:
+                    result.leave(path, check.rule["rule_id"])
+
+    _evaluate_existence_checks(checks, parsed, known if inventory is not None else None, result)
+
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def is_existence_violation(violation: dict) -> bool:
+    """Return True if *violation* reports a ``resource missing`` check.
+
+    Such violations are decided against the whole repository on every full
+    scan, so they are never carried forward from an earlier scan.
+    """
+    for check in _compiled_checks(get_ruleset_version()):
+        if check.existence and check.rule["rule_id"] == violation.get("rule_id") and (
+            violation.get("resource") == check.resource_type or violation.get("field") == check.field
+        ):
+            return True
+    return False
+
+
+def inventory_dependent_files(
+    files: list[str], previous_inventory: dict[str, str], inventory: dict[str, str]
+) -> set[str]:
+    """Return the *files* whose missing-field results may differ between two
+    versions of the repository even though the files themselves did not.
+
+    A missing Terraform field is only decided when no split-out
+    ``<resource_type>_<field>`` resource and no module call exists anywhere
+    in the repository (see :func:`_missing_is_decidable`).  When one of
+    those appears or disappears between *previous_inventory* and
+    *inventory*, earlier results for files with a resource the affected
+    checks apply to are stale, so such files must be audited again rather
+    than carried forward.
+
+    Args:
+        files: Paths, present in *inventory*, to consider.
+        previous_inventory: Every infrastructure file at the previous scan.
+        inventory: Every infrastructure file now.
+    """
+    parsed = {path: parse_file(path, content) for path, content in inventory.items()}
+    types = {r.type for resources in parsed.values() if resources for r in resources}
+    previous_types: set[str] = set()
+    for path, content in previous_inventory.items():
+        # Files unchanged since then are not parsed twice
+        resources = parsed[path] if inventory.get(path) == content else parse_file(path, content)
+        previous_types.update(r.type for r in resources or [])
+
+    modules_changed = (MODULE in previous_types) != (MODULE in types)
+    checks = []
+    for check in _compiled_checks(get_ruleset_version()):
+        if check.predicate is None or check.provider == "kubernetes":
+            continue
+        split_type = f"{check.resource_type}_{check.path[0][0]}"
+        if modules_changed or (split_type in previous_types) != (split_type in types):
+            checks.append(check)
+    if not checks:
+        return set()
+    return {
+        path for path in files
+        if parsed.get(path) and any(check.applies_to(r) for r in parsed[path] for check in checks)
+    }
+
+
+def _missing_is_decidable(check: _Check, inventory: dict[str, str] | None, inventory_types: set[str]) -> bool:
+    """A missing Terraform field may be configured by a split-out resource
+    named ``<resource_type>_<field>``; only the full inventory, with no
+    module calls that could create one, can rule that out."""
+    if check.provider == "kubernetes":
+        return True
+    split_type = f"{check.resource_type}_{check.path[0][0]}"
+    if inventory is None or MODULE in inventory_types:
+        return False
+    return split_type not in inventory_types
+
+
+def _evaluate_existence_checks(
+    checks: tuple[_Check, ...],
+    parsed: dict[str, list[Resource] | None],
+    known: dict[str, list[Resource] | None] | None,
+    result: EngineResult,
+) -> None:
+    """Check ``resource missing`` conditions across the repository.
+
+    A violation is anchored to the first file (by path) that defines a
+    resource of the check's provider.  With the full inventory the check is
+    decided on every scan, even when the anchor file is unchanged, so
+    callers must not carry such violations forward from earlier scans (see
+    :func:`is_existence_violation`).  When one of the inventory's files of
+    the check's format could not be parsed, or a Terraform module call
+    could create the resource, the anchor file is left to the Auditor.
+
+    Without the full inventory (diff scans) the check cannot be decided; the
+    anchor among *parsed* is left to the Auditor.
+    """
+    for check in checks:
+        if not check.existence:
+            continue
+        scope = known if known is not None else parsed
+        provider_files = sorted(
+            path for path, resources in scope.items()
+            if resources and any(r.provider == check.provider for r in resources)
+        )
+        if not provider_files:
+            continue
+        anchor = provider_files[0]
+        extensions = (".yaml", ".yml") if check.provider == "kubernetes" else (".tf",)
+        if known is None or any(
+            (resources is None and path.lower().endswith(extensions))
+            or (check.provider != "kubernetes" and resources and any(r.type == MODULE for r in resources))
+            for path, resources in known.items()
+        ):
+            result.leave(anchor, check.rule["rule_id"])
+            continue
+        exists = any(
+            r.type == check.resource_type
+            for resources in known.values() if resources
+            for r in resources
+        )
+        if not exists:
+            violation = _violation(check, anchor, None, check.resource_type, _MISSING)
+            violation["description"] = (
+                f"No {check.resource_type} resource is defined in the repository "
+                f"({check.rule.get('title', check.rule['rule_id'])})"
+            )
+            result.violations.append(violation)
@@ -0,0 +1,284 @@
+"""
+Per-scan file manifests used to make repeat scans incremental.
+
+Every scan records the git blob SHA of each infrastructure file it audited
+(``scan_files`` table).  A later scan of the same repository diffs its own
+manifest against the most recent completed scan: only added or modified
+files go back through the Auditor, findings for unchanged files are copied
+forward, and findings for deleted files are simply not carried over.
+Results are only reused across scans run with the same ruleset version.
+
+When the branch head has not moved at all, :func:`find_scan_at_commit`
+finds the earlier scan and :func:`clone_scan_results` copies it wholesale,
+so no files are fetched and no model calls are made.
+
+Files left out of a scan (binary, oversized or unreadable) are recorded in
+``scan_skipped_files`` so the scan result can report them.  So are files
+whose Auditor batch failed (reason ``audit_failed``): they stay in the
+manifest, which backs the scan's snapshot, but a later scan re-audits them
+instead of carrying forward their (missing) findings, and a scan with such
+files is never reused wholesale.
+"""
+
+import uuid
+from collections.abc import Callable
+
+from app.database import get_db
+
+# scan_skipped_files reason for a file that was fetched but not audited
+AUDIT_FAILED = "audit_failed"
+
+
+def record_scan_files(scan_id: str, file_shas: dict[str, str]) -> None:
+    """Store the path -> blob SHA manifest for *scan_id*."""
+    db = get_db()
+    try:
+        db.execute("DELETE FROM scan_files WHERE scan_id = ?", (scan_id,))
+        db.executemany(
+            "INSERT INTO scan_files (scan_id, path, blob_sha) VALUES (?, ?, ?)",
+            [(scan_id, path, sha) for path, sha in file_shas.items()],
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def get_scan_files(scan_id: str) -> dict[str, str]:
+    """Return the path -> blob SHA manifest recorded for *scan_id*."""
+    db = get_db()
+    try:
+        rows = db.execute(
+            "SELECT path, blob_sha FROM scan_files WHERE scan_id = ?", (scan_id,)
+        ).fetchall()
+    finally:
+        db.close()
+    return {row["path"]: row["blob_sha"] for row in rows}
+
+
+def record_skipped_files(scan_id: str, skipped: list[dict]) -> None:
+    """Store the files *scan_id* left out, as reported by the fetch layer."""
+    db = get_db()
+    try:
+        db.execute("DELETE FROM scan_skipped_files WHERE scan_id = ?", (scan_id,))
+        db.executemany(
+            "INSERT OR REPLACE INTO scan_skipped_files (scan_id, path, reason, size) VALUES (?, ?, ?, ?)",
+            [(scan_id, f["path"], f["reason"], f.get("size")) for f in skipped],
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def record_unaudited_files(scan_id: str, paths: list[str]) -> None:
+    """Record files of *scan_id* whose audit failed, alongside any skipped files."""
+    db = get_db()
+    try:
+        db.executemany(
+            "INSERT OR REPLACE INTO scan_skipped_files (scan_id, path, reason, size) VALUES (?, ?, ?, NULL)",
+            [(scan_id, path, AUDIT_FAILED) for path in paths],
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def get_audited_files(scan_id: str) -> dict[str, str]:
+    """Return the manifest of *scan_id* without the files whose audit failed,
+    for use as an incremental baseline."""
+    files = get_scan_files(scan_id)
+    db = get_db()
+    try:
+        rows = db.execute(
+            "SELECT path FROM scan_skipped_files WHERE scan_id = ? AND reason = ?", (scan_id, AUDIT_FAILED)
+        ).fetchall()
+    finally:
+        db.close()
+    for row in rows:
+        files.pop(row["path"], None)
+    return files
+
+
+def get_skipped_files(scan_id: str) -> list[dict]:
+    """Return the files *scan_id* left out, ordered by path."""
+    db = get_db()
+    try:
+        rows = db.execute(
+            "SELECT path, reason, size FROM scan_skipped_files WHERE scan_id = ? ORDER BY path",
+            (scan_id,),
+        ).fetchall()
+    finally:
+        db.close()
+    return [dict(row) for row in rows]
+
+
+def get_previous_scan_id(
+    user_id: str, repo_owner: str, repo_name: str, exclude_scan_id: str, ruleset_version: str
+) -> str | None:
+    """Return the latest completed full scan of the same repo that has a manifest.
+
+    Diff scans record a manifest for their snapshot, but only cover the
+    changed files, so they never serve as an incremental baseline.
+    """
+    db = get_db()
+    try:
+        row = db.execute(
+            """
+            SELECT s.id FROM scans s
+            WHERE s.user_id = ? AND s.repo_owner = ? AND s.repo_name = ?
+              AND s.status = 'completed' AND s.id != ? AND s.head_ref IS NULL
+              AND s.ruleset_version = ?
+              AND EXISTS (SELECT 1 FROM scan_files f WHERE f.scan_id = s.id)
+            ORDER BY s.created_at DESC
+            LIMIT 1
+            """,
+            (user_id, repo_owner, repo_name, exclude_scan_id, ruleset_version),
+        ).fetchone()
+    finally:
+        db.close()
+    return row["id"] if row else None
+
+
+def find_scan_at_commit(
+    user_id: str,
+    repo_owner: str,
+    repo_name: str,
+    commit_sha: str,
+    ruleset_version: str,
+    exclude_scan_id: str,
+) -> str | None:
+    """Return the latest completed full scan of the same repo at *commit_sha*
+    that ran with *ruleset_version* and audited every file, or None."""
+    db = get_db()
+    try:
+        row = db.execute(
+            """
+            SELECT id FROM scans
+            WHERE user_id = ? AND repo_owner = ? AND repo_name = ?
+              AND status = 'completed' AND id != ? AND head_ref IS NULL
+              AND commit_sha = ? AND ruleset_version = ?
+              AND NOT EXISTS (
+                  SELECT 1 FROM scan_skipped_files k WHERE k.scan_id = scans.id AND k.reason = ?
+              )
+            ORDER BY created_at DESC
+            LIMIT 1
+            """,
+            (user_id, repo_owner, repo_name, exclude_scan_id, commit_sha, ruleset_version, AUDIT_FAILED),
+        ).fetchone()
+    finally:
+        db.close()
+    return row["id"] if row else None
+
+
+def clone_scan_results(source_scan_id: str, scan_id: str) -> list[dict]:
+    """Copy a completed scan's results into *scan_id*.
+
+    The manifest (and therefore the snapshot, whose blobs are shared by
+    SHA), the skipped-file report, the violations and their plans are all
+    copied, so the new scan is self-contained.
+
+    Returns:
+        The copied violations, as returned by :func:`carry_forward_findings`.
+    """
+    record_scan_files(scan_id, get_scan_files(source_scan_id))
+    db = get_db()
+    try:
+        db.execute(
+            "UPDATE scans SET commit_sha = (SELECT commit_sha FROM scans WHERE id = ?) WHERE id = ?",
+            (source_scan_id, scan_id),
+        )
+        db.execute(
+            "INSERT INTO scan_skipped_files (scan_id, path, reason, size) SELECT ?, path, reason, size FROM scan_skipped_files WHERE scan_id = ?",
+            (scan_id, source_scan_id),
+        )
+        files = [
+            row["file"]
+            for row in db.execute(
+                "SELECT DISTINCT file FROM violations WHERE scan_id = ?", (source_scan_id,)
+            ).fetchall()
+        ]
+        db.commit()
+    finally:
+        db.close()
+    return carry_forward_findings(source_scan_id, scan_id, files)
+
+
+def diff_scan_files(
+    previous: dict[str, str], current: dict[str, str]
+) -> tuple[list[str], list[str], list[str]]:
+    """Compare two manifests.
+
+    Returns:
+        A tuple of (changed, unchanged, deleted) path lists, where *changed*
+        covers both added and modified files.
+    """
+    changed = [p for p, sha in current.items() if previous.get(p) != sha]
+    unchanged = [p for p, sha in current.items() if previous.get(p) == sha]
+    deleted = [p for p in previous if p not in current]
+    return changed, unchanged, deleted
+
+
+def carry_forward_findings(
+    previous_scan_id: str,
+    scan_id: str,
+    files: list[str],
+    exclude: Callable[[dict], bool] | None = None,
+) -> list[dict]:
+    """Copy violations and remediation plans for *files* into a new scan.
+
+    Copied plans start unapproved, as approval is a per-scan decision.
+    Violations for which *exclude* returns True are not copied.
+
+    Returns:
+        The copied violations as auditor-style dicts, each with
+        ``violation_id`` and ``db_id`` set to the new database ID.
+    """
+    if not files:
+        return []
+
+    wanted = set(files)
+    db = get_db()
+    try:
+        rows = [
+            dict(row)
+            for row in db.execute(
+                "SELECT * FROM violations WHERE scan_id = ?", (previous_scan_id,)
+            ).fetchall()
+            if row["file"] in wanted and not (exclude and exclude(dict(row)))
+        ]
+        plans = {
+            row["violation_id"]: dict(row)
+            for row in db.execute(
+                "SELECT * FROM remediation_plans WHERE scan_id = ?", (previous_scan_id,)
+            ).fetchall()
+        }
+
+        carried = []
+        for v in rows:
+            vid = str(uuid.uuid4())
+            db.execute(
+                "INSERT INTO violations (id, scan_id, rule_id, severity, file, line, resource, field, current_value, description, regulation_ref) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (vid, scan_id, v["rule_id"], v["severity"], v["file"], v["line"], v["resource"], v["field"], v["current_value"], v["description"], v["regulation_ref"]),
+            )
+            p = plans.get(v["id"])
+            if p:
+                db.execute(
+                    "INSERT INTO remediation_plans (id, scan_id, violation_id, explanation, regulation_citation, what_needs_to_change, sample_fix, estimated_effort, priority, file, approved) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (str(uuid.uuid4()), scan_id, vid, p["explanation"], p["regulation_citation"], p["what_needs_to_change"], p["sample_fix"], p["estimated_effort"], p["priority"], p["file"], 0),
+                )
+            carried.append({
+                "violation_id": vid,
+                "db_id": vid,
+                "rule_id": v["rule_id"],
+                "severity": v["severity"],
+                "file": v["file"],
+                "line": v["line"],
+                "resource": v["resource"],
+                "field": v["field"],
+                "current_value": v["current_value"],
+                "description": v["description"],
+                "regulation_ref": v["regulation_ref"],
+            })
+        db.commit()
+    finally:
+        db.close()
+    return carried
@@ -0,0 +1,130 @@
+"""
+Debounced, deduplicated background job queue with a bounded worker pool.
+
+Jobs are keyed; submitting a key that is already waiting replaces its
+payload and pushes its start time back by the debounce window, so a burst
+of pushes to one repository becomes a single job for the latest head.  A
+job never waits longer than the max delay after its first submission, and
+two jobs with the same key never run at once: a key submitted while it is
+running is queued again and starts once the running job finishes.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending:
+    __slots__ = ("payload", "due_at", "deadline")
+
+    def __init__(self, payload, due_at: float, deadline: float):
+        self.payload = payload
+        self.due_at = due_at
+        self.deadline = deadline
+
+
+class DebouncedQueue:
+    """Run ``handler(key, payload)`` for the latest payload of each key.
+
+    Args:
+        handler: Called on a worker thread; exceptions are logged.
+        debounce: Seconds a key must stay quiet before its job starts.
+        max_delay: Upper bound in seconds between a key's first submission
+            and the start of its job, however often it is resubmitted.
+        workers: Maximum number of jobs running at once.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Hashable, object], None],
+        debounce: float,
+        max_delay: float,
+        workers: int,
+    ):
+        self._handler = handler
+        self._debounce = debounce
+        self._max_delay = max(max_delay, debounce)
+        self._workers = max(1, workers)
+        self._cond = threading.Condition()
+        self._pending: dict[Hashable, _Pending] = {}
+        self._running: set[Hashable] = set()
+        self._pool: ThreadPoolExecutor | None = None
+        self._dispatcher: threading.Thread | None = None
+        self._stopped = False
+
+    def submit(self, key: Hashable, payload=None) -> None:
+        """Schedule a job for *key*, coalescing with any job already waiting."""
+        now = time.monotonic()
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Queue is shut down")
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = _Pending(payload, now + self._debounce, now + self._max_delay)
+            else:
+                pending.payload = payload
+                pending.due_at = min(now + self._debounce, pending.deadline)
+            self._ensure_started()
+            self._cond.notify()
+
+    def pending(self) -> int:
+        """Return the number of jobs waiting to start."""
+        with self._cond:
+            return len(self._pending)
+
+    def running(self) -> int:
+        """Return the number of jobs currently running."""
+        with self._cond:
+            return len(self._running)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Drop waiting jobs and stop; running jobs finish if *wait*."""
+        with self._cond:
+            self._stopped = True
+            self._pending.clear()
+            self._cond.notify()
+            pool = self._pool
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+    def _ensure_started(self) -> None:
+        if self._dispatcher is None:
+            self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="scan-worker")
+            self._dispatcher = threading.Thread(target=self._dispatch, name="scan-queue", daemon=True)
+            self._dispatcher.start()
+
+    def _dispatch(self) -> None:
+        with self._cond:
+            while not self._stopped:
+                now = time.monotonic()
+                ready = [
+                    key for key, job in self._pending.items()
+                    if job.due_at <= now and key not in self._running
+                ]
+                # Never hand the pool more jobs than it has idle workers
+                for key in ready[: self._workers - len(self._running)]:
+                    job = self._pending.pop(key)
+                    self._running.add(key)
+                    self._pool.submit(self._run, key, job.payload)
+
+                waiting = [
+                    job.due_at for key, job in self._pending.items() if key not in self._running
+                ]
+                if waiting and len(self._running) < self._workers:
+                    self._cond.wait(timeout=max(0.0, min(waiting) - now))
+                else:
+                    self._cond.wait()
+
+    def _run(self, key: Hashable, payload) -> None:
+        try:
+            self._handler(key, payload)
+        except Exception:
+            logger.exception(f"Background job {key!r} failed")
+        finally:
+            with self._cond:
+                self._running.discard(key)
+                self._cond.notify()
@@ -0,0 +1,409 @@
+"""
+The scan pipeline, independent of how it is triggered.
+
+:func:`run_scan` fetches the repository, runs the Auditor and Strategist and
+persists the results, yielding the same ``{"event": ..., "data": ...}``
+dicts the agents stream.  It is an async generator so one worker can hold
+many concurrent scan streams: model calls are awaited and blocking GitHub
+and snapshot work runs on the default thread pool.  The SSE endpoint
+forwards the events to the browser; background scans (push webhooks, bulk
+scans) drain them with :func:`drain_scan`.
+"""
+
+import asyncio
+import logging
+import threading
+import uuid
+from datetime import datetime
+
+from app.agents.auditor import run_auditor_streaming
+from app.agents.strategist import run_strategist_streaming
+from app.core.config import settings
+from app.database import get_db
+from app.services.github_service import get_repo_diff_files, get_repo_infra_files, resolve_commit_sha
+from app.services.regulation_service import get_ruleset_version
+from app.services.repo_snapshot import load_snapshot, save_snapshot
+from app.services.rule_engine import evaluate, inventory_dependent_files, is_existence_violation
+from app.services.scan_history import (
+    carry_forward_findings,
+    clone_scan_results,
+    diff_scan_files,
+    find_scan_at_commit,
+    get_audited_files,
+    get_previous_scan_id,
+    record_skipped_files,
+    record_unaudited_files,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _event(event: str, data: dict) -> dict:
+    return {"event": event, "data": data}
+
+
+def create_scan(
+    user_id: str,
+    repo_owner: str,
+    repo_name: str,
+    base_ref: str | None = None,
+    head_ref: str | None = None,
+    bulk_scan_id: str | None = None,
+) -> str:
+    """Insert a pending scan record and return its ID."""
+    scan_id = str(uuid.uuid4())
+    now = datetime.utcnow().isoformat()
+    db = get_db()
+    try:
+        db.execute(
+            "INSERT INTO scans (id, user_id, repo_url, repo_owner, repo_name, status, created_at, updated_at, base_ref, head_ref, bulk_scan_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (scan_id, user_id, f"{repo_owner}/{repo_name}", repo_owner, repo_name, "pending", now, now, base_ref, head_ref, bulk_scan_id),
+        )
+        db.commit()
+    finally:
+        db.close()
+    return scan_id
+
+
+def _set_status(scan_id: str, status: str, ruleset_version: str | None = None) -> None:
+    db = get_db()
+    try:
+        if ruleset_version is None:
+            db.execute(
+                "UPDATE scans SET status = ?, updated_at = ? WHERE id = ?",
+                (status, datetime.utcnow().isoformat(), scan_id),
+            )
+        else:
+            db.execute(
+                "UPDATE scans SET status = ?, ruleset_version = ?, updated_at = ? WHERE id = ?",
+                (status, ruleset_version, datetime.utcnow().isoformat(), scan_id),
+            )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _log_reasoning(scan_id: str, agent: str, action: str, output: str, full_text: str | None) -> None:
+    db = get_db()
+    try:
+        db.execute(
+            "INSERT INTO reasoning_log (id, scan_id, agent, action, output, full_text, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (str(uuid.uuid4()), scan_id, agent, action, output, full_text, datetime.utcnow().isoformat()),
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _save_violations(scan_id: str, violations: list[dict]) -> None:
+    """Insert *violations* with unique IDs, setting each one's ``db_id``."""
+    db = get_db()
+    try:
+        for v in violations:
+            vid = str(uuid.uuid4())
+            v["db_id"] = vid  # Track the DB ID for plan linking
+            db.execute(
+                "INSERT INTO violations (id, scan_id, rule_id, severity, file, line, resource, field, current_value, description, regulation_ref) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (vid, scan_id, v.get("rule_id", ""), v.get("severity", "medium"), v.get("file", ""), v.get("line"), v.get("resource"), v.get("field"), v.get("current_value"), v.get("description", ""), v.get("regulation_ref", "")),
+            )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _save_plans(scan_id: str, plans: list[dict], violations: list[dict], full_text: str | None) -> None:
+    """Insert the Strategist's *plans*, linked to the DB IDs of *violations*."""
+    vid_map = {v.get("violation_id", ""): v.get("db_id", "") for v in violations}
+    db = get_db()
+    try:
+        for p in plans:
+            pid = str(uuid.uuid4())
+            db_vid = vid_map.get(p.get("violation_id", ""), p.get("violation_id", ""))
+            db.execute(
+                "INSERT INTO remediation_plans (id, scan_id, violation_id, explanation, regulation_citation, what_needs_to_change, sample_fix, estimated_effort, priority, file, approved) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (pid, scan_id, db_vid, p.get("explanation", ""), p.get("regulation_citation", ""), p.get("what_needs_to_change", ""), p.get("sample_fix"), p.get("estimated_effort"), p.get("priority", "P2"), p.get("file", ""), 0),
+            )
+        db.execute(
+            "INSERT INTO reasoning_log (id, scan_id, agent, action, output, full_text, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (str(uuid.uuid4()), scan_id, "Strategist", "plan", f"{len(plans)} remediation plans produced", full_text, datetime.utcnow().isoformat()),
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+async def run_scan(scan, access_token: str):
+    """
+    Async generator that runs the scan pipeline for *scan* and yields event dicts.
+
+    Args:
+        scan: The ``scans`` row (or an equivalent mapping) to run.
+        access_token: The scan owner's GitHub OAuth access token.
+
+    Yields:
+        Dicts with keys "event" and "data". Failures are reported as a
+        ``scan_error`` event and mark the scan as failed.
+    """
+    scan_id = scan["id"]
+    user_id = scan["user_id"]
+    repo_owner = scan["repo_owner"]
+    repo_name = scan["repo_name"]
+    base_ref = scan["base_ref"]
+    head_ref = scan["head_ref"]
+
+    reasoning_traces: dict[str, list[str]] = {}
+
+    try:
+        # Update status to scanning
+        ruleset_version = get_ruleset_version()
+        await asyncio.to_thread(_set_status, scan_id, "scanning", ruleset_version)
+
+        # Short-circuit: if the branch head and ruleset match an earlier scan,
+        # reuse its results without fetching files or calling the model
+        if not head_ref:
+            commit_sha = await asyncio.to_thread(resolve_commit_sha, access_token, repo_owner, repo_name)
+            source_scan_id = await asyncio.to_thread(
+                find_scan_at_commit, user_id, repo_owner, repo_name, commit_sha, ruleset_version, scan_id
+            )
+            if source_scan_id:
+                yield _event("agent_start", {"agent": "Auditor", "message": "Checking for repository changes..."})
+                carried = await asyncio.to_thread(clone_scan_results, source_scan_id, scan_id)
+                msg = f"No changes since scan {source_scan_id} at commit {commit_sha[:7]}; reusing its {len(carried)} violations\n"
+                yield _event("reasoning_chunk", {"agent": "Auditor", "chunk": msg})
+                for v in carried:
+                    yield _event("violation_found", {"agent": "Auditor", "violation": v})
+                yield _event("agent_complete", {"agent": "Auditor", "summary": f"Repository unchanged; {len(carried)} violations reused", "violations": []})
+
+                await asyncio.to_thread(
+                    _log_reasoning, scan_id, "Auditor", "scan", f"{len(carried)} violations reused from scan {source_scan_id}", msg
+                )
+                await asyncio.to_thread(_set_status, scan_id, "completed")
+                yield _event("scan_complete", {"scan_id": scan_id, "status": "completed"})
+                return
+
+        # Fetch infra files
+        yield _event("agent_start", {"agent": "Auditor", "message": "Fetching repository files..."})
+        reasoning_traces.setdefault("Auditor", []).append("Fetching repository files...\n")
+        context_files: dict[str, str] = {}
+        skipped: list[dict] = []
+        file_shas: dict[str, str] = {}
+        if head_ref:
+            # Diff scan: only files touched between the refs, plus neighbours as context.
+            # The snapshot is never used as an incremental baseline (see get_previous_scan_id).
+            commit_sha = await asyncio.to_thread(resolve_commit_sha, access_token, repo_owner, repo_name, head_ref)
+            repo_files, context_files = await asyncio.to_thread(
+                get_repo_diff_files, access_token, repo_owner, repo_name, base_ref, commit_sha, skipped=skipped, shas=file_shas
+            )
+            await asyncio.to_thread(save_snapshot, scan_id, commit_sha, {**context_files, **repo_files}, file_shas)
+            msg = f"Diff scan {base_ref}...{head_ref}: {len(repo_files)} changed files, {len(context_files)} context files\n"
+            yield _event("reasoning_chunk", {"agent": "Auditor", "chunk": msg})
+            reasoning_traces.setdefault("Auditor", []).append(msg)
+        else:
+            # The scan is pinned to the head resolved above, so the PR pipeline
+            # later fixes exactly the content that was audited
+            repo_files = await asyncio.to_thread(
+                get_repo_infra_files, access_token, repo_owner, repo_name, shas=file_shas, skipped=skipped, ref=commit_sha
+            )
+            await asyncio.to_thread(save_snapshot, scan_id, commit_sha, repo_files, file_shas)
+
+        if skipped:
+            await asyncio.to_thread(record_skipped_files, scan_id, skipped)
+            reasons: dict[str, int] = {}
+            for f in skipped:
+                reasons[f["reason"]] = reasons.get(f["reason"], 0) + 1
+            msg = (
+                f"Skipped {len(skipped)} files ("
+                + ", ".join(f"{n} {reason.replace('_', ' ')}" for reason, n in sorted(reasons.items()))
+                + ")\n"
+            )
+            yield _event("reasoning_chunk", {"agent": "Auditor", "chunk": msg})
+            reasoning_traces.setdefault("Auditor", []).append(msg)
+
+        if not repo_files:
+            yield _event("agent_complete", {"agent": "Auditor", "summary": "No infrastructure files found"})
+            yield _event("scan_complete", {"scan_id": scan_id, "status": "completed"})
+            await asyncio.to_thread(_set_status, scan_id, "completed")
+            return
+
+        # Incremental rescan: only audit files whose blob SHA changed since the
+        # last completed scan, and carry forward findings for the rest
+        audit_files = repo_files
+        carried = []
+        previous_scan_id = None
+        if not head_ref:
+            previous_scan_id = await asyncio.to_thread(
+                get_previous_scan_id, user_id, repo_owner, repo_name, scan_id, ruleset_version
+            )
+        if previous_scan_id:
+            # Files the previous scan failed to audit count as changed
+            audited = await asyncio.to_thread(get_audited_files, previous_scan_id)
+            changed, unchanged, deleted = diff_scan_files(audited, file_shas)
+            if settings.RULE_ENGINE_ENABLED and unchanged:
+                # So do unchanged files whose missing-field results depend on
+                # split-out resources or module calls that changed elsewhere
+                _, previous_files = await asyncio.to_thread(load_snapshot, previous_scan_id)
+                stale = await asyncio.to_thread(inventory_dependent_files, unchanged, previous_files, repo_files)
+                changed += [path for path in unchanged if path in stale]
+                unchanged = [path for path in unchanged if path not in stale]
+            # The rule engine re-decides repository-wide "resource missing"
+            # checks below, so their old results are not carried
+            carried = await asyncio.to_thread(
+                carry_forward_findings, previous_scan_id, scan_id, unchanged,
+                is_existence_violation if settings.RULE_ENGINE_ENABLED else None,
+            )
+            audit_files = {path: repo_files[path] for path in changed}
+            msg = (
+                f"Incremental scan: {len(changed)} changed, {len(unchanged)} unchanged, "
+                f"{len(deleted)} deleted since previous scan; "
+                f"carried forward {len(carried)} violations\n"
+            )
+            yield _event("reasoning_chunk", {"agent": "Auditor", "chunk": msg})
+            reasoning_traces.setdefault("Auditor", []).append(msg)
+            for v in carried:
+                yield _event("violation_found", {"agent": "Auditor", "violation": v})
+
+        # Rule engine: decide the rules.json checks it can locally, so the
+        # model only sees the files it could not decide
+        violations = []
+        engine_violations: list[dict] = []
+        llm_files = audit_files
+        rules_by_file = None
+        # Full scans always run it: existence checks span unchanged files too
+        if settings.RULE_ENGINE_ENABLED and (audit_files or not head_ref):
+            engine = await asyncio.to_thread(evaluate, audit_files, None if head_ref else repo_files)
+            engine_violations = engine.violations
+            # An unchanged file can be undecided as the anchor of an existence check
+            llm_files = {path: content for path, content in repo_files.items() if path in engine.undecided_files}
+            rules_by_file = engine.undecided_files
+            msg = (
+                f"Rule engine: {len(engine_violations)} violations in {engine.resources} resources "
+                f"({engine.elapsed * 1000:.0f} ms); {len(llm_files)} files need the model\n"
+            )
+            yield _event("reasoning_chunk", {"agent": "Auditor", "chunk": msg})
+            reasoning_traces.setdefault("Auditor", []).append(msg)
+            for v in engine_violations:
+                yield _event("violation_found", {"agent": "Auditor", "violation": v})
+
+        # Run auditor (streaming)
+        if llm_files:
+            reported = [v for v in engine_violations + carried if v["file"] in llm_files]
+            # Batches stream concurrently; keep each batch's reasoning together in the log
+            batch_traces: dict[int, list[str]] = {}
+            async for event in run_auditor_streaming(
+                llm_files, context_files=context_files, reported=reported, rules_by_file=rules_by_file
+            ):
+                if event["event"] == "agent_complete":
+                    violations = engine_violations + event["data"].get("violations", [])
+                    failed_files = event["data"].get("failed_files", [])
+                    if failed_files:
+                        # Keep them out of later incremental baselines
+                        await asyncio.to_thread(record_unaudited_files, scan_id, failed_files)
+                        msg = f"Audit failed for {len(failed_files)} files; they will be re-audited next scan: {', '.join(failed_files)}\n"
+                        yield _event("reasoning_chunk", {"agent": "Auditor", "chunk": msg})
+                        reasoning_traces.setdefault("Auditor", []).append(msg)
+                    for number in sorted(batch_traces):
+                        reasoning_traces.setdefault("Auditor", []).append(f"\n--- Batch {number} ---\n" + "".join(batch_traces[number]))
+                    yield _event("agent_complete", {**event["data"], "summary": f"{len(violations)} violations detected", "violations": violations})
+                    continue
+                yield _event(event["event"], event["data"])
+                if event["event"] == "reasoning_chunk":
+                    if "batch" in event["data"]:
+                        batch_traces.setdefault(event["data"]["batch"], []).append(event["data"].get("chunk", ""))
+                    else:
+                        reasoning_traces.setdefault(event["data"].get("agent", "Auditor"), []).append(event["data"].get("chunk", ""))
+        elif audit_files or engine_violations:
+            violations = engine_violations
+            yield _event("agent_complete", {"agent": "Auditor", "summary": f"{len(violations)} violations detected", "violations": violations})
+        else:
+            yield _event("agent_complete", {"agent": "Auditor", "summary": f"No changed files; {len(carried)} violations carried forward", "violations": []})
+
+        # Save violations to DB with unique IDs (Gemini reuses simple IDs like V-001 across scans)
+        await asyncio.to_thread(_save_violations, scan_id, violations)
+
+        # Save auditor reasoning log
+        auditor_full_text = "".join(reasoning_traces.get("Auditor", []))
+        await asyncio.to_thread(
+            _log_reasoning, scan_id, "Auditor", "scan", f"{len(violations) + len(carried)} violations detected", auditor_full_text or None
+        )
+
+        # Run strategist (streaming) — isolated so auditor results are preserved on failure
+        # Carried-forward violations already have their plans copied over
+        plans = []
+        if violations or not carried:
+            try:
+                yield _event("agent_start", {"agent": "Strategist", "message": "Building remediation plans..."})
+                reasoning_traces.setdefault("Strategist", []).append("Building remediation plans...\n")
+                async for event in run_strategist_streaming(violations):
+                    yield _event(event["event"], event["data"])
+                    if event["event"] == "reasoning_chunk":
+                        reasoning_traces.setdefault(event["data"].get("agent", "Strategist"), []).append(event["data"].get("chunk", ""))
+                    if event["event"] == "agent_complete":
+                        plans = event["data"].get("plans", [])
+
+                # Save plans to DB, linking to the DB violation IDs
+                strategist_full_text = "".join(reasoning_traces.get("Strategist", []))
+                await asyncio.to_thread(_save_plans, scan_id, plans, violations, strategist_full_text or None)
+
+            except Exception as strat_err:
+                yield _event("agent_complete", {"agent": "Strategist", "summary": f"Failed: {strat_err}"})
+                strategist_full_text = "".join(reasoning_traces.get("Strategist", []))
+                await asyncio.to_thread(
+                    _log_reasoning, scan_id, "Strategist", "plan", f"Error: {strat_err}", strategist_full_text or None
+                )
+
+        # Mark scan completed (violations are always preserved)
+        await asyncio.to_thread(_set_status, scan_id, "completed")
+
+        yield _event("scan_complete", {"scan_id": scan_id, "status": "completed"})
+
+    except Exception as e:
+        await asyncio.to_thread(_set_status, scan_id, "failed")
+        yield _event("scan_error", {"message": str(e)})
+
+
+# Background scans run on the application's event loop (see use_event_loop),
+# or else on one long-lived loop of their own: cached Gemini models and the
+# client's async transport stay bound to the loop that first used them, so
+# a fresh loop per scan must be avoided
+_app_loop: asyncio.AbstractEventLoop | None = None
+_own_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+
+
+def use_event_loop(loop: asyncio.AbstractEventLoop | None) -> None:
+    """Run background scans on *loop* (the server's event loop), or with
+    None, on a dedicated loop thread."""
+    global _app_loop
+    _app_loop = loop
+
+
+def _scan_loop() -> asyncio.AbstractEventLoop:
+    global _own_loop
+    loop = _app_loop
+    if loop is not None and loop.is_running():
+        return loop
+    with _loop_lock:
+        if _own_loop is None:
+            _own_loop = asyncio.new_event_loop()
+            threading.Thread(target=_own_loop.run_forever, name="scan-loop", daemon=True).start()
+        return _own_loop
+
+
+def drain_scan(scan, access_token: str) -> str | None:
+    """Run *scan* to completion, discarding its events.
+
+    Used by background worker threads, which block until the scan finishes;
+    the scan itself runs on the shared scan event loop, so this must not be
+    called from that loop's thread.
+
+    Returns:
+        The error message if the scan failed, otherwise None.
+    """
+    async def _drain() -> str | None:
+        error = None
+        async for event in run_scan(scan, access_token):
+            if event["event"] == "scan_error":
+                error = event["data"].get("message")
+        return error
+
+    return asyncio.run_coroutine_threadsafe(_drain(), _scan_loop()).result()
@@ -0,0 +1,18 @@
+from app.agents.auditor import _file_sections, _locate
+
+EXCERPT = 'resource "aws_s3_bucket" "logs" {\n  bucket = "logs"\n}\n'
+
+
+def test_excerpt_header_has_no_absolute_line_numbers():
+    [section] = _file_sections({"big.tf": EXCERPT}, {"big.tf": 120})
+
+    assert section.startswith("--- FILE: big.tf (EXCERPT) ---\n")
+    assert "120" not in section
+
+
+def test_excerpt_relative_lines_are_mapped_back_once():
+    files, offsets = {"big.tf": EXCERPT}, {"big.tf": 120}
+
+    violation = _locate({"file": "big.tf (EXCERPT)", "line": 2}, files, offsets)
+
+    assert violation == {"file": "big.tf", "line": 121}
@@ -0,0 +1,44 @@
+from app.database import get_db
+from app.services import bulk_scan
+from app.services.scan_runner import create_scan
+
+
+def _status(table: str, row_id: str) -> str:
+    db = get_db()
+    try:
+        return db.execute(f"SELECT status FROM {table} WHERE id = ?", (row_id,)).fetchone()["status"]
+    finally:
+        db.close()
+
+
+def _bulk(bulk_id: str, status: str, member_statuses: list[str]) -> list[str]:
+    db = get_db()
+    try:
+        db.execute(
+            "INSERT INTO bulk_scans (id, user_id, source, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (bulk_id, "user", "org:acme", status, "t", "t"),
+        )
+        db.commit()
+    finally:
+        db.close()
+    scan_ids = [create_scan("user", "acme", f"repo-{i}", bulk_scan_id=bulk_id) for i in range(len(member_statuses))]
+    db = get_db()
+    try:
+        for scan_id, member_status in zip(scan_ids, member_statuses):
+            db.execute("UPDATE scans SET status = ? WHERE id = ?", (member_status, scan_id))
+        db.commit()
+    finally:
+        db.close()
+    return scan_ids
+
+
+def test_bulk_scans_interrupted_by_a_restart_are_failed():
+    interrupted = _bulk("interrupted", "running", ["completed", "scanning", "pending"])
+    finished = _bulk("finished", "completed", ["completed"])
+
+    bulk_scan.fail_interrupted_bulk_scans()
+
+    assert _status("bulk_scans", "interrupted") == "failed"
+    assert [_status("scans", scan_id) for scan_id in interrupted] == ["completed", "failed", "failed"]
+    assert _status("bulk_scans", "finished") == "completed"
+    assert _status("scans", finished[0]) == "completed"
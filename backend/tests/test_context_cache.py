@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+from app.agents import context_cache
+from app.agents.auditor import QA_RESCAN_NOTE, _build_request, build_system_prompt
+from app.core.config import settings
+
+TTL = 3600
+
+
+class _StubBackend(context_cache.ContextCacheBackend):
+    """Records handle operations instead of calling Gemini."""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.created: list[str] = []
+        self.extended: list[str] = []
+
+    def create(self, model_name, system_instruction, ttl):
+        if self.fail:
+            raise RuntimeError("Cached content is too small")
+        self.created.append(system_instruction)
+        return f"handle-{len(self.created)}"
+
+    def extend(self, handle, ttl):
+        self.extended.append(handle)
+        return handle
+
+    def model(self, handle, generation_config=None):
+        return ("model", handle)
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    monkeypatch.setattr(settings, "GEMINI_CONTEXT_CACHE_TTL", TTL)
+    # The shipped ruleset is estimated at ~3.5k tokens
+    monkeypatch.setattr(settings, "GEMINI_CONTEXT_CACHE_MIN_TOKENS", 1024)
+    stub = _StubBackend()
+    context_cache.set_backend(stub)
+    yield stub
+    context_cache.set_backend(context_cache.ContextCacheBackend())
+
+
+def test_one_handle_per_ruleset_version_across_batches(backend):
+    requests = [
+        _build_request(rule_ids, offsets, is_qa_rescan=qa)
+        for rule_ids in [("CIS-2.1.1-001",), ("DORA-10-001", "GDPR-32.1a-001")]
+        for offsets in [{}, {"main.tf": 40}]
+        for qa in [False, True]
+    ]
+
+    models = {context_cache.get_cached_model(system_prompt) for system_prompt, _ in requests}
+
+    assert {system_prompt for system_prompt, _ in requests} == {build_system_prompt()}
+    assert backend.created == [build_system_prompt()]
+    assert models == {("model", "handle-1")}
+    # The batch's scope and notes travel in the user content instead
+    _, notes = requests[-1]
+    assert "DORA-10-001, GDPR-32.1a-001" in notes
+    assert QA_RESCAN_NOTE.strip() in notes
+
+
+def test_handle_is_refreshed_before_it_expires(backend, monkeypatch):
+    prompt = build_system_prompt()
+    now = time.monotonic()
+    monkeypatch.setattr(context_cache.time, "monotonic", lambda: now)
+    context_cache.get_cached_model(prompt)
+
+    now += TTL * 0.5
+    context_cache.get_cached_model(prompt)
+    assert backend.extended == []
+
+    now += TTL * 0.35
+    assert context_cache.get_cached_model(prompt) == ("model", "handle-1")
+    assert backend.extended == ["handle-1"]
+    assert len(backend.created) == 1
+
+
+def test_prompts_below_the_minimum_stay_inline(backend, monkeypatch):
+    monkeypatch.setattr(settings, "GEMINI_CONTEXT_CACHE_MIN_TOKENS", 1_000_000)
+
+    system_prompt, notes = _build_request(("CIS-2.1.1-001",), {})
+
+    assert system_prompt == build_system_prompt(("CIS-2.1.1-001",))
+    assert "CIS-2.1.1-001" not in notes
+    assert context_cache.get_cached_model(system_prompt) is None
+    assert backend.created == []
+
+
+def test_refused_prompt_falls_back_to_routed_rules(backend):
+    backend.fail = True
+
+    assert context_cache.get_cached_model(build_system_prompt()) is None
+    system_prompt, _ = _build_request(("CIS-2.1.1-001",), {})
+
+    assert system_prompt == build_system_prompt(("CIS-2.1.1-001",))
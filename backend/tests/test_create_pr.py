@@ -0,0 +1,96 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import github_service
+from app.services.github_service import create_pr
+
+# tree SHA -> entries, as returned by GET /git/trees/{sha} (non-recursive)
+TREES = {
+    "root": [
+        {"path": "deploy.sh", "mode": "100755", "type": "blob", "sha": "b1"},
+        {"path": "infra", "mode": "040000", "type": "tree", "sha": "infra"},
+        {"path": "docs", "mode": "040000", "type": "tree", "sha": "docs"},
+    ],
+    "infra": [
+        {"path": "main.tf", "mode": "100644", "type": "blob", "sha": "b2"},
+        {"path": "bin", "mode": "040000", "type": "tree", "sha": "infra/bin"},
+    ],
+    "infra/bin": [
+        {"path": "apply.sh", "mode": "100755", "type": "blob", "sha": "b3"},
+    ],
+}
+
+
+class _Repo:
+    default_branch = "main"
+
+    def __init__(self):
+        self.tree_elements = None
+        self.pull_base = None
+
+    def get_git_ref(self, ref):
+        return SimpleNamespace(object=SimpleNamespace(sha="head"))
+
+    def get_git_commit(self, sha):
+        return SimpleNamespace(sha=sha, tree=SimpleNamespace(sha="root"))
+
+    def create_git_tree(self, elements, base_tree=None):
+        self.tree_elements = elements
+        return "tree"
+
+    def create_git_commit(self, message, tree, parents):
+        return SimpleNamespace(sha="fix")
+
+    def create_git_ref(self, ref, sha):
+        pass
+
+    def create_pull(self, title, body, head, base):
+        self.pull_base = base
+        return SimpleNamespace(html_url="https://github.com/acme/infra/pull/1", number=1)
+
+
+@pytest.fixture
+def repo(monkeypatch):
+    repo = _Repo()
+    listed: list[str] = []
+    budgets: list[int] = []
+
+    def get_json(access_token, path, params=None):
+        assert params is None, "tree listings must not be recursive"
+        sha = path.rsplit("/trees/", 1)[1]
+        listed.append(sha)
+        return {"sha": sha, "tree": TREES[sha], "truncated": False}
+
+    monkeypatch.setattr(github_service, "get_repo", lambda *args: repo)
+    monkeypatch.setattr(github_service, "get_json", get_json)
+    monkeypatch.setattr(github_service, "require_budget", lambda token, needed: budgets.append(needed))
+    repo.listed, repo.budgets = listed, budgets
+    return repo
+
+
+def _fix(path: str) -> dict:
+    return {"file": path, "fixed_content": f"# fixed {path}\n"}
+
+
+def test_keeps_executable_modes_and_lists_only_needed_directories(repo):
+    fixes = [_fix("deploy.sh"), _fix("infra/main.tf"), _fix("infra/bin/apply.sh"), _fix("infra/new/extra.tf")]
+
+    create_pr("token", "acme", "infra", fixes, [], base_sha="base")
+
+    modes = {element._identity["path"]: element._identity["mode"] for element in repo.tree_elements}
+    assert modes == {
+        "deploy.sh": "100755",
+        "infra/main.tf": "100644",
+        "infra/bin/apply.sh": "100755",
+        "infra/new/extra.tf": "100644",
+    }
+    # "docs" is never listed and the new directory cannot be
+    assert repo.listed == ["root", "infra", "infra/bin"]
+    assert repo.budgets == [github_service._CREATE_PR_REQUESTS + 4]
+
+
+def test_pull_request_targets_the_given_branch(repo):
+    create_pr("token", "acme", "infra", [_fix("infra/main.tf")], [], base_branch="feature/x")
+
+    assert repo.pull_base == "feature/x"
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.services import github_client
+
+
+@pytest.fixture
+def responses(monkeypatch):
+    """Serve ``path -> body`` with an ETag per path, and 304 on revalidation."""
+    bodies: dict[str, str] = {}
+    requests: list[tuple[str, bool]] = []
+
+    def request_json(self, verb, path, parameters=None, headers=None):
+        etag = f'"{path}"'
+        revalidating = (headers or {}).get("If-None-Match") == etag
+        requests.append((path, revalidating))
+        if revalidating:
+            return 304, {"etag": etag}, ""
+        return 200, {"etag": etag}, bodies[path]
+
+    monkeypatch.setattr("github.Requester.Requester.requestJson", request_json)
+    monkeypatch.setattr(settings, "GITHUB_ETAG_CACHE_BYTES", 1000)
+    yield bodies, requests
+    for token in ("alice", "bob"):
+        github_client.discard(token)
+    assert github_client._etag_bytes == 0
+
+
+def _body(size: int) -> str:
+    return json.dumps({"pad": "x" * (size - 11)})
+
+
+def test_cached_bodies_are_bounded_across_tokens(responses):
+    bodies, requests = responses
+    bodies.update({"/a": _body(400), "/b": _body(400), "/c": _body(400)})
+
+    github_client.get_json("alice", "/a")
+    github_client.get_json("alice", "/b")
+    github_client.get_json("bob", "/c")
+    # The least recently used entry of any token (alice's /a) made room for bob's
+    assert github_client._etag_bytes == 800
+
+    github_client.get_json("alice", "/b")
+    github_client.get_json("bob", "/c")
+    assert requests[-2:] == [("/b", True), ("/c", True)]
+
+
+def test_bodies_larger_than_the_budget_are_not_cached(responses):
+    bodies, requests = responses
+    bodies.update({"/small": _body(100), "/tree": _body(5000)})
+
+    github_client.get_json("alice", "/small")
+    assert github_client.get_json("alice", "/tree") == json.loads(bodies["/tree"])
+    github_client.get_json("alice", "/tree")
+
+    assert requests[-1] == ("/tree", False)
+    assert github_client._etag_bytes == 100
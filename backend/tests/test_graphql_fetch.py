@@ -0,0 +1,168 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.core.config import settings
+from app.services import github_service
+from app.services.github_service import fetch_files_graphql, get_repo_infra_files
+from app.services.path_filter import PathFilter
+
+REF = "main"
+
+
+class _MockGraphQL:
+    """A local GitHub GraphQL endpoint serving blobs from a dict.
+
+    ``max_batch`` makes larger queries fail, either with a
+    RESOURCE_LIMITS_EXCEEDED error or (``overload_status=502``) with the
+    bare 502 GitHub returns for queries that time out.  Paths in ``poison``
+    fail the same way whenever they are queried.  After ``fail_after``
+    queries, ``status`` answers with that HTTP status and ``no_repository``
+    with ``repository: null``.
+    """
+
+    def __init__(self, blobs: dict[str, dict | None]):
+        self.blobs = blobs
+        self.max_batch: int | None = None
+        self.overload_status: int | None = None
+        self.poison: set[str] = set()
+        self.status: int | None = None
+        self.no_repository = False
+        self.fail_after = 0
+        self.queries: list[list[str]] = []
+
+    def answer(self, body: dict) -> tuple[int, dict]:
+        variables = body["variables"]
+        assert (variables["owner"], variables["name"]) == ("acme", "infra")
+        expressions = [variables[f"e{i}"] for i in range(len(variables) - 2)]
+        paths = [expression.split(":", 1)[1] for expression in expressions]
+        assert all(expression.startswith(f"{REF}:") for expression in expressions)
+        self.queries.append(paths)
+
+        failing = len(self.queries) > self.fail_after
+        if failing and self.status is not None:
+            return self.status, {"message": "Bad credentials"}
+        if (self.max_batch is not None and len(paths) > self.max_batch) or self.poison & set(paths):
+            if self.overload_status is not None:
+                return self.overload_status, {}
+            return 200, {"data": None, "errors": [{"type": "RESOURCE_LIMITS_EXCEEDED", "message": "Resource limits exceeded"}]}
+        if failing and self.no_repository:
+            return 200, {"data": {"repository": None}, "errors": [{"type": "NOT_FOUND"}]}
+        return 200, {"data": {"repository": {f"f{i}": self.blobs.get(path) for i, path in enumerate(paths)}}}
+
+
+@pytest.fixture
+def server(monkeypatch):
+    mock = _MockGraphQL({})
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            assert self.headers["Authorization"] == "Bearer token"
+            status, payload = mock.answer(body)
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("NO_PROXY", "127.0.0.1")
+    monkeypatch.setattr(github_service, "_GRAPHQL_URL", f"http://127.0.0.1:{httpd.server_port}/graphql")
+    yield mock
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _blob(text: str, **flags) -> dict:
+    return {"oid": "0" * 40, "text": text, "isBinary": False, "isTruncated": False, **flags}
+
+
+def _fetch(paths, batch_size=3):
+    return fetch_files_graphql("token", "acme", "infra", REF, paths, batch_size=batch_size)
+
+
+def test_batches_paths_and_keeps_only_usable_text(server):
+    server.blobs = {f"m{i}.tf": _blob(f"# {i}\n") for i in range(7)}
+    server.blobs["bin.tf"] = _blob(None, isBinary=True)
+    server.blobs["cut.tf"] = _blob("partial", isTruncated=True)
+    paths = sorted(server.blobs) + ["gone.tf"]
+
+    files = _fetch(paths)
+
+    assert files == {f"m{i}.tf": f"# {i}\n" for i in range(7)}
+    assert len(server.queries) == 4
+    assert all(len(query) <= 3 for query in server.queries)
+    assert sorted(path for query in server.queries for path in query) == sorted(paths)
+
+
+@pytest.mark.parametrize("overload_status", [None, 502])
+def test_halves_batches_github_rejects_as_too_large(server, overload_status):
+    server.blobs = {f"m{i}.tf": _blob(f"# {i}\n") for i in range(8)}
+    server.max_batch = 2
+    server.overload_status = overload_status
+
+    files = _fetch(sorted(server.blobs), batch_size=8)
+
+    assert files == {path: blob["text"] for path, blob in server.blobs.items()}
+    # 8 -> 4 + 4 -> four successful batches of 2
+    assert [len(query) for query in server.queries] == [8, 4, 2, 2, 4, 2, 2]
+
+
+def test_skips_single_path_that_is_always_too_large(server):
+    server.blobs = {path: _blob(path) for path in ("a.tf", "b.tf", "huge.tf", "c.tf")}
+    server.poison = {"huge.tf"}
+
+    files = _fetch(sorted(server.blobs), batch_size=4)
+
+    assert files == {path: path for path in ("a.tf", "b.tf", "c.tf")}
+    assert ["huge.tf"] in server.queries
+
+
+@pytest.mark.parametrize("failure", ["status", "no_repository"])
+def test_other_failures_return_what_was_read(server, failure):
+    server.blobs = {f"m{i}.tf": _blob(f"# {i}\n") for i in range(9)}
+    server.fail_after = 1
+    if failure == "status":
+        server.status = 401
+    else:
+        server.no_repository = True
+
+    files = _fetch(sorted(server.blobs))
+
+    # The first batch was read; the failing query stops the fetch and the
+    # remaining paths are left to the caller's REST fallback
+    assert files == {path: server.blobs[path]["text"] for path in server.queries[0]}
+    assert len(server.queries) == 2
+
+
+def test_graphql_results_are_not_downloaded_again_without_blob_cache(server, monkeypatch):
+    server.blobs = {f"m{i}.tf": _blob(f"# {i}\n") for i in range(5)}
+    downloads: list[str] = []
+
+    class Repo:
+        default_branch = REF
+        full_name = "acme/infra"
+
+        def get_git_blob(self, sha):
+            downloads.append(sha)
+            raise AssertionError("blob should have come from GraphQL")
+
+    tree = [{"path": path, "sha": f"{i:040x}", "size": 4, "type": "blob"} for i, path in enumerate(sorted(server.blobs))]
+    monkeypatch.setattr(settings, "BLOB_CACHE_MAX_BYTES", 0)
+    monkeypatch.setattr(github_service, "get_repo", lambda *args: Repo())
+    monkeypatch.setattr(github_service, "load_path_filter", lambda *args: PathFilter())
+    monkeypatch.setattr(github_service, "list_repo_blobs", lambda *args, **kwargs: tree)
+
+    files = get_repo_infra_files("token", "acme", "infra", mode="graphql", ref=REF)
+
+    assert files == {path: blob["text"] for path, blob in server.blobs.items()}
+    assert downloads == []
@@ -0,0 +1,43 @@
+import os
+import subprocess
+
+from app.services.blob_cache import git_blob_sha
+from app.services.local_source import get_local_infra_files
+
+MAIN_TF = 'resource "aws_s3_bucket" "logs" {\n  bucket = "logs"\n}\n'
+VARS_TF = 'variable "region" {\n  default = "eu-west-1"\n}\n'
+
+
+def _git(path, *args):
+    return subprocess.run(["git", "-C", str(path), *args], check=True, capture_output=True).stdout
+
+
+def _repo(tmp_path, files: dict[str, str]):
+    for name, content in files.items():
+        (tmp_path / name).write_text(content)
+    _git(tmp_path, "init", "-q")
+    _git(tmp_path, "add", ".")
+    _git(tmp_path, "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "init")
+    return tmp_path
+
+
+def test_reads_files_at_ref_with_blob_shas(tmp_path):
+    repo = _repo(tmp_path, {"main.tf": MAIN_TF, "README.md": "# readme\n"})
+    shas: dict[str, str] = {}
+
+    files = get_local_infra_files(str(repo), ref="HEAD", shas=shas)
+
+    assert files == {"main.tf": MAIN_TF}
+    assert shas == {"main.tf": git_blob_sha(MAIN_TF.encode())}
+
+
+def test_missing_blob_is_skipped_not_fatal(tmp_path):
+    repo = _repo(tmp_path, {"main.tf": MAIN_TF, "vars.tf": VARS_TF})
+    sha = git_blob_sha(VARS_TF.encode())
+    os.remove(repo / ".git" / "objects" / sha[:2] / sha[2:])
+    skipped: list[dict] = []
+
+    files = get_local_infra_files(str(repo), ref="HEAD", skipped=skipped)
+
+    assert files == {"main.tf": MAIN_TF}
+    assert skipped == [{"path": "vars.tf", "reason": "unreadable", "size": None}]
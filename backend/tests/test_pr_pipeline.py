@@ -0,0 +1,40 @@
+from app.graphs import pr_pipeline
+
+PLAN = {"file": "main.tf", "violation_id": "V-1", "what_needs_to_change": "encrypt"}
+
+
+def _run(monkeypatch, auditor):
+    monkeypatch.setattr(pr_pipeline, "run_code_generator", lambda path, original, plans: original + "# fixed\n")
+    monkeypatch.setattr(pr_pipeline, "run_auditor", auditor)
+    files = {"main.tf": 'resource "aws_s3_bucket" "b" {}\n'}
+    return pr_pipeline.pr_app.invoke({
+        "repo_files": files,
+        "approved_plans": [PLAN],
+        "current_plans": [PLAN],
+        "current_files": files,
+        "fixes": [],
+        "all_fixes": [],
+        "qa_iterations": 0,
+        "qa_clean": False,
+        "qa_violations": [],
+        "qa_history": [],
+        "reasoning_log": [],
+    })
+
+
+def test_failed_qa_rescan_keeps_the_fixes(monkeypatch):
+    def auditor(files, is_qa_rescan=False):
+        raise ValueError("Auditor response is not a JSON array of violations")
+
+    result = _run(monkeypatch, auditor)
+
+    assert [fix["file"] for fix in result["all_fixes"]] == ["main.tf"]
+    assert result["qa_history"] == [{"iteration": 1, "violations": [], "plans": [], "is_clean": False}]
+    assert result["reasoning_log"][-1]["output"].startswith("Failed: ")
+
+
+def test_clean_qa_rescan_ends_the_loop(monkeypatch):
+    result = _run(monkeypatch, lambda files, is_qa_rescan=False: [])
+
+    assert result["qa_clean"] is True
+    assert result["qa_iterations"] == 1
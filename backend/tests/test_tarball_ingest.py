@@ -0,0 +1,107 @@
+import hashlib
+import io
+import tarfile
+
+from app.services import blob_cache
+from app.services.github_service import extract_infra_files_from_tarball
+from app.services.path_filter import PathFilter
+
+PREFIX = "acme-infra-0123abc/"
+
+
+class _Stream(io.RawIOBase):
+    """A read-only, non-seekable stream, like an HTTP response body."""
+
+    def __init__(self, data: bytes):
+        self._data = io.BytesIO(data)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        chunk = self._data.read(len(buffer))
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+
+def _tarball(entries: dict[str, bytes]) -> bytes:
+    out = io.BytesIO()
+    with tarfile.open(fileobj=out, mode="w:gz") as archive:
+        directory = tarfile.TarInfo(PREFIX.rstrip("/"))
+        directory.type = tarfile.DIRTYPE
+        archive.addfile(directory)
+        for path, data in entries.items():
+            info = tarfile.TarInfo(PREFIX + path)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return out.getvalue()
+
+
+def _git_sha(data: bytes) -> str:
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+MAIN_TF = b'resource "aws_s3_bucket" "logs" {\n  bucket = "logs"\n}\n'
+DEPLOY_YAML = b"apiVersion: apps/v1\nkind: Deployment\nmetadata:\n  name: web\n"
+
+
+def _extract(entries: dict[str, bytes], **kwargs):
+    shas: dict[str, str] = {}
+    skipped: list[dict] = []
+    files = extract_infra_files_from_tarball(_Stream(_tarball(entries)), shas=shas, skipped=skipped, **kwargs)
+    return files, shas, skipped
+
+
+def test_strips_archive_prefix_and_keeps_only_infra_files():
+    files, shas, skipped = _extract({
+        "main.tf": MAIN_TF,
+        "k8s/deploy.yaml": DEPLOY_YAML,
+        "README.md": b"# readme\n",
+        "node_modules/pkg/main.tf": MAIN_TF,
+        "src/app.py": b"print('hi')\n",
+    })
+
+    assert files == {"main.tf": MAIN_TF.decode(), "k8s/deploy.yaml": DEPLOY_YAML.decode()}
+    assert set(shas) == set(files)
+    assert skipped == []
+
+
+def test_shas_match_git_blob_shas_and_fill_blob_cache():
+    files, shas, _ = _extract({"main.tf": MAIN_TF, "k8s/deploy.yaml": DEPLOY_YAML})
+
+    assert shas == {"main.tf": _git_sha(MAIN_TF), "k8s/deploy.yaml": _git_sha(DEPLOY_YAML)}
+    assert blob_cache.get_blobs(list(shas.values())) == {shas[path]: files[path] for path in files}
+
+
+def test_custom_path_filter_excludes_directories():
+    files, _, _ = _extract(
+        {"main.tf": MAIN_TF, "modules/legacy/main.tf": MAIN_TF},
+        path_filter=PathFilter(exclude=["modules/legacy/**"]),
+    )
+
+    assert list(files) == ["main.tf"]
+
+
+def test_oversized_files_are_skipped_and_reported():
+    big = b"# padding\n" * 200
+    files, shas, skipped = _extract(
+        {"main.tf": MAIN_TF, "big.tf": big},
+        path_filter=PathFilter(max_file_size=1000),
+    )
+
+    assert list(files) == ["main.tf"]
+    assert "big.tf" not in shas
+    assert skipped == [{"path": "big.tf", "reason": "too_large", "size": len(big)}]
+
+
+def test_binary_files_are_skipped_and_reported():
+    nul = b"resource \0\x01\x02"
+    latin1 = "name: caf\xe9\n".encode("latin-1")
+    files, shas, skipped = _extract({"main.tf": MAIN_TF, "state.tf": nul, "values.yaml": latin1})
+
+    assert list(files) == ["main.tf"]
+    assert list(shas) == ["main.tf"]
+    assert skipped == [
+        {"path": "state.tf", "reason": "binary", "size": len(nul)},
+        {"path": "values.yaml", "reason": "binary", "size": len(latin1)},
+    ]